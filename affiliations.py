@@ -0,0 +1,163 @@
+from collections import OrderedDict
+
+from fuzzywuzzy import fuzz
+
+try:
+    from rapidfuzz import process as rapid_process
+    from rapidfuzz.distance import LCSseq
+except ImportError:
+    rapid_process = LCSseq = None
+
+
+class AffiliationMatcher:
+    """
+    Decide whether new affiliation strings are similar to affiliations that
+    have already been seen for an author, where "similar" means that the
+    `fuzz.partial_ratio` of the two strings is at least the given ratio.
+
+    The decisions are identical to comparing every pair with
+    `fuzz.partial_ratio`, but much faster:
+
+    - decisions for pairs of strings are memoized, and shared between all
+      authors (and all searches) that use this matcher;
+    - a string that contains (or is contained by) another string is similar
+      to it, without any scoring;
+    - if `rapidfuzz` is installed, the longest common subsequence between a
+      new affiliation and every existing affiliation is computed in one
+      batch. This gives an upper bound on the partial ratio, so only the
+      candidates that could reach the ratio are scored with
+      `fuzz.partial_ratio`, most promising candidates first.
+
+    :param affiliation_uniqueness_ratio: [optional]
+        The ratio (between 0 and 100) of two affiliation strings in order for
+        them to be considered as the same affiliation. Default is 75.
+
+    :param max_cache_size: [optional]
+        The maximum number of pair decisions to memoize. Default is 100,000.
+    """
+
+    _shared = dict()
+
+    def __init__(
+        self, affiliation_uniqueness_ratio=75, max_cache_size=100_000
+    ):
+        self.affiliation_uniqueness_ratio = affiliation_uniqueness_ratio
+        self.max_cache_size = max_cache_size
+        self._decisions = OrderedDict()
+        self.comparisons = 0
+        self.cache_hits = 0
+
+    @classmethod
+    def shared(cls, affiliation_uniqueness_ratio=75):
+        """
+        Return a matcher for the given ratio that is shared by all searches
+        in this process.
+
+        :param affiliation_uniqueness_ratio: [optional]
+            The ratio (between 0 and 100) of two affiliation strings in order
+            for them to be considered as the same affiliation. Default is 75.
+        """
+        try:
+            return cls._shared[affiliation_uniqueness_ratio]
+        except KeyError:
+            matcher = cls._shared[affiliation_uniqueness_ratio] = cls(
+                affiliation_uniqueness_ratio
+            )
+            return matcher
+
+    def unique(self, new_affiliations, existing_affiliations):
+        """
+        Return the new affiliations that are not similar to any of the
+        existing affiliations.
+
+        :param new_affiliations:
+            An iterable of affiliation strings to check.
+
+        :param existing_affiliations:
+            A collection of affiliation strings that have already been seen.
+        """
+
+        if not existing_affiliations:
+            return list(new_affiliations)
+
+        existing_affiliations = list(existing_affiliations)
+        return [
+            new_affiliation
+            for new_affiliation in new_affiliations
+            if not self.is_similar_to_any(
+                new_affiliation, existing_affiliations
+            )
+        ]
+
+    def is_similar_to_any(self, new_affiliation, existing_affiliations):
+        """
+        Return whether the new affiliation is similar to any of the existing
+        affiliations.
+
+        :param new_affiliation:
+            An affiliation string.
+
+        :param existing_affiliations:
+            A list of affiliation strings.
+        """
+
+        candidates = []
+        for existing_affiliation in existing_affiliations:
+            decision = self._decisions.get(
+                (existing_affiliation, new_affiliation)
+            )
+            if decision is None:
+                if (
+                    existing_affiliation in new_affiliation
+                    or new_affiliation in existing_affiliation
+                ):
+                    return True
+                candidates.append(existing_affiliation)
+            elif decision:
+                self.cache_hits += 1
+                return True
+            else:
+                self.cache_hits += 1
+
+        if rapid_process is not None and candidates:
+            candidates = self._filter(new_affiliation, candidates)
+
+        return any(
+            self._is_similar(candidate, new_affiliation)
+            for candidate in candidates
+        )
+
+    def _filter(self, new_affiliation, candidates):
+        # The partial ratio of two strings is at most 2L/(m + L), where L is
+        # the length of their longest common subsequence and m is the length
+        # of the shorter string. Candidates below that bound cannot match, and
+        # the candidates with the highest bound are the most likely to match.
+        bounds = []
+        for candidate, lcs, _ in rapid_process.extract(
+            new_affiliation,
+            candidates,
+            scorer=LCSseq.similarity,
+            processor=None,
+            limit=None,
+        ):
+            shortest = min(len(candidate), len(new_affiliation))
+            bound = 200 * lcs / (shortest + lcs) if lcs else 0
+            # Allow for fuzz.partial_ratio rounding to the nearest integer.
+            if bound >= self.affiliation_uniqueness_ratio - 0.5:
+                bounds.append((bound, candidate))
+        bounds.sort(reverse=True)
+        return [candidate for bound, candidate in bounds]
+
+    def _is_similar(self, existing_affiliation, new_affiliation):
+        self.comparisons += 1
+        decision = (
+            fuzz.partial_ratio(existing_affiliation, new_affiliation)
+            >= self.affiliation_uniqueness_ratio
+        )
+        self._remember((existing_affiliation, new_affiliation), decision)
+        return decision
+
+    def _remember(self, pair, decision):
+        self._decisions[pair] = decision
+        if len(self._decisions) > self.max_cache_size:
+            self._decisions.popitem(last=False)
@@ -0,0 +1,134 @@
+"""
+Benchmark affiliation de-duplication: the pairwise `fuzz.partial_ratio` scan
+that `collate_authors` used to run, against `AffiliationMatcher`.
+
+    python benchmarks/bench_affiliations.py --authors 200 --articles 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fuzzywuzzy import fuzz  # noqa: E402
+
+from affiliations import AffiliationMatcher  # noqa: E402
+
+INSTITUTES = (
+    "Department of Physics and Astronomy",
+    "School of Physics and Astronomy",
+    "Dept. of Astronomy",
+    "Max Planck Institute for Astronomy",
+    "Center for Astrophysics | Harvard & Smithsonian",
+    "Kavli Institute for Cosmology",
+    "Institute of Astronomy",
+    "Center for Computational Astrophysics, Flatiron Institute",
+    "Steward Observatory",
+    "National Astronomical Observatories, Chinese Academy of Sciences",
+)
+PLACES = (
+    "Monash University, Clayton, VIC 3800, Australia",
+    "University of Cambridge, Madingley Road, Cambridge CB3 0HA, UK",
+    "Königstuhl 17, D-69117 Heidelberg, Germany",
+    "60 Garden Street, Cambridge, MA 02138, USA",
+    "162 Fifth Avenue, New York, NY 10010, USA",
+    "University of Arizona, Tucson, AZ 85721, USA",
+    "Beijing 100101, China",
+)
+
+
+def messy_affiliation(rng):
+    affiliation = f"{rng.choice(INSTITUTES)}, {rng.choice(PLACES)}"
+    # Typos, abbreviations and truncations, as found in the wild.
+    if rng.random() < 0.3:
+        i = rng.randrange(len(affiliation))
+        affiliation = affiliation[:i] + affiliation[i + 1 :]
+    if rng.random() < 0.2:
+        affiliation = affiliation.replace("University", "Univ.")
+    if rng.random() < 0.1:
+        affiliation = affiliation[: rng.randint(20, len(affiliation))]
+    return affiliation.strip()
+
+
+def corpus(authors, articles, seed=0):
+    rng = random.Random(seed)
+    return [
+        [
+            {messy_affiliation(rng) for _ in range(rng.randint(1, 2))}
+            for _ in range(articles)
+        ]
+        for _ in range(authors)
+    ]
+
+
+def pairwise(histories, ratio):
+    parsed = []
+    for history in histories:
+        affiliations, unique = (set(), set())
+        for new_affiliations in history:
+            new_affiliations = new_affiliations.difference(affiliations)
+            for new_affiliation in new_affiliations:
+                for existing_affiliation in affiliations:
+                    if (
+                        fuzz.partial_ratio(
+                            existing_affiliation, new_affiliation
+                        )
+                        >= ratio
+                    ):
+                        break
+                else:
+                    unique.add(new_affiliation)
+            affiliations |= new_affiliations
+        parsed.append(unique)
+    return parsed
+
+
+def matched(histories, matcher):
+    parsed = []
+    for history in histories:
+        affiliations, unique = (set(), set())
+        for new_affiliations in history:
+            new_affiliations = new_affiliations.difference(affiliations)
+            unique.update(matcher.unique(new_affiliations, affiliations))
+            affiliations |= new_affiliations
+        parsed.append(unique)
+    return parsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--articles", type=int, default=100)
+    parser.add_argument("--ratio", type=int, default=75)
+    args = parser.parse_args()
+
+    histories = corpus(args.authors, args.articles)
+
+    t = time.perf_counter()
+    expected = pairwise(histories, args.ratio)
+    t_pairwise = time.perf_counter() - t
+
+    matcher = AffiliationMatcher(args.ratio)
+    t = time.perf_counter()
+    cold = matched(histories, matcher)
+    t_cold = time.perf_counter() - t
+
+    t = time.perf_counter()
+    warm = matched(histories, matcher)
+    t_warm = time.perf_counter() - t
+
+    assert cold == expected and warm == expected, "Results differ!"
+
+    print(f"{args.authors} authors with {args.articles} articles each")
+    print(f"pairwise partial_ratio: {t_pairwise:8.3f} s")
+    print(
+        f"AffiliationMatcher:     {t_cold:8.3f} s "
+        f"({t_pairwise / t_cold:.1f}x faster)"
+    )
+    print(
+        f"  (shared cache, warm): {t_warm:8.3f} s "
+        f"({t_pairwise / t_warm:.1f}x faster)"
+    )
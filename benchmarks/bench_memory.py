@@ -0,0 +1,100 @@
+"""
+Benchmark the memory used by the suggestions of one search, collated from a
+synthetic corpus of large-collaboration papers, against the plain
+dictionaries (of lists and sets) that `collate_authors` used to keep.
+
+    python benchmarks/bench_memory.py --authors 5000 --articles 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import search_utils  # noqa: E402
+
+INSTITUTES = (
+    "Department of Physics and Astronomy, Monash University, Australia",
+    "Max Planck Institute for Astronomy, Heidelberg, Germany",
+    "Center for Astrophysics | Harvard & Smithsonian, Cambridge, MA, USA",
+    "Institute of Astronomy, University of Cambridge, UK",
+    "Kavli Institute for Cosmology, Cambridge, UK",
+    "Flatiron Institute, New York, NY, USA",
+)
+
+
+def corpus(authors, articles, seed=0):
+    rng = random.Random(seed)
+    people = [
+        (f"Author{i:05d}, Given{i:05d}", rng.choice(INSTITUTES))
+        for i in range(authors)
+    ]
+    docs = []
+    for i in range(articles):
+        # Mostly small author lists, with the odd huge collaboration paper.
+        size = rng.choice((3, 5, 8, 12, 1000, 2500))
+        team = rng.sample(people, min(size, authors))
+        year = 2000 + i % 20
+        docs.append(
+            dict(
+                bibcode=f"{year}ApJ...{i:03d}..{i % 97:03d}A",
+                year=str(year),
+                pubdate=f"{year}-{1 + i % 12:02d}-00",
+                author=[name for name, _ in team],
+                aff=[affiliation for _, affiliation in team],
+                orcid=["-"] * len(team),
+            )
+        )
+    return docs
+
+
+def as_dict(suggestion):
+    # The layout that collate_authors used to keep for every author.
+    d = suggestion.to_json()
+    for key in ("affiliations", "parsed_affiliations", "matched_names"):
+        d[key] = set(d[key])
+    d["bibcodes"] = list(suggestion.bibcodes)
+    return d
+
+
+def traced(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (result, size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--authors", type=int, default=5000)
+    parser.add_argument("--articles", type=int, default=500)
+    args = parser.parse_args()
+
+    docs = corpus(args.authors, args.articles)
+    articles = list(map(search_utils.normalize_article, docs))
+
+    # Collate once to warm the (shared) name and affiliation caches, so that
+    # they are not counted below.
+    search_utils._collate_batch(articles, 75)
+
+    suggestions, compact_size = traced(
+        search_utils._collate_batch, articles, 75
+    )
+    _, dict_size = traced(
+        lambda: {k: as_dict(s) for k, s in suggestions.items()}
+    )
+
+    n = sum(s.number_of_articles for s in suggestions.values())
+    print(
+        f"{len(suggestions)} authors on {len(articles)} articles "
+        f"({n} author-article pairs)"
+    )
+    print(f"dictionaries:       {dict_size / 2**20:8.1f} MiB")
+    print(
+        f"Suggestion objects: {compact_size / 2**20:8.1f} MiB "
+        f"({dict_size / compact_size:.1f}x smaller)"
+    )
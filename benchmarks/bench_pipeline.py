@@ -0,0 +1,355 @@
+"""
+Benchmark searches end-to-end, through `simple.search`, against a fake
+NASA/ADS server (see `fake_ads.py`) serving synthetic corpora.
+
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --scenario similar --repeat 5
+    python benchmarks/bench_pipeline.py --compare results.json
+
+For each scenario this reports the time to the first suggestion, the total
+wall time, the number of requests made of NASA/ADS, the bytes (and lines)
+streamed by `simple.search` (and the bytes sent, if compressed), and the
+peak memory traced during the search.
+The response cache (and the co-author graph, if the server keeps one) is
+cleared before every search. Results are written as JSON, and can be
+compared with those of a previous run.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fake_ads import Corpus, FakeADS  # noqa: E402
+
+# Each scenario is a dictionary of keyword arguments for the `Corpus` and
+# `FakeADS` server, the body of the request to `/search`, and (optionally)
+# `search_utils` settings to use during the scenario, and whether to use a
+# co-author graph (even if the server does not keep one) and keep it between
+# repeats (so that repeats are answered from it).
+SCENARIOS = dict(
+    typical=dict(
+        corpus=dict(articles=300),
+        server=dict(),
+        body=dict(name="Casey, Andrew R."),
+    ),
+    prolific=dict(
+        corpus=dict(articles=5000),
+        server=dict(),
+        body=dict(name="Casey, Andrew R.;Casey, A."),
+    ),
+    collaborations=dict(
+        corpus=dict(
+            articles=400, collaboration_every=10, collaboration_size=2000
+        ),
+        server=dict(),
+        body=dict(name="Casey, Andrew R."),
+    ),
+    similar=dict(
+        corpus=dict(articles=300),
+        server=dict(),
+        body=dict(
+            name="Casey, Andrew R.",
+            similarity_search_on_author_indices=[0, 1, 2],
+        ),
+    ),
+    rate_limited=dict(
+        corpus=dict(articles=500),
+        server=dict(rate_limit_every=5, rate_limit_reset=0.5),
+        body=dict(name="Casey, Andrew R."),
+    ),
+    patches=dict(
+        corpus=dict(
+            articles=400, collaboration_every=10, collaboration_size=2000
+        ),
+        server=dict(),
+        body=dict(name="Casey, Andrew R.", stream="patch"),
+    ),
+    slow_download=dict(
+        corpus=dict(articles=2000, authors=(10, 40)),
+        server=dict(bandwidth=2_000_000),
+        body=dict(name="Casey, Andrew R."),
+    ),
+    flaky=dict(
+        corpus=dict(articles=1000),
+        server=dict(error_every=4, slow_every=5, slow_latency=2),
+        body=dict(name="Casey, Andrew R."),
+        settings=dict(ADS_HEDGE_AFTER=0.5, ADS_RETRY_BACKOFF=0.1),
+    ),
+    repeat_lookup=dict(
+        corpus=dict(articles=500),
+        server=dict(),
+        body=dict(name="Casey, Andrew R."),
+        graph=True,
+    ),
+)
+
+# The metrics that are compared between runs.
+METRICS = (
+    "time_to_first_suggestion",
+    "wall_time",
+    "upstream_requests",
+    "bytes",
+    "wire_bytes",
+    "peak_memory",
+)
+
+
+async def search(client, body):
+    """
+    Search through the server and return a dictionary of timings, and the
+    bytes (as sent, and decompressed) and lines streamed.
+    """
+
+    t_init = time.perf_counter()
+    time_to_first_suggestion = None
+    number_of_bytes = number_of_wire_bytes = number_of_lines = 0
+    async with client.post("/search", json=body) as response:
+        response.raise_for_status()
+        # Accept gzip or zlib (deflate) streams.
+        decompressor = (
+            zlib.decompressobj(32 + zlib.MAX_WBITS)
+            if "Content-Encoding" in response.headers
+            else None
+        )
+        async for chunk in response.content.iter_any():
+            if time_to_first_suggestion is None:
+                time_to_first_suggestion = time.perf_counter() - t_init
+            number_of_wire_bytes += len(chunk)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            number_of_bytes += len(chunk)
+            number_of_lines += chunk.count(b"\n")
+    return dict(
+        time_to_first_suggestion=time_to_first_suggestion,
+        wall_time=time.perf_counter() - t_init,
+        bytes=number_of_bytes,
+        wire_bytes=number_of_wire_bytes,
+        lines=number_of_lines,
+    )
+
+
+async def start(app):
+    runner = web.AppRunner(app, handler_cancellation=True)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    address, port = runner.addresses[0][:2]
+    return (runner, f"http://{address}:{port}")
+
+
+async def run(scenarios, repeat, latency, trace_memory):
+    # These need the environment (and working directory) set up first.
+    import search_utils
+    import simple
+    from graph import CoauthorGraph
+
+    # The graph that the server keeps (if any), and one for the scenarios that
+    # need a graph when the server does not keep one.
+    server_graph, scenario_graph = (simple.graph, None)
+    fake_runner = app_runner = None
+    results = []
+    try:
+        app_runner, url = await start(simple.app)
+        async with aiohttp.ClientSession(
+            url,
+            timeout=aiohttp.ClientTimeout(total=None),
+            auto_decompress=False,
+        ) as client:
+            for name in scenarios:
+                scenario = SCENARIOS[name]
+                fake = FakeADS(
+                    Corpus(**scenario["corpus"]),
+                    **{"latency": latency, **scenario["server"]},
+                )
+                fake_runner, fake_url = await start(fake.app)
+                search_utils.ADS_SEARCH_URL = f"{fake_url}/v1/search/query"
+                settings = scenario.get("settings", dict())
+                defaults = {
+                    setting: getattr(search_utils, setting)
+                    for setting in settings
+                }
+                for setting, value in settings.items():
+                    setattr(search_utils, setting, value)
+                if scenario.get("graph") and server_graph is None:
+                    scenario_graph = scenario_graph or CoauthorGraph(
+                        os.path.join(simple.CACHE_DIRECTORY, "graph.sqlite")
+                    )
+                    simple.graph = scenario_graph
+                else:
+                    simple.graph = server_graph
+
+                for i in range(repeat + trace_memory):
+                    # The last run is traced, because tracing is slow.
+                    traced = i == repeat
+                    simple.response_cache.clear()
+                    if simple.graph is not None:
+                        if i == 0 or not scenario.get("graph"):
+                            simple.graph.clear()
+                        simple.graph.flush()
+                    fake.reset_stats()
+                    if traced:
+                        tracemalloc.start()
+                    result = await search(client, scenario["body"])
+                    if traced:
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        results[-1]["peak_memory"] = peak
+                        continue
+
+                    result.update(
+                        scenario=name,
+                        repeat=i,
+                        upstream_requests=fake.stats["requests"],
+                        similar_requests=fake.stats["similar_requests"],
+                        rate_limited=fake.stats["rate_limited"],
+                        upstream_errors=fake.stats["errors"],
+                        slow_requests=fake.stats["slow"],
+                        upstream_documents=fake.stats["documents"],
+                        upstream_bytes=fake.stats["bytes"],
+                        peak_memory=None,
+                    )
+                    results.append(result)
+                    print(
+                        "{scenario:>16s} #{repeat}: first suggestion "
+                        "{time_to_first_suggestion:.3f} s, total "
+                        "{wall_time:.3f} s, {upstream_requests} requests, "
+                        "{bytes} bytes streamed ({wire_bytes} sent)".format(
+                            **result
+                        ),
+                        file=sys.stderr,
+                    )
+
+                for setting, value in defaults.items():
+                    setattr(search_utils, setting, value)
+                await fake_runner.cleanup()
+                fake_runner = None
+    finally:
+        simple.graph = server_graph
+        if fake_runner is not None:
+            await fake_runner.cleanup()
+        if app_runner is not None:
+            await app_runner.cleanup()
+        if scenario_graph is not None:
+            scenario_graph.close()
+    return results
+
+
+def summarize(results):
+    """Return the median of each metric, for each scenario."""
+    values = dict()
+    for result in results:
+        for metric in METRICS:
+            if result[metric] is not None:
+                values.setdefault(result["scenario"], dict()).setdefault(
+                    metric, []
+                ).append(result[metric])
+    return {
+        name: {metric: statistics.median(v) for metric, v in metrics.items()}
+        for name, metrics in values.items()
+    }
+
+
+def compare(summary, previous):
+    """Print the change in each metric, relative to a previous summary."""
+    for name, metrics in summary.items():
+        if name not in previous:
+            continue
+        changes = []
+        for metric, value in metrics.items():
+            before = previous[name].get(metric)
+            if before:
+                changes.append(f"{metric} {100 * (value / before - 1):+.1f}%")
+        print(f"{name:>16s}: {', '.join(changes)}")
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return dict(
+        commit=commit or None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        time=time.time(),
+        arguments=vars(args),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run (can be given more than once; default is all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, choices=range(1, 100))
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="time (in seconds) that the fake NASA/ADS takes to respond",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="do not run an extra (slower) search to trace peak memory",
+    )
+    parser.add_argument("--output", "-o", help="path to write JSON results")
+    parser.add_argument(
+        "--compare", help="path of previous JSON results to compare with"
+    )
+    args = parser.parse_args()
+
+    # The server reads its templates and static files relative to the
+    # working directory, and keeps its cache in DROPBEAR_CACHE_DIR.
+    os.chdir(ROOT)
+    os.environ.setdefault("ADS_DEV_KEY", "fake")
+    os.environ["DROPBEAR_CACHE_DIR"] = tempfile.mkdtemp(prefix="dropbear-")
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+
+    results = asyncio.run(
+        run(
+            args.scenario or list(SCENARIOS),
+            args.repeat,
+            args.latency,
+            not args.no_memory,
+        )
+    )
+    output = dict(
+        metadata=metadata(args), summary=summarize(results), results=results
+    )
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(output, fp, indent=2)
+    else:
+        print(json.dumps(output["summary"], indent=2))
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            compare(output["summary"], json.load(fp)["summary"])
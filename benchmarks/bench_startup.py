@@ -0,0 +1,180 @@
+"""
+Benchmark how long the server takes to start, and how much memory each
+process needs, by importing it (and then guessing a gender, which needs the
+name dictionary) in fresh Python processes.
+
+    python benchmarks/bench_startup.py --output results.json
+    python benchmarks/bench_startup.py --compare results.json
+
+For each module this reports the wall time to import it, the time to the
+first gender guess after importing it, and the peak resident memory of the
+process after each. Runs are "cold" (with an empty DROPBEAR_CACHE_DIR) or
+"warm" (with the cache left by the cold run). Results are written as JSON,
+and can be compared with those of a previous run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# The modules whose imports are timed.
+MODULES = ("search_utils", "simple")
+
+# The metrics that are compared between runs.
+METRICS = (
+    "import_time",
+    "import_peak_rss",
+    "first_gender_time",
+    "first_gender_peak_rss",
+)
+
+# Run in a fresh interpreter, and print the results as JSON.
+PROBE = """
+import json, resource, sys, time
+def peak_rss():
+    # Linux reports kilobytes, and macOS bytes.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else 1024 * rss
+t_init = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - t_init
+import_peak_rss = peak_rss()
+t_init = time.perf_counter()
+import search_utils
+search_utils.speculate_gender_expression("Andrew")
+first_gender_time = time.perf_counter() - t_init
+print(json.dumps(dict(
+    import_time=import_time,
+    import_peak_rss=import_peak_rss,
+    first_gender_time=first_gender_time,
+    first_gender_peak_rss=peak_rss(),
+)))
+"""
+
+
+def probe(module, cache_directory):
+    """
+    Import the module in a fresh Python process, and return a dictionary of
+    timings and memory use.
+    """
+
+    env = dict(
+        os.environ,
+        ADS_DEV_KEY=os.environ.get("ADS_DEV_KEY", "fake"),
+        DROPBEAR_CACHE_DIR=cache_directory,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(modules, repeat):
+    results = []
+    for module in modules:
+        for i in range(repeat):
+            cache_directory = tempfile.mkdtemp(prefix="dropbear-")
+            for state in ("cold", "warm"):
+                result = probe(module, cache_directory)
+                result.update(scenario=f"{module} ({state})", repeat=i)
+                results.append(result)
+                print(
+                    "{scenario:>22s} #{repeat}: import {import_time:.3f} s "
+                    "({import_peak_rss} bytes), first gender "
+                    "{first_gender_time:.3f} s "
+                    "({first_gender_peak_rss} bytes)".format(**result),
+                    file=sys.stderr,
+                )
+    return results
+
+
+def summarize(results):
+    """Return the median of each metric, for each scenario."""
+    values = dict()
+    for result in results:
+        for metric in METRICS:
+            values.setdefault(result["scenario"], dict()).setdefault(
+                metric, []
+            ).append(result[metric])
+    return {
+        name: {metric: statistics.median(v) for metric, v in metrics.items()}
+        for name, metrics in values.items()
+    }
+
+
+def compare(summary, previous):
+    """Print the change in each metric, relative to a previous summary."""
+    for name, metrics in summary.items():
+        if name not in previous:
+            continue
+        changes = []
+        for metric, value in metrics.items():
+            before = previous[name].get(metric)
+            if before:
+                changes.append(f"{metric} {100 * (value / before - 1):+.1f}%")
+        print(f"{name:>22s}: {', '.join(changes)}")
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return dict(
+        commit=commit or None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        time=time.time(),
+        arguments=vars(args),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--module",
+        action="append",
+        choices=MODULES,
+        help="module to import (can be given more than once; default is all)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, choices=range(1, 100))
+    parser.add_argument("--output", "-o", help="path to write JSON results")
+    parser.add_argument(
+        "--compare", help="path of previous JSON results to compare with"
+    )
+    args = parser.parse_args()
+
+    results = run(args.module or list(MODULES), args.repeat)
+    output = dict(
+        metadata=metadata(args), summary=summarize(results), results=results
+    )
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(output, fp, indent=2)
+    else:
+        print(json.dumps(output["summary"], indent=2))
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            compare(output["summary"], json.load(fp)["summary"])
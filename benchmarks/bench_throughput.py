@@ -0,0 +1,301 @@
+"""
+Benchmark how many searches per second the server completes with different
+numbers of worker processes (see `workers.py`), under a synthetic load
+against a fake NASA/ADS server (see `fake_ads.py`).
+
+    python benchmarks/bench_throughput.py --workers 1 --workers 4
+    python benchmarks/bench_throughput.py --output results.json
+    python benchmarks/bench_throughput.py --compare results.json
+
+For each number of workers this starts `simple.py`, searches once for every
+name in a pool (so that pages of results are cached, and searches are
+limited by collation, not NASA/ADS), and then runs concurrent clients that
+search for names from the pool for a while. It reports the searches per
+second, the median and 95th percentile latency of searches, and the speedup
+over the first number of workers. Results are written as JSON, and can be
+compared with those of a previous run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# The metrics that are compared between runs.
+METRICS = ("searches_per_second", "median_latency", "p95_latency")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_healthy(client, url, workers, timeout=60):
+    # Wait until every worker has reported its health.
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            async with client.get(f"{url}/health") as response:
+                health = await response.json()
+            if sum(w["healthy"] for w in health["workers"]) >= workers:
+                return
+        except (aiohttp.ClientError, ValueError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{workers} workers did not start in time")
+
+
+async def search(client, url, name):
+    t_init = time.perf_counter()
+    async with client.post(f"{url}/search", json=dict(name=name)) as response:
+        response.raise_for_status()
+        await response.read()
+    return time.perf_counter() - t_init
+
+
+async def load(client, url, names, concurrency, duration):
+    # Search for names from the pool (in turn) from concurrent clients, and
+    # return the latency of every search that finished in time.
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def run_client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            latencies.append(await search(client, url, names[i % len(names)]))
+            i += concurrency
+
+    await asyncio.gather(*map(run_client, range(concurrency)))
+    return latencies
+
+
+async def run_scenario(workers, names, concurrency, duration, ads_url):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        ADS_DEV_KEY="fake",
+        ADS_SEARCH_URL=ads_url,
+        DROPBEAR_CACHE_DIR=tempfile.mkdtemp(prefix="dropbear-"),
+        DROPBEAR_HEARTBEAT_INTERVAL="0.5",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "simple.py",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None),
+            connector=aiohttp.TCPConnector(limit=concurrency),
+        ) as client:
+            await wait_until_healthy(client, url, workers)
+            for name in names:
+                await search(client, url, name)
+            t_init = time.perf_counter()
+            latencies = await load(client, url, names, concurrency, duration)
+            wall_time = time.perf_counter() - t_init
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    latencies.sort()
+    return dict(
+        workers=workers,
+        searches=len(latencies),
+        wall_time=wall_time,
+        searches_per_second=len(latencies) / wall_time,
+        median_latency=statistics.median(latencies),
+        p95_latency=latencies[int(0.95 * (len(latencies) - 1))],
+    )
+
+
+async def run(worker_counts, repeat, names, concurrency, duration, corpus):
+    ads_port = free_port()
+    fake = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(ROOT, "benchmarks", "fake_ads.py"),
+            "--port",
+            str(ads_port),
+            "--articles",
+            str(corpus),
+            "--latency",
+            "0.01",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    ads_url = f"http://127.0.0.1:{ads_port}/v1/search/query"
+    results = []
+    try:
+        for workers in worker_counts:
+            for i in range(repeat):
+                result = await run_scenario(
+                    workers, names, concurrency, duration, ads_url
+                )
+                result.update(scenario=f"workers={workers}", repeat=i)
+                results.append(result)
+                print(
+                    "{scenario:>12s} #{repeat}: {searches_per_second:.1f} "
+                    "searches/s ({searches} searches), median latency "
+                    "{median_latency:.3f} s, p95 {p95_latency:.3f} s".format(
+                        **result
+                    ),
+                    file=sys.stderr,
+                )
+    finally:
+        fake.terminate()
+        fake.wait()
+    return results
+
+
+def summarize(results):
+    """
+    Return the median of each metric, for each scenario, and the speedup
+    of searches per second over the first scenario.
+    """
+    values = dict()
+    for result in results:
+        for metric in METRICS:
+            values.setdefault(result["scenario"], dict()).setdefault(
+                metric, []
+            ).append(result[metric])
+    summary = {
+        name: {metric: statistics.median(v) for metric, v in metrics.items()}
+        for name, metrics in values.items()
+    }
+    baseline = next(iter(summary.values()))["searches_per_second"]
+    for metrics in summary.values():
+        metrics["speedup"] = metrics["searches_per_second"] / baseline
+    return summary
+
+
+def compare(summary, previous):
+    """Print the change in each metric, relative to a previous summary."""
+    for name, metrics in summary.items():
+        if name not in previous:
+            continue
+        changes = []
+        for metric, value in metrics.items():
+            before = previous[name].get(metric)
+            if before:
+                changes.append(f"{metric} {100 * (value / before - 1):+.1f}%")
+        print(f"{name:>12s}: {', '.join(changes)}")
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return dict(
+        commit=commit or None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpus=os.cpu_count(),
+        time=time.time(),
+        arguments=vars(args),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--workers",
+        action="append",
+        type=int,
+        help=(
+            "number of worker processes (can be given more than once; "
+            "default is 1, 2, 4, ... up to the number of CPUs)"
+        ),
+    )
+    parser.add_argument("--repeat", type=int, default=1, choices=range(1, 100))
+    parser.add_argument(
+        "--names", type=int, default=50, help="number of names to search for"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="number of searches in flight at once",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="time (in seconds) to run the load for",
+    )
+    parser.add_argument(
+        "--articles",
+        type=int,
+        default=300,
+        help="number of articles that each search finds",
+    )
+    parser.add_argument("--output", "-o", help="path to write JSON results")
+    parser.add_argument(
+        "--compare", help="path of previous JSON results to compare with"
+    )
+    args = parser.parse_args()
+
+    worker_counts = args.workers
+    if not worker_counts:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+    names = [f"Author{i}, A." for i in range(args.names)]
+
+    results = asyncio.run(
+        run(
+            worker_counts,
+            args.repeat,
+            names,
+            args.concurrency,
+            args.duration,
+            args.articles,
+        )
+    )
+    output = dict(
+        metadata=metadata(args), summary=summarize(results), results=results
+    )
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(output, fp, indent=2)
+    else:
+        print(json.dumps(output["summary"], indent=2))
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            compare(output["summary"], json.load(fp)["summary"])
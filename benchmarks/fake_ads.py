@@ -0,0 +1,515 @@
+"""
+A stand-in for the NASA/ADS search API (`/v1/search/query`), serving a
+deterministic synthetic corpus, so that searches can be benchmarked without
+touching the real thing.
+
+    python benchmarks/fake_ads.py --port 8081 --latency 0.05
+
+and then point the server at it:
+
+    ADS_SEARCH_URL=http://localhost:8081/v1/search/query ADS_DEV_KEY=fake \\
+        python simple.py
+
+Every author searched for is "found" on every article in the corpus, at one
+of the first few author positions. `similar()` queries (of one or more
+bibcodes) return articles from a separate part of the corpus, chosen by the
+bibcodes. Year and entry date ranges given as filter queries (e.g.,
+`fq=year:[2010 TO *] AND entdate:[2024-06-01 TO *]`) are honoured. Articles
+are entered on the first day of the month they were published.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import zlib
+from functools import lru_cache
+
+from aiohttp import web
+
+LAST_NAMES = (
+    "Smith",
+    "Jones",
+    "Brown",
+    "Garcia",
+    "Wang",
+    "Li",
+    "Kim",
+    "Nguyen",
+    "Müller",
+    "Schmidt",
+    "Rossi",
+    "Silva",
+    "Sato",
+    "Suzuki",
+    "Ivanov",
+    "Novak",
+    "Kowalski",
+    "Jensen",
+    "Dubois",
+    "Martin",
+    "Casey",
+    "Hogg",
+    "Ness",
+    "Rix",
+    "Foreman-Mackey",
+    "Price-Whelan",
+    "Bovy",
+    "Hawkins",
+)
+FIRST_NAMES = (
+    "Andrew",
+    "Mary",
+    "John",
+    "Wei",
+    "Ana",
+    "Melissa",
+    "David",
+    "Jo",
+    "Hans-Walter",
+    "Jo Bovy",
+    "Keith",
+    "Adrian",
+    "Daniel",
+    "Megan",
+    "Yuki",
+    "Olga",
+    "Pierre",
+    "Sofia",
+    "Lars",
+    "Priya",
+    "Chen",
+    "Fatima",
+    "Ian",
+    "A.",
+    "J. R.",
+    "M.",
+)
+INSTITUTES = (
+    "Department of Physics and Astronomy, Monash University, Australia",
+    "School of Physics & Astronomy, Monash University, Clayton, Australia",
+    "Max Planck Institute for Astronomy, Heidelberg, Germany",
+    "Max-Planck-Institut für Astronomie, Königstuhl 17, Heidelberg",
+    "Center for Astrophysics | Harvard & Smithsonian, Cambridge, MA, USA",
+    "Harvard-Smithsonian Center for Astrophysics, Cambridge, MA 02138",
+    "Institute of Astronomy, University of Cambridge, UK",
+    "Kavli Institute for Cosmology, Cambridge, UK",
+    "Center for Computational Astrophysics, Flatiron Institute, New York",
+    "Department of Astronomy, University of Toronto, Canada",
+    "National Astronomical Observatory of Japan, Tokyo, Japan",
+    "-",
+)
+
+# The number of distinct (synthetic) people in the corpus.
+NUMBER_OF_PEOPLE = 20_000
+
+
+class Corpus:
+    """
+    A deterministic synthetic corpus of articles.
+
+    :param articles: [optional]
+        The number of articles found by an author search. Default is 1000.
+
+    :param authors: [optional]
+        A tuple of the smallest and largest number of authors on an (ordinary)
+        article. Default is `(1, 12)`.
+
+    :param collaboration_every: [optional]
+        Make every n-th article a large collaboration paper. Default is 0 (no
+        collaboration papers).
+
+    :param collaboration_size: [optional]
+        The number of authors on each collaboration paper. Default is 2000.
+
+    :param seed: [optional]
+        The random seed for the corpus. Default is 0.
+    """
+
+    def __init__(
+        self,
+        articles=1000,
+        authors=(1, 12),
+        collaboration_every=0,
+        collaboration_size=2000,
+        seed=0,
+    ):
+        self.articles = articles
+        self.authors = authors
+        self.collaboration_every = collaboration_every
+        self.collaboration_size = collaboration_size
+        self.seed = seed
+        self.doc = lru_cache(maxsize=4 * articles)(self._doc)
+
+    def person(self, index):
+        rng = random.Random(f"{self.seed}:person:{index}")
+        name = f"{rng.choice(LAST_NAMES)}{index // len(LAST_NAMES) or ''}, "
+        name += rng.choice(FIRST_NAMES)
+        affiliation = rng.choice(INSTITUTES)
+        if rng.random() < 0.2:
+            affiliation += f" ; {rng.choice(INSTITUTES)}"
+        # People who share a "Lastname, F." share an ORCID, otherwise the
+        # server will (rightly) refuse to merge them.
+        key = zlib.crc32(f"{name[:name.index(',') + 3]}".encode()) % 10**8
+        orcid = f"0000-0002-{key // 10_000:04d}-{key % 10_000:04d}"
+        return (name, affiliation, orcid if rng.random() < 0.3 else "-")
+
+    def year(self, index):
+        """Return the year of an article. Articles are most recent first."""
+        return 2024 - (index % self.articles) * 30 // max(self.articles, 1)
+
+    def _doc(self, index):
+        rng = random.Random(f"{self.seed}:article:{index}")
+        year = self.year(index)
+        month = rng.randint(0, 12)
+        is_collaboration = bool(
+            self.collaboration_every and index % self.collaboration_every == 0
+        )
+        size = (
+            self.collaboration_size
+            if is_collaboration
+            else rng.randint(*self.authors)
+        )
+        team = [
+            self.person(rng.randrange(NUMBER_OF_PEOPLE)) for _ in range(size)
+        ]
+        if is_collaboration:
+            team.insert(0, ("Gaia Collaboration", "-", "-"))
+
+        return dict(
+            id=str(1_000_000 + index),
+            bibcode=f"{year}FAKE.{index:09d}{chr(65 + index % 26)}",
+            year=str(year),
+            pubdate=f"{year}-{month:02d}-00",
+            entdate=f"{year}-{max(month, 1):02d}-01",
+            author=[name for name, _, _ in team],
+            aff=[affiliation for _, affiliation, _ in team],
+            orcid=[orcid for _, _, orcid in team],
+        )
+
+    def _filtered(self, indices, years=None, entered_since=None):
+        if years is not None:
+            first, last = years
+            indices = [
+                index for index in indices if first <= self.year(index) <= last
+            ]
+        if entered_since is not None:
+            indices = [
+                index
+                for index in indices
+                if self.doc(index)["entdate"] >= entered_since
+            ]
+        return list(indices)
+
+    def search(
+        self, author_names, start, rows, years=None, entered_since=None
+    ):
+        """
+        Return the number of articles found by the given author names, and
+        the articles on the requested page.
+
+        :param years: [optional]
+            The first and last years (inclusive) of articles to find.
+
+        :param entered_since: [optional]
+            Only find articles entered on or after this date (YYYY-MM-DD).
+        """
+
+        indices = self._filtered(range(self.articles), years, entered_since)
+        docs = []
+        for index in indices[start : start + rows]:
+            doc = self.doc(index)
+            # Put the searched-for author somewhere near the front.
+            name = author_names[index % len(author_names)]
+            position = min(index % 4, len(doc["author"]))
+            docs.append(
+                dict(
+                    doc,
+                    author=_inserted(doc["author"], position, name),
+                    aff=_inserted(doc["aff"], position, INSTITUTES[0]),
+                    orcid=_inserted(doc["orcid"], position, "-"),
+                )
+            )
+        return (len(indices), docs)
+
+    def similar(self, bibcodes, start, rows, years=None, entered_since=None):
+        """
+        Return the articles similar to the given bibcodes, which come from
+        beyond the articles found by author searches. Articles similar to
+        different bibcodes often overlap.
+        """
+
+        indices = dict()
+        for bibcode in bibcodes:
+            offset = self.articles + zlib.crc32(bibcode.encode()) % max(
+                self.articles, 1
+            )
+            for index in range(offset, offset + rows):
+                indices.setdefault(index)
+        indices = self._filtered(indices, years, entered_since)
+        return (
+            len(indices),
+            [self.doc(index) for index in indices[start : start + rows]],
+        )
+
+
+def _inserted(items, position, item):
+    items = list(items)
+    items.insert(position, item)
+    return items
+
+
+class FakeADS:
+    """
+    An `aiohttp` application that serves a `Corpus` like `/v1/search/query`,
+    and counts the requests made of it.
+
+    :param corpus:
+        The `Corpus` to serve.
+
+    :param latency: [optional]
+        The time (in seconds) to wait before responding. Default is 0.05.
+
+    :param jitter: [optional]
+        The maximum (uniformly distributed) time to add to the latency.
+        Default is 0.
+
+    :param rate_limit_every: [optional]
+        Respond to every n-th request with "429 Too Many Requests". Default is
+        0 (never).
+
+    :param rate_limit_reset: [optional]
+        The time (in seconds) until the rate limit resets, after a 429
+        response. Default is 1.
+
+    :param daily_limit: [optional]
+        The value of the `X-RateLimit-Limit` header. Default is 5000. Like
+        NASA/ADS, every other response reports the quota in rate limit
+        headers, with `X-RateLimit-Reset` at the next midnight (UTC).
+
+    :param error_every: [optional]
+        Respond to every n-th request with "503 Service Unavailable" (with
+        the usual rate limit headers). Default is 0 (never).
+
+    :param slow_every: [optional]
+        Add `slow_latency` to the latency of every n-th request. Default is 0
+        (never).
+
+    :param slow_latency: [optional]
+        The time (in seconds) to add to slow requests. Default is 1.
+
+    :param bandwidth: [optional]
+        The rate (in bytes per second) to send response bodies at. Default is
+        `None` (as fast as possible).
+    """
+
+    def __init__(
+        self,
+        corpus,
+        latency=0.05,
+        jitter=0,
+        rate_limit_every=0,
+        rate_limit_reset=1,
+        daily_limit=5000,
+        error_every=0,
+        slow_every=0,
+        slow_latency=1,
+        bandwidth=None,
+    ):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_reset = rate_limit_reset
+        self.daily_limit = daily_limit
+        self.error_every = error_every
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.bandwidth = bandwidth
+        self._rng = random.Random(corpus.seed)
+        self.reset_stats()
+
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.get("/v1/search/query", self.query),
+                web.get("/stats", self.get_stats),
+            ]
+        )
+
+    def reset_stats(self):
+        """Reset the request counters."""
+        self.stats = dict(
+            requests=0,
+            similar_requests=0,
+            rate_limited=0,
+            errors=0,
+            slow=0,
+            documents=0,
+            bytes=0,
+        )
+
+    def quota_headers(self):
+        """
+        Return the rate limit headers of a response: the daily quota, what
+        is left of it, and when it resets (at the next midnight, UTC).
+        """
+        day = 24 * 60 * 60
+        return {
+            "X-RateLimit-Limit": str(self.daily_limit),
+            "X-RateLimit-Remaining": str(
+                max(0, self.daily_limit - self.stats["requests"])
+            ),
+            "X-RateLimit-Reset": str((int(time.time()) // day + 1) * day),
+        }
+
+    async def get_stats(self, request):
+        return web.json_response(self.stats)
+
+    async def query(self, request):
+        self.stats["requests"] += 1
+        number = self.stats["requests"]
+        params = request.query
+        q = params.get("q", "")
+
+        latency = self.latency + self._rng.uniform(0, self.jitter)
+        if self.slow_every and number % self.slow_every == 0:
+            self.stats["slow"] += 1
+            latency += self.slow_latency
+        await asyncio.sleep(latency)
+
+        if self.error_every and number % self.error_every == 0:
+            self.stats["errors"] += 1
+            return web.Response(
+                status=503,
+                text="Service Unavailable",
+                headers=self.quota_headers(),
+            )
+
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.stats["rate_limited"] += 1
+            return web.Response(
+                status=429,
+                text="Too Many Requests",
+                headers={
+                    "X-RateLimit-Limit": str(self.daily_limit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(
+                        math.ceil(time.time() + self.rate_limit_reset)
+                    ),
+                },
+            )
+
+        rows = int(params.get("rows", 10))
+        cursor_mark = params.get("cursorMark")
+        if cursor_mark is not None:
+            start = 0 if cursor_mark == "*" else int(cursor_mark)
+        else:
+            start = int(params.get("start", 0))
+
+        years = entered_since = None
+        fq = params.get("fq", "")
+        match = re.search(r"year:\[(\d+|\*) TO (\d+|\*)\]", fq)
+        if match:
+            years = (
+                0 if match.group(1) == "*" else int(match.group(1)),
+                9999 if match.group(2) == "*" else int(match.group(2)),
+            )
+        match = re.search(r"entdate:\[([\d-]+) TO \*\]", fq)
+        if match:
+            entered_since = match.group(1)
+
+        match = re.fullmatch(r"similar\((.+)\)", q.strip())
+        if match:
+            self.stats["similar_requests"] += 1
+            # Either "similar(bibcode)" or "similar(bibcode:("A" OR ...))".
+            bibcodes = re.findall(r'"([^"]+)"', match.group(1)) or [
+                match.group(1)
+            ]
+            num_found, docs = self.corpus.similar(
+                bibcodes, start, rows, years, entered_since
+            )
+        else:
+            author_names = re.findall(r'author:"([^"]+)"', q)
+            if not author_names:
+                raise web.HTTPBadRequest(reason="Expected an author query")
+            num_found, docs = self.corpus.search(
+                author_names, start, rows, years, entered_since
+            )
+
+        fields = params.get("fl")
+        if fields:
+            fields = fields.split(",")
+            docs = [{k: doc[k] for k in fields if k in doc} for doc in docs]
+
+        content = dict(
+            responseHeader=dict(status=0, params=dict(params)),
+            response=dict(numFound=num_found, start=start, docs=docs),
+        )
+        if cursor_mark is not None:
+            content["nextCursorMark"] = str(start + len(docs))
+
+        body = json.dumps(content).encode("utf-8")
+        self.stats["documents"] += len(docs)
+        self.stats["bytes"] += len(body)
+        headers = self.quota_headers()
+        if self.bandwidth is None:
+            return web.Response(
+                body=body, content_type="application/json", headers=headers
+            )
+
+        # Trickle the body out, like a slow connection.
+        response = web.StreamResponse(headers=headers)
+        response.content_type = "application/json"
+        response.content_length = len(body)
+        await response.prepare(request)
+        chunk_size = 16 * 1024
+        for i in range(0, len(body), chunk_size):
+            chunk = body[i : i + chunk_size]
+            await response.write(chunk)
+            await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--collaboration-every", type=int, default=0)
+    parser.add_argument("--collaboration-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--rate-limit-reset", type=float, default=1)
+    parser.add_argument("--error-every", type=int, default=0)
+    parser.add_argument("--slow-every", type=int, default=0)
+    parser.add_argument("--slow-latency", type=float, default=1)
+    parser.add_argument("--bandwidth", type=float, default=None)
+    args = parser.parse_args()
+
+    corpus = Corpus(
+        articles=args.articles,
+        collaboration_every=args.collaboration_every,
+        collaboration_size=args.collaboration_size,
+        seed=args.seed,
+    )
+    fake = FakeADS(
+        corpus,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_every=args.rate_limit_every,
+        rate_limit_reset=args.rate_limit_reset,
+        error_every=args.error_every,
+        slow_every=args.slow_every,
+        slow_latency=args.slow_latency,
+        bandwidth=args.bandwidth,
+    )
+    web.run_app(fake.app, port=args.port)
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# The directory where on-disk caches (and other state) are kept.
+CACHE_DIRECTORY = os.getenv(
+    "DROPBEAR_CACHE_DIR", os.path.expanduser("~/.dropbear")
+)
+
+# The size (in bytes of serialized JSON) of responses to keep in memory.
+MEMORY_CACHE_SIZE = int(
+    float(os.getenv("DROPBEAR_CACHE_MEMORY_MB", 128)) * 1024 * 1024
+)
+
+
+class ResponseCache:
+    """
+    A two-tier cache of NASA/ADS search responses, keyed on the (normalized)
+    query parameters.
+
+    The first tier is an in-memory least-recently-used cache. The second
+    (optional) tier is an on-disk SQLite database, which persists between
+    server restarts. Entries in both tiers expire after `ttl` seconds.
+
+    Cached responses are shared between callers, so they must be treated as
+    read-only.
+
+    :param path: [optional]
+        The path of the SQLite database to use for the on-disk tier. If `None`
+        is given then only the in-memory tier will be used.
+
+    :param max_memory_bytes: [optional]
+        The maximum size of the responses to keep in memory, measured as the
+        length of their serialized JSON. Parsed responses take a few times
+        more memory than that. The least recently used responses are evicted
+        first. Default is 128 MB (or `DROPBEAR_CACHE_MEMORY_MB`).
+
+    :param max_disk_entries: [optional]
+        The maximum number of responses to keep on disk. The least recently
+        used responses are evicted first. Default is 100,000.
+
+    :param ttl: [optional]
+        The time (in seconds) before a cached response expires. Default is one
+        day.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_memory_bytes=MEMORY_CACHE_SIZE,
+        max_disk_entries=100_000,
+        ttl=24 * 60 * 60,
+    ):
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._connection = None
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            # Worker processes (see `workers.py`) share the database, so
+            # wait for each other's writes, and read it through a memory
+            # map rather than copying pages into each process.
+            self._connection = sqlite3.connect(path, timeout=30)
+            self._connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA mmap_size=268435456;
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed
+                    ON responses (accessed);
+                """)
+
+    @staticmethod
+    def key(params):
+        """
+        Return a normalized cache key for the given NASA/ADS query parameters.
+
+        Whitespace in the query is collapsed, the requested fields are sorted,
+        and all values are compared as strings, so that `rows=20` and
+        `rows="20"` share a cache entry.
+
+        :param params:
+            A dictionary of query parameters.
+        """
+
+        normalized = dict()
+        for name, value in params.items():
+            if value is None:
+                continue
+            value = " ".join(str(value).split())
+            if name == "fl":
+                value = ",".join(sorted(set(value.split(","))))
+            normalized[name] = value
+        return json.dumps(normalized, sort_keys=True)
+
+    def get(self, params):
+        """
+        Return the cached response for the given query parameters, or `None`
+        if no (unexpired) response is cached.
+
+        :param params:
+            A dictionary of query parameters.
+        """
+
+        key = self.key(params)
+        now = time.time()
+
+        try:
+            expires, size, content = self._memory[key]
+        except KeyError:
+            pass
+        else:
+            if expires > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return content
+            self._forget(key)
+
+        if self._connection is not None:
+            row = self._connection.execute(
+                "SELECT content, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                serialized, expires = row
+                if expires > now:
+                    with self._connection:
+                        self._connection.execute(
+                            "UPDATE responses SET accessed = ? WHERE key = ?",
+                            (now, key),
+                        )
+                    content = json.loads(serialized)
+                    self._remember(key, expires, len(serialized), content)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return content
+
+                with self._connection:
+                    self._connection.execute(
+                        "DELETE FROM responses WHERE key = ?", (key,)
+                    )
+
+        self.misses += 1
+        return None
+
+    def set(self, params, content):
+        """
+        Cache a response for the given query parameters.
+
+        :param params:
+            A dictionary of query parameters.
+
+        :param content:
+            The (JSON-serializable) response from NASA/ADS.
+        """
+
+        key = self.key(params)
+        now = time.time()
+        expires = now + self.ttl
+        serialized = json.dumps(content)
+        self._remember(key, expires, len(serialized), content)
+
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, serialized, expires, now),
+                )
+            self._disk_writes += 1
+            # Counting rows is not free, so only check the size of the disk
+            # tier every so often.
+            if self._disk_writes % 100 == 1:
+                self._evict_from_disk(now)
+
+    def _remember(self, key, expires, size, content):
+        self._forget(key)
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = (expires, size, content)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted
+            self.evictions += 1
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def _evict_from_disk(self, now):
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM responses WHERE expires <= ?", (now,)
+            )
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()
+            excess = count - self.max_disk_entries
+            if excess > 0:
+                logger.debug(f"Evicting {excess} responses from disk cache")
+                self._connection.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed LIMIT ?
+                    )
+                    """,
+                    (excess,),
+                )
+                self.evictions += excess
+
+    @property
+    def stats(self):
+        """Return a dictionary of cache hit/miss counters."""
+        requests = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            memory_hits=self.memory_hits,
+            disk_hits=self.disk_hits,
+            evictions=self.evictions,
+            hit_rate=self.hits / requests if requests else 0.0,
+            memory_entries=len(self._memory),
+            memory_bytes=self._memory_bytes,
+        )
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        """Close the on-disk tier of the cache, if there is one."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
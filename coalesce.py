@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def search_key(author_names, **kwds):
+    """
+    Return a key that is the same for searches that will find the same
+    suggestions: the set of author names (ignoring order and whitespace),
+    and the search keyword arguments.
+
+    :param author_names:
+        A list-like object of author names.
+
+    :param kwds: [optional]
+        Keyword arguments for the search (which must be JSON-serializable).
+    """
+    names = sorted({" ".join(name.split()) for name in author_names} - {""})
+    return json.dumps([names, kwds], sort_keys=True)
+
+
+class SharedSearch:
+    """
+    A search whose suggestions are shared between any number of subscribers.
+
+    The search runs in its own task, so it is not held back by slow
+    subscribers. Each subscriber is sent the latest state of every suggestion
+    that has changed since they last looked, so a slow subscriber skips
+    intermediate updates rather than falling further behind.
+
+    :param suggestions:
+        An asynchronous generator of suggestions, which have a
+        `unique_name_descriptor`. Suggestions with a true `removed` attribute
+        (see `ranking.RemovedSuggestion`) are passed on to subscribers, and
+        forgotten.
+
+    :param budget: [optional]
+        The `search_utils.SearchBudget` of the search, if it has one.
+    """
+
+    def __init__(self, suggestions, budget=None):
+        self.budget = budget
+        self.suggestions = dict()
+        self.exception = None
+        self._subscribers = []
+        self._task = asyncio.ensure_future(self._run(suggestions))
+
+    @property
+    def done(self):
+        """Return whether the search has finished."""
+        return self._task.done()
+
+    def add_done_callback(self, callback):
+        """Call the given function (with no arguments) once the search ends."""
+        self._task.add_done_callback(lambda task: callback())
+
+    async def _run(self, suggestions):
+        try:
+            async for suggestion in suggestions:
+                key = suggestion.unique_name_descriptor
+                if getattr(suggestion, "removed", False):
+                    # New subscribers need never see it.
+                    self.suggestions.pop(key, None)
+                else:
+                    self.suggestions[key] = suggestion
+                for pending, updated in self._subscribers:
+                    pending[key] = suggestion
+                    updated.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            self.exception = exception
+        finally:
+            for _, updated in self._subscribers:
+                updated.set()
+
+    async def subscribe(self):
+        """
+        Return a generator that yields the suggestions found so far, and then
+        each suggestion as it is updated, until the search has finished.
+        """
+
+        # Replay everything found so far.
+        pending, updated = (dict(self.suggestions), asyncio.Event())
+        subscriber = (pending, updated)
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                if pending:
+                    suggestions = list(pending.values())
+                    pending.clear()
+                    for suggestion in suggestions:
+                        yield suggestion
+                elif self.done:
+                    break
+                else:
+                    updated.clear()
+                    await updated.wait()
+
+            if self.exception is not None:
+                raise self.exception
+        finally:
+            self._subscribers.remove(subscriber)
+            if not self._subscribers and not self.done:
+                logger.info("Cancelling search with no subscribers left")
+                self._task.cancel()
+
+
+class SearchCoalescer:
+    """
+    Coalesce identical searches that run at the same time, so that only the
+    first one searches NASA/ADS, and the others share its suggestions.
+    """
+
+    def __init__(self):
+        self.searches = dict()
+
+    def join(self, key, search, budget=None):
+        """
+        Return the `SharedSearch` with the given key, starting the search if
+        it is not already running.
+
+        :param key:
+            A key that identifies the search (see `search_key`).
+
+        :param search:
+            A function that takes no arguments and returns an asynchronous
+            generator of suggestions. This is only called if no search with
+            the same key is running.
+
+        :param budget: [optional]
+            The `search_utils.SearchBudget` used by the search, if a new
+            search is started. The budget should be part of the key.
+        """
+
+        shared = self.searches.get(key)
+        if shared is None or shared.done:
+            shared = self.searches[key] = SharedSearch(search(), budget)
+            shared.add_done_callback(lambda: self._forget(key, shared))
+        else:
+            metrics.COALESCED_SEARCHES.inc()
+        return shared
+
+    def _forget(self, key, shared):
+        if self.searches.get(key) is shared:
+            del self.searches[key]
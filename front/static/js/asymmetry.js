@@ -5,71 +5,247 @@
     $('[data-toggle="popover"]').popover();
 
     //
-    let timeout = null;
-    let authors = {};
     const template = document.getElementById("rowTemplate").innerHTML;
-    let table = document.getElementById("resultsTable");
-    function updateTable() {
-      if (timeout) clearTimeout(timeout);
-      timeout = setTimeout(() => {
-        let rows = "";
-        for (const name in authors) {
-          rows += Mustache.render(template, authors[name]);
+    const table = document.getElementById("resultsTable");
+    const tableBody = document.getElementById("tableBody");
+    const headers = Array.from(table.querySelectorAll("th[data-field]"));
+    // Rows rendered above and below what is visible, so scrolling is smooth.
+    const overscan = 10;
+
+    // Authors by unique name descriptor, and a version for each that changes
+    // whenever the author does.
+    let authors = new Map();
+    let versions = new Map();
+    let version = 0;
+    // The keys of all authors in sort order, and the value each author was
+    // sorted by (to find it again when it changes).
+    let order = [];
+    let sortedBy = new Map();
+    let sort = { field: "number_of_articles", descending: true };
+    // Rendered rows by key (only those near the visible window are kept), and
+    // the height of a row, measured once one is rendered.
+    let rows = new Map();
+    let rowHeight = 41;
+    let frame = null;
+
+    function sortValue(author) {
+      const value = author[sort.field];
+      return typeof value === "number" ? value : String(value || "").toLowerCase();
+    }
+    // Order authors by the sort field, breaking ties by key so every author
+    // has exactly one place.
+    function compare(valueA, keyA, valueB, keyB) {
+      if (valueA < valueB) return sort.descending ? 1 : -1;
+      if (valueA > valueB) return sort.descending ? -1 : 1;
+      return keyA < keyB ? -1 : (keyA > keyB ? 1 : 0);
+    }
+    function bisect(value, key) {
+      let low = 0, high = order.length;
+      while (low < high) {
+        const middle = (low + high) >>> 1;
+        const other = order[middle];
+        if (compare(sortedBy.get(other), other, value, key) < 0) {
+          low = middle + 1;
+        } else {
+          high = middle;
+        }
+      }
+      return low;
+    }
+    // Move an author to their place in the sort order, without sorting the
+    // other authors again.
+    function reposition(key) {
+      const value = sortValue(authors.get(key));
+      if (sortedBy.has(key)) {
+        if (sortedBy.get(key) === value) return;
+        order.splice(bisect(sortedBy.get(key), key), 1);
+      }
+      order.splice(bisect(value, key), 0, key);
+      sortedBy.set(key, value);
+    }
+    function remove(key) {
+      if (sortedBy.has(key)) {
+        order.splice(bisect(sortedBy.get(key), key), 1);
+        sortedBy.delete(key);
+      }
+      authors.delete(key);
+      versions.delete(key);
+      rows.delete(key);
+    }
+    function sortBy(field) {
+      sort = {
+        field: field,
+        descending: sort.field === field ? !sort.descending : true
+      };
+      sortedBy = new Map();
+      for (const [key, author] of authors) {
+        sortedBy.set(key, sortValue(author));
+      }
+      order = Array.from(authors.keys()).sort(
+        (a, b) => compare(sortedBy.get(a), a, sortedBy.get(b), b)
+      );
+      showSortOrder();
+      scheduleRender();
+    }
+    function showSortOrder() {
+      for (const header of headers) {
+        if (header.dataset.field === sort.field) {
+          header.setAttribute("data-sorted", "true");
+          header.setAttribute(
+            "data-sorted-direction", sort.descending ? "descending" : "ascending"
+          );
+        } else {
+          header.removeAttribute("data-sorted");
+          header.removeAttribute("data-sorted-direction");
         }
-        document.getElementById("tableBody").innerHTML = rows;
-        Sortable.initTable(table);
-      }, 10); // set this low for more frequent table updates
+      }
+    }
+    for (const header of headers) {
+      header.onclick = () => sortBy(header.dataset.field);
+    }
+    showSortOrder();
+
+    // Render only the rows in (or near) the visible window, between spacers
+    // that stand in for the rest. Rows are only re-rendered when their author
+    // has changed.
+    function spacer(height) {
+      const row = document.createElement("tr");
+      row.style.height = height + "px";
+      return row;
+    }
+    function renderRow(key) {
+      const cached = rows.get(key);
+      if (cached && cached.version === versions.get(key)) return cached.element;
+      const body = document.createElement("tbody");
+      body.innerHTML = Mustache.render(template, authors.get(key));
+      const element = body.firstElementChild;
+      rows.set(key, { element: element, version: versions.get(key) });
+      return element;
+    }
+    function render() {
+      frame = null;
+      const offset = -tableBody.getBoundingClientRect().top;
+      const first = Math.max(0, Math.floor(offset / rowHeight) - overscan);
+      const last = Math.min(
+        order.length,
+        Math.ceil((offset + window.innerHeight) / rowHeight) + overscan
+      );
+      const visible = order.slice(first, Math.max(first, last));
+      const elements = visible.map(renderRow);
+      tableBody.replaceChildren(
+        spacer(first * rowHeight),
+        ...elements,
+        spacer(Math.max(0, order.length - first - visible.length) * rowHeight)
+      );
+      if (elements.length && elements[0].offsetHeight) {
+        rowHeight = elements[0].offsetHeight;
+      }
+      // Forget rows that have scrolled far away.
+      if (rows.size > 4 * visible.length) {
+        const keep = new Set(visible);
+        for (const key of rows.keys()) {
+          if (!keep.has(key)) rows.delete(key);
+        }
+      }
+      updateProgressText(order.length);
+    }
+    function scheduleRender() {
+      if (frame === null) frame = requestAnimationFrame(render);
+    }
+    window.addEventListener("scroll", scheduleRender, { passive: true });
+    window.addEventListener("resize", scheduleRender);
+
+    // Apply a patch from the server (see streaming.PatchStream) to the author
+    // it describes.
+    function applyPatch(patch) {
+      // Skip lines that are not about an author (e.g., budget summaries).
+      if (!patch.unique_name_descriptor) return;
+      const key = patch.unique_name_descriptor;
+      if (patch.removed) {
+        remove(key);
+        return;
+      }
+      const author = authors.get(key) || {};
+      Object.assign(author, patch.set || {});
+      for (const field in patch.append || {}) {
+        author[field] = (author[field] || []).concat(patch.append[field]);
+      }
+      for (const field in patch.add || {}) {
+        author[field] = Array.from(
+          new Set((author[field] || []).concat(patch.add[field]))
+        ).sort();
+      }
+      if (author.inferred_gender) {
+        if (author.inferred_gender == "andy") {
+          author.inferred_gender = "unknown";
+        } else if (author.inferred_gender.startsWith("mostly_")) {
+          author.inferred_gender = author.inferred_gender.substring(7);
+        }
+      }
+      authors.set(key, author);
+      versions.set(key, ++version);
+      reposition(key);
     }
     function updateProgressText(numberOfSuggestions) {
       document.getElementById("progressText").innerHTML = numberOfSuggestions + " suggestions";
     }
 
+    // Read a stream of newline-delimited JSON, calling `onLine` with each
+    // object. A line (or character) can be split across chunks, so only
+    // complete lines are parsed, and the rest is kept for the next chunk.
+    async function readLines(response, onLine, onChunk) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      function parse(line) {
+        if (!line.trim()) return;
+        try {
+          onLine(JSON.parse(line));
+        }
+        catch (err) {
+          console.warn("Skipping unreadable line", line, err);
+        }
+      }
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.forEach(parse);
+        onChunk();
+      }
+      parse(buffer + decoder.decode());
+      onChunk();
+    }
+
     // Enable search
     const field = document.getElementById("authorName");
+    let controller = null;
     document.getElementById("searchForm").onsubmit = (event) => {
       event.preventDefault();
-      authors = {};
       const name = field.value;
       if (!name) return false;
+      // Stop the previous search (the server stops searching, too).
+      if (controller) controller.abort();
+      controller = new AbortController();
+      authors = new Map();
+      versions = new Map();
+      order = [];
+      sortedBy = new Map();
+      rows = new Map();
+      scheduleRender();
       fetch("/search", {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ name: name })
+        body: JSON.stringify({ name: name, stream: "patch", flush_interval: 0.1 }),
+        signal: controller.signal
       })
-        .then(async response => {
-          const reader = response.body.getReader();
-          let prevText = "";
-          function process() {
-            reader.read().then(({ value, done }) => {
-              if (done) {
-                return;
-              }
-              const text = prevText + new TextDecoder().decode(value);
-              prevText = "";
-              text.match(/[^\r\n]+/g).forEach((value) => {
-                try {
-                  const author = JSON.parse(value);
-                  if (author.inferred_gender) {
-                    if (author.inferred_gender == "andy") {
-                      author.inferred_gender = "unknown";
-                    } else if (author.inferred_gender.startsWith("mostly_")) {
-                      author.inferred_gender = author.inferred_gender.substring(7);
-                    }
-                  }
-                  authors[author.unique_name_descriptor] = author;
-                }
-                catch (err) {
-                  prevText = value;
-                }
-              });
-              updateTable();
-              updateProgressText(Object.keys(authors).length);
-              process();
-            });
-          }
-          process();
+        .then(response => readLines(response, applyPatch, scheduleRender))
+        .catch(err => {
+          if (err.name !== "AbortError") throw err;
         });
       return false;
     };
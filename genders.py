@@ -0,0 +1,108 @@
+import logging
+import os
+import pickle
+import tempfile
+
+import gender_guesser
+
+from cache import CACHE_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+# The precomputed genders of first names, built once from the
+# `gender_guesser` dictionary and then loaded from disk.
+GENDERS_PATH = os.path.join(CACHE_DIRECTORY, "genders.pickle")
+
+# The dictionary that the genders are built from.
+NAME_DICTIONARY_PATH = os.path.join(
+    os.path.dirname(gender_guesser.__file__), "data", "nam_dict.txt"
+)
+
+# Change this to rebuild cached genders (e.g., if the format changes).
+FORMAT_VERSION = 1
+
+_genders = None
+
+
+def _source():
+    # Identifies the dictionary that the cached genders were built from.
+    stat = os.stat(NAME_DICTIONARY_PATH)
+    return (FORMAT_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def build_genders():
+    """
+    Return a dictionary of the most likely gender of every first name in the
+    `gender_guesser` dictionary (ignoring country), exactly as
+    `gender_guesser.detector.Detector().get_gender` would return it.
+
+    This parses the whole dictionary, which is slow (and uses a lot of
+    memory), so it is only done once and cached on disk by `load_genders`.
+    """
+
+    import gender_guesser.detector
+
+    detector = gender_guesser.detector.Detector()
+    # Share one string object for each gender, so they pickle compactly.
+    genders = {}
+    return {
+        name: genders.setdefault(gender, gender)
+        for name, gender in (
+            (name, detector.get_gender(name)) for name in detector.names
+        )
+    }
+
+
+def load_genders(path=GENDERS_PATH):
+    """
+    Return the dictionary of first names and their most likely genders,
+    loading it from disk if it was cached by an earlier process, or building
+    (and caching) it otherwise.
+
+    :param path: [optional]
+        The path of the cached genders. If `None` is given then the genders
+        are built without being cached.
+    """
+
+    source = _source()
+    if path is not None:
+        try:
+            with open(path, "rb") as fp:
+                cached_source, genders = pickle.load(fp)
+            if cached_source == source:
+                return genders
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception(f"Rebuilding unreadable genders in {path}")
+
+    genders = build_genders()
+    if path is not None:
+        # Write atomically, in case other processes are loading it.
+        try:
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=directory, delete=False
+            ) as fp:
+                pickle.dump((source, genders), fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(fp.name, path)
+        except OSError:
+            logger.exception(f"Could not cache genders in {path}")
+    return genders
+
+
+def get_gender(first_name):
+    """
+    Return the most likely gender of a first name (see
+    `search_utils.speculate_gender_expression`). The genders are loaded the
+    first time this is called.
+
+    :param first_name:
+        The first name of a person.
+    """
+
+    global _genders
+    if _genders is None:
+        _genders = load_genders()
+    return _genders.get(first_name, "unknown")
@@ -0,0 +1,533 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from search_utils import Article
+
+logger = logging.getLogger(__name__)
+
+# How long (in seconds) a neighborhood is answered from the graph alone,
+# before NASA/ADS is asked for articles entered since.
+GRAPH_MAX_AGE = float(os.getenv("DROPBEAR_GRAPH_MAX_AGE", 24 * 60 * 60))
+
+# The number of author IDs to remember, rather than look up.
+AUTHOR_ID_CACHE_SIZE = 100_000
+
+# A result from `CoauthorGraph.lookup`: the articles to answer a search
+# with, when their neighborhood was refreshed, whether that was more than
+# `max_age` ago, and whether its search found every article in its years.
+Lookup = namedtuple("Lookup", ("articles", "refreshed", "stale", "complete"))
+
+
+def _names_key(names):
+    # The same names, in any order or spacing, are the same search.
+    return json.dumps(sorted({" ".join(name.split()) for name in names}))
+
+
+def _neighborhood_key(names, year_range, rows):
+    # Open-ended year ranges are stored with bounds that include any year.
+    first_year, last_year = year_range or (None, None)
+    return (
+        _names_key(names),
+        -1 if first_year is None else first_year,
+        9999 if last_year is None else last_year,
+        rows,
+    )
+
+
+def _compress(article):
+    # What is needed to collate the article again (besides its bibcode and
+    # year, which have their own columns).
+    return zlib.compress(
+        json.dumps(
+            [
+                article.pubdate,
+                article.authors,
+                article.keys,
+                article.affiliations,
+                article.orcids,
+            ],
+            separators=(",", ":"),
+        ).encode("utf-8"),
+        1,
+    )
+
+
+class CoauthorGraph:
+    """
+    A persistent (SQLite) graph of co-authors, built from the articles that
+    searches find. Nodes are authors (by unique name descriptor, with their
+    ORCID, if known), and authors are joined by the articles they share
+    (with their years).
+
+    The graph also keeps the neighborhood of each search of author names:
+    the articles NASA/ADS found for those names, years and number of rows,
+    when the search was last made in full, and whether it found every
+    article in its years. A repeat search is answered from its neighborhood
+    (or from one of a search that found every article in more years), and
+    NASA/ADS is only asked for articles entered since the neighborhood was
+    refreshed (see `search_utils.suggest_authors`).
+
+    Articles are stored as compressed JSON, with enough detail (authors,
+    affiliations, ORCIDs and publication dates) to collate them again.
+    Writes are made in the background (in order, on a thread with its own
+    connection), so that searches do not wait for them.
+
+    :param path:
+        The path of the SQLite database.
+
+    :param max_age: [optional]
+        The time (in seconds) that a neighborhood is answered from the graph
+        alone, before NASA/ADS is asked for newer articles. Default is one
+        day (or `DROPBEAR_GRAPH_MAX_AGE`).
+    """
+
+    def __init__(self, path, max_age=GRAPH_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        # The IDs of authors, and which of them have an ORCID, by key.
+        self._author_ids = dict()
+        self._orcids = set()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Shared by worker processes, like `cache.ResponseCache`.
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._writer = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        self._writes = ThreadPoolExecutor(1, thread_name_prefix="graph")
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS authors (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                orcid TEXT
+            );
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY,
+                bibcode TEXT NOT NULL UNIQUE,
+                year INTEGER NOT NULL,
+                pubdate_ordinal INTEGER NOT NULL,
+                content BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS authorships (
+                author INTEGER NOT NULL,
+                article INTEGER NOT NULL,
+                PRIMARY KEY (author, article)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS authorships_article
+                ON authorships (article);
+            CREATE TABLE IF NOT EXISTS neighborhoods (
+                id INTEGER PRIMARY KEY,
+                names TEXT NOT NULL,
+                first_year INTEGER NOT NULL,
+                last_year INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 0,
+                refreshed REAL,
+                UNIQUE (names, first_year, last_year, rows)
+            );
+            CREATE TABLE IF NOT EXISTS neighborhood_articles (
+                neighborhood INTEGER NOT NULL,
+                article INTEGER NOT NULL,
+                PRIMARY KEY (neighborhood, article)
+            ) WITHOUT ROWID;
+            """)
+
+    def add_articles(self, articles, neighborhood=None):
+        """
+        Add articles (and their authors) to the graph in the background, and
+        return a `concurrent.futures.Future` of when they have been. Articles
+        that are already in the graph are kept as they are.
+
+        :param articles:
+            An iterable of `search_utils.Article` records.
+
+        :param neighborhood: [optional]
+            The search that found the articles, as a three-length tuple of
+            the author names, the year range (or `None`) and the number of
+            rows it asked for. The articles are added to its neighborhood.
+        """
+
+        if neighborhood is not None:
+            neighborhood = _neighborhood_key(*neighborhood)
+        return self._write(self._add_articles, list(articles), neighborhood)
+
+    def _write(self, function, *args):
+        future = self._writes.submit(function, *args)
+        future.add_done_callback(_log_exception)
+        return future
+
+    def _add_articles(self, articles, neighborhood):
+        articles = {article.bibcode: article for article in articles}
+        if not articles:
+            return
+        executemany = self._writer.executemany
+        with self._writer:
+            article_ids = self._ids("articles", "bibcode", articles)
+            new = [
+                article
+                for bibcode, article in articles.items()
+                if bibcode not in article_ids
+            ]
+            if new:
+                executemany(
+                    """
+                    INSERT OR IGNORE INTO articles
+                        (bibcode, year, pubdate_ordinal, content)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [
+                        (
+                            article.bibcode,
+                            article.year,
+                            article.pubdate_ordinal,
+                            _compress(article),
+                        )
+                        for article in new
+                    ],
+                )
+                article_ids.update(
+                    self._ids("articles", "bibcode", [a.bibcode for a in new])
+                )
+                author_ids = self._author_ids_of(new)
+                executemany(
+                    "INSERT OR IGNORE INTO authorships VALUES (?, ?)",
+                    [
+                        (author_ids[key], article_ids[article.bibcode])
+                        for article in new
+                        for key in set(article.keys)
+                        if key is not None
+                    ],
+                )
+
+            if neighborhood is not None:
+                neighborhood_id = self._neighborhood_id(neighborhood)
+                executemany(
+                    """
+                    INSERT OR IGNORE INTO neighborhood_articles VALUES (?, ?)
+                    """,
+                    [
+                        (neighborhood_id, article_id)
+                        for article_id in article_ids.values()
+                    ],
+                )
+
+    def _neighborhood_id(self, neighborhood):
+        # Return the ID of a neighborhood, adding it if it is new.
+        self._writer.execute(
+            """
+            INSERT OR IGNORE INTO neighborhoods
+                (names, first_year, last_year, rows)
+            VALUES (?, ?, ?, ?)
+            """,
+            neighborhood,
+        )
+        (neighborhood_id,) = self._writer.execute(
+            """
+            SELECT id FROM neighborhoods
+            WHERE names = ? AND first_year = ? AND last_year = ? AND rows = ?
+            """,
+            neighborhood,
+        ).fetchone()
+        return neighborhood_id
+
+    def _ids(self, table, column, values):
+        # Return a dictionary of the IDs of the rows with the given values,
+        # for those that exist.
+        values = list(values)
+        ids = dict()
+        for i in range(0, len(values), 500):
+            chunk = values[i : i + 500]
+            ids.update(
+                self._writer.execute(
+                    f"""
+                    SELECT {column}, id FROM {table}
+                    WHERE {column} IN ({", ".join("?" * len(chunk))})
+                    """,
+                    chunk,
+                )
+            )
+        return ids
+
+    def _author_ids_of(self, articles):
+        # Return a dictionary of the IDs of the authors of the given
+        # articles, adding the authors (and ORCIDs) that are new.
+        orcids = dict()
+        for article in articles:
+            for key, orcid in zip(article.keys, article.orcids):
+                if key is not None and (
+                    orcid is not None or key not in orcids
+                ):
+                    orcids[key] = orcid
+
+        missing = [key for key in orcids if key not in self._author_ids]
+        if missing:
+            if len(self._author_ids) + len(missing) > AUTHOR_ID_CACHE_SIZE:
+                self._author_ids.clear()
+                self._orcids.clear()
+            self._writer.executemany(
+                "INSERT OR IGNORE INTO authors (key, orcid) VALUES (?, ?)",
+                [(key, orcids[key]) for key in missing],
+            )
+            for i in range(0, len(missing), 500):
+                chunk = missing[i : i + 500]
+                for key, author_id, has_orcid in self._writer.execute(
+                    f"""
+                    SELECT key, id, orcid IS NOT NULL FROM authors
+                    WHERE key IN ({", ".join("?" * len(chunk))})
+                    """,
+                    chunk,
+                ):
+                    self._author_ids[key] = author_id
+                    if has_orcid:
+                        self._orcids.add(key)
+
+        # Record ORCIDs of authors we only knew without one.
+        updates = [
+            (orcid, self._author_ids[key])
+            for key, orcid in orcids.items()
+            if orcid is not None and key not in self._orcids
+        ]
+        if updates:
+            self._writer.executemany(
+                "UPDATE authors SET orcid = ? WHERE id = ? AND orcid IS NULL",
+                updates,
+            )
+            self._orcids.update(
+                key for key, orcid in orcids.items() if orcid is not None
+            )
+        return {key: self._author_ids[key] for key in orcids}
+
+    def lookup(self, names, year_range, rows):
+        """
+        Return the articles to answer a search with from the graph (as a
+        `Lookup`), or `None` if it cannot be. A search can be answered from
+        its own neighborhood, once it has been refreshed, or (while it is
+        fresh) from that of a search of the same names that found every
+        article in more years, if the search would have found all of them
+        too.
+
+        :param names:
+            A list of author names.
+
+        :param year_range:
+            A two-length tuple of the first and last years of the search
+            (either can be `None`), or `None` for every year.
+
+        :param rows:
+            The number of rows (articles) the search asks for. At most this
+            many articles are returned.
+        """
+
+        key = _neighborhood_key(names, year_range, rows)
+        names_key, first_year, last_year, _ = key
+        fresh = time.time() - self.max_age
+        exact = self._connection.execute(
+            """
+            SELECT id, refreshed, complete FROM neighborhoods
+            WHERE names = ? AND first_year = ? AND last_year = ? AND rows = ?
+                AND refreshed IS NOT NULL
+            """,
+            key,
+        ).fetchone()
+        # Searches that were topped up with articles entered since can have
+        # more articles than they ask for: answer with the most recent.
+        if exact is not None and exact[1] >= fresh:
+            return self._lookup(*exact, first_year, last_year, rows)
+
+        wider = self._connection.execute(
+            """
+            SELECT id, refreshed, complete FROM neighborhoods
+            WHERE names = ? AND first_year <= ? AND last_year >= ?
+                AND complete AND refreshed >= ?
+            ORDER BY refreshed DESC
+            LIMIT 1
+            """,
+            (names_key, first_year, last_year, fresh),
+        ).fetchone()
+        if wider is not None:
+            lookup = self._lookup(*wider, first_year, last_year, rows + 1)
+            if len(lookup.articles) <= rows:
+                return lookup
+
+        if exact is not None:
+            return self._lookup(*exact, first_year, last_year, rows)
+        return None
+
+    def _lookup(
+        self,
+        neighborhood_id,
+        refreshed,
+        complete,
+        first_year,
+        last_year,
+        limit=None,
+    ):
+        rows = self._connection.execute(
+            """
+            SELECT bibcode, year, pubdate_ordinal, content
+            FROM neighborhood_articles JOIN articles ON articles.id = article
+            WHERE neighborhood = ? AND year >= ? AND year <= ?
+            ORDER BY pubdate_ordinal DESC, bibcode
+            LIMIT ?
+            """,
+            (
+                neighborhood_id,
+                first_year,
+                last_year,
+                -1 if limit is None else limit,
+            ),
+        )
+        articles = []
+        for bibcode, year, pubdate_ordinal, content in rows:
+            pubdate, authors, keys, affiliations, orcids = json.loads(
+                zlib.decompress(content)
+            )
+            articles.append(
+                Article(
+                    bibcode=bibcode,
+                    year=year,
+                    pubdate=pubdate,
+                    pubdate_ordinal=pubdate_ordinal,
+                    authors=tuple(authors),
+                    keys=tuple(keys),
+                    affiliations=tuple(map(tuple, affiliations)),
+                    orcids=tuple(orcids),
+                )
+            )
+        return Lookup(
+            articles,
+            refreshed,
+            stale=time.time() - refreshed >= self.max_age,
+            complete=bool(complete),
+        )
+
+    def set_refreshed(self, neighborhood, refreshed, complete):
+        """
+        Record that the search of a neighborhood was made in full, once the
+        articles added before have been written, and return a
+        `concurrent.futures.Future` of when it has been.
+
+        :param neighborhood:
+            The search, as a three-length tuple of the author names, the year
+            range (or `None`) and the number of rows it asked for.
+
+        :param refreshed:
+            The time (as a Unix time) that the search started.
+
+        :param complete:
+            Whether the search found every article in its years.
+        """
+
+        return self._write(
+            self._set_refreshed,
+            _neighborhood_key(*neighborhood),
+            refreshed,
+            complete,
+        )
+
+    def _set_refreshed(self, neighborhood, refreshed, complete):
+        with self._writer:
+            self._writer.execute(
+                """
+                UPDATE neighborhoods SET refreshed = ?, complete = ?
+                WHERE id = ?
+                """,
+                (refreshed, complete, self._neighborhood_id(neighborhood)),
+            )
+
+    def neighbors(self, key, limit=None):
+        """
+        Return a list of the co-authors of an author, with the number of
+        articles they share and the first and last years of those articles,
+        most shared first.
+
+        :param key:
+            The unique name descriptor of the author (see
+            `names.unique_name_descriptor`).
+
+        :param limit: [optional]
+            The maximum number of co-authors to return.
+        """
+
+        rows = self._connection.execute(
+            """
+            SELECT coauthors.key, coauthors.orcid, COUNT(*), MIN(year),
+                MAX(year)
+            FROM authors
+            JOIN authorships AS own ON own.author = authors.id
+            JOIN authorships AS shared
+                ON shared.article = own.article
+                AND shared.author != own.author
+            JOIN authors AS coauthors ON coauthors.id = shared.author
+            JOIN articles ON articles.id = own.article
+            WHERE authors.key = ?
+            GROUP BY coauthors.id
+            ORDER BY COUNT(*) DESC, coauthors.key
+            LIMIT ?
+            """,
+            (key, -1 if limit is None else limit),
+        )
+        return [
+            dict(
+                unique_name_descriptor=coauthor,
+                orcid=orcid,
+                number_of_shared_articles=shared,
+                first_year=first_year,
+                last_year=last_year,
+            )
+            for coauthor, orcid, shared, first_year, last_year in rows
+        ]
+
+    @property
+    def stats(self):
+        """Return a dictionary of the number of authors and articles."""
+        execute = self._connection.execute
+        (authors,) = execute("SELECT COUNT(*) FROM authors").fetchone()
+        (articles,) = execute("SELECT COUNT(*) FROM articles").fetchone()
+        return dict(authors=authors, articles=articles)
+
+    def flush(self):
+        """Wait until every write so far has been made."""
+        self._write(lambda: None).result()
+
+    def clear(self):
+        """Remove everything from the graph."""
+        self._write(self._clear).result()
+
+    def _clear(self):
+        self._author_ids.clear()
+        self._orcids.clear()
+        with self._writer:
+            for table in (
+                "authors",
+                "articles",
+                "authorships",
+                "neighborhoods",
+                "neighborhood_articles",
+            ):
+                self._writer.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        """Finish writing, and close the graph."""
+        if self._connection is not None:
+            self._writes.shutdown()
+            self._writer.close()
+            self._connection.close()
+            self._connection = None
+
+
+def _log_exception(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            "Could not write to the co-author graph",
+            exc_info=future.exception(),
+        )
@@ -0,0 +1,317 @@
+"""
+Run author searches in bulk, writing the final suggestions for each group of
+names to a JSONL file.
+
+    python jobs.py committee.txt --output suggestions.jsonl --concurrency 4
+
+Each line of the input file is one group of names, separated by ";" (as in
+the search form).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+
+import search_utils
+from cache import CACHE_DIRECTORY, ResponseCache
+from ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A batch of author searches, one for each group of names.
+
+    :param name_groups:
+        A list of lists of author names. Each group is searched for together,
+        as if the names were given to `/search` separated by ";".
+
+    :param directory:
+        The directory to write the JSONL file of results to.
+
+    :param search_kwds: [optional]
+        Keyword arguments to pass to `search_utils.suggest_authors`.
+    """
+
+    def __init__(self, name_groups, directory, **search_kwds):
+        self.id = uuid.uuid4().hex
+        self.name_groups = name_groups
+        self.path = os.path.join(directory, f"{self.id}.jsonl")
+        self.search_kwds = search_kwds
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.completed = 0
+        self.failed = 0
+        self.incomplete = 0
+        self.number_of_suggestions = 0
+        self._done = asyncio.Event()
+
+    async def wait(self):
+        """Wait until every search in the job has finished."""
+        await self._done.wait()
+
+    def to_json(self):
+        """Return a JSON-serializable dictionary of the job progress."""
+        return dict(
+            id=self.id,
+            status=self.status,
+            created=self.created,
+            started=self.started,
+            finished=self.finished,
+            number_of_groups=len(self.name_groups),
+            completed=self.completed,
+            failed=self.failed,
+            incomplete=self.incomplete,
+            number_of_suggestions=self.number_of_suggestions,
+        )
+
+
+class JobRunner:
+    """
+    Run the searches of batch jobs concurrently, sharing one NASA/ADS session
+    (and rate limiter) between all of them.
+
+    :param directory:
+        The directory to write job results to.
+
+    :param concurrency: [optional]
+        The maximum number of searches to run at once, across all jobs.
+        Default is 4.
+
+    :param search_kwds: [optional]
+        Keyword arguments to pass to `search_utils.suggest_authors` for every
+        search (e.g., `session`, `limiter`, `cache` and `executor`).
+    """
+
+    def __init__(self, directory, concurrency=4, **search_kwds):
+        self.directory = directory
+        self.concurrency = concurrency
+        self.search_kwds = search_kwds
+        self.jobs = dict()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, name_groups, **search_kwds):
+        """
+        Submit a job and start running it in the background.
+
+        :param name_groups:
+            A list of lists of author names.
+
+        :param search_kwds: [optional]
+            Keyword arguments to pass to `search_utils.suggest_authors` for
+            the searches in this job.
+
+        :returns:
+            The `Job`.
+        """
+
+        kwds = dict(self.search_kwds)
+        kwds.update(search_kwds)
+        job = Job(name_groups, self.directory, **kwds)
+        self.jobs[job.id] = job
+        self._save(job)
+
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def status(self, job_id):
+        """
+        Return the progress of a job (see `Job.to_json`). The job may have
+        been submitted to another runner that shares the directory (e.g., in
+        another worker process), in which case its last saved progress is
+        returned.
+
+        :param job_id:
+            The ID of the job.
+
+        :raises KeyError:
+            If there is no such job.
+        """
+
+        if job_id in self.jobs:
+            return self.jobs[job_id].to_json()
+        if not re.fullmatch("[0-9a-f]{32}", job_id):
+            raise KeyError(job_id)
+        try:
+            with open(os.path.join(self.directory, f"{job_id}.json")) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def results_path(self, job_id):
+        """Return the path of the JSONL file of a job's results."""
+        return os.path.join(self.directory, f"{job_id}.jsonl")
+
+    def _save(self, job):
+        # Keep the progress of the job on disk too, for `status`. Write it
+        # atomically, in case another process is reading it.
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False
+        ) as fp:
+            json.dump(job.to_json(), fp)
+        os.replace(fp.name, os.path.join(self.directory, f"{job.id}.json"))
+
+    async def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        self._save(job)
+        with open(job.path, "w") as fp:
+            await asyncio.gather(
+                *[
+                    self._search(job, index, author_names, fp)
+                    for index, author_names in enumerate(job.name_groups)
+                ]
+            )
+        job.status = "failed" if job.failed == len(job.name_groups) else "done"
+        job.finished = time.time()
+        self._save(job)
+        job._done.set()
+
+    async def _search(self, job, index, author_names, fp):
+        async with self._semaphore:
+            suggestions = dict()
+            # To know whether any query of NASA/ADS failed.
+            budget = search_utils.SearchBudget()
+            try:
+                async for suggestion in search_utils.suggest_authors(
+                    author_names, **dict(job.search_kwds, budget=budget)
+                ):
+                    suggestions[suggestion.unique_name_descriptor] = suggestion
+            except Exception:
+                logger.exception(
+                    f"Exception occurred searching {author_names}"
+                )
+                job.failed += 1
+                fp.write(
+                    json.dumps(
+                        dict(group=index, names=author_names, error=True)
+                    )
+                    + "\n"
+                )
+                fp.flush()
+                self._save(job)
+                return
+
+        # Mark the results of a group whose search is missing articles (e.g.,
+        # because a query of NASA/ADS failed), even if it found nothing.
+        lines = [
+            dict(
+                group=index,
+                names=author_names,
+                suggestion=suggestion.to_json(),
+            )
+            for suggestion in suggestions.values()
+        ]
+        if not budget.complete:
+            job.incomplete += 1
+            lines = [dict(line, incomplete=True) for line in lines] or [
+                dict(group=index, names=author_names, incomplete=True)
+            ]
+
+        # Write the whole group at once, so groups are not interleaved.
+        fp.write("".join(json.dumps(line) + "\n" for line in lines))
+        fp.flush()
+        job.completed += 1
+        job.number_of_suggestions += len(suggestions)
+        self._save(job)
+
+    async def close(self):
+        """Cancel any jobs that are still running."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            if job.finished is None:
+                job.status = "cancelled"
+                job.finished = time.time()
+                self._save(job)
+
+
+def read_name_groups(lines):
+    """
+    Return a list of name groups from lines of ";"-separated author names,
+    ignoring blank lines and comments.
+
+    :param lines:
+        An iterable of strings.
+    """
+
+    name_groups = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            name_groups.append(
+                [name.strip() for name in line.split(";") if name.strip()]
+            )
+    return name_groups
+
+
+async def _main(args):
+    with open(args.names) as fp:
+        name_groups = read_name_groups(fp)
+
+    cache = ResponseCache(path=os.path.join(CACHE_DIRECTORY, "cache.sqlite"))
+    async with search_utils.create_session(limit=args.max_upstream) as session:
+        runner = JobRunner(
+            os.path.dirname(os.path.abspath(args.output)),
+            concurrency=args.concurrency,
+            session=session,
+            limiter=RateLimiter(max_concurrency=args.max_upstream),
+            cache=cache,
+        )
+        job = runner.submit(name_groups)
+        while job.finished is None:
+            try:
+                await asyncio.wait_for(job.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+            print(
+                f"{job.completed + job.failed}/{len(name_groups)} groups "
+                f"searched ({job.incomplete} incomplete), "
+                f"{job.number_of_suggestions} suggestions",
+                file=sys.stderr,
+            )
+        os.replace(job.path, args.output)
+        os.remove(os.path.join(runner.directory, f"{job.id}.json"))
+
+    cache.close()
+    return job
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("names", help="file with one group of names per line")
+    parser.add_argument(
+        "--output", "-o", default="suggestions.jsonl", help="JSONL output path"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="number of searches to run at once",
+    )
+    parser.add_argument(
+        "--max-upstream",
+        type=int,
+        default=10,
+        help="maximum number of NASA/ADS requests in flight",
+    )
+    job = asyncio.run(_main(parser.parse_args()))
+    sys.exit(1 if job.status == "failed" else 0)
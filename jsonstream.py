@@ -0,0 +1,101 @@
+import codecs
+import json
+import re
+
+# Where the list of articles starts in a NASA/ADS search response.
+_DOCS = re.compile(r'"docs"\s*:\s*(?=\[)')
+
+_decoder = json.JSONDecoder()
+
+
+class DocsParser:
+    """
+    Parse a NASA/ADS search response incrementally, as its bytes arrive, so
+    that each article (in `response.docs`) can be used as soon as it has
+    been downloaded, rather than once the whole response has been.
+
+    Feed the parser chunks of the response with `feed`, which returns the
+    articles that were completed by each chunk, and then call `close` for
+    the whole response.
+    """
+
+    def __init__(self):
+        self.docs = []
+        self._decode = codecs.getincrementaldecoder("utf-8")().decode
+        self._text = ""
+        # Whether we are before, in, or after the list of articles.
+        self._state = "head"
+        self._head = None
+        # How much text had arrived when we last tried to decode an article.
+        self._tried = 0
+
+    def feed(self, data):
+        """
+        Parse the next chunk of the response, and return a list of the
+        articles that it completed.
+
+        :param data:
+            The next bytes of the response.
+        """
+
+        self._text += self._decode(data)
+        if self._state == "head":
+            match = _DOCS.search(self._text)
+            if match is None:
+                return []
+            # Keep what came before the articles, and forget the rest as we
+            # go, so the text does not grow with every article.
+            self._head = self._text[: match.end()]
+            self._text = self._text[match.end() + 1 :]
+            self._state = "docs"
+            self._tried = 0
+
+        if self._state != "docs":
+            return []
+
+        # Articles (and the list of them) end with a "}" (or "]"), so don't
+        # try to decode one again until one of those has arrived.
+        new_text = self._text[self._tried :]
+        if "}" not in new_text and "]" not in new_text:
+            self._tried = len(self._text)
+            return []
+
+        docs = []
+        text, position = (self._text, 0)
+        while True:
+            while position < len(text) and text[position] in " \t\r\n,":
+                position += 1
+            if position == len(text):
+                break
+            if text[position] == "]":
+                self._state = "tail"
+                position += 1
+                break
+            try:
+                doc, position = _decoder.raw_decode(text, position)
+            except json.JSONDecodeError:
+                break
+            docs.append(doc)
+
+        self._text = text[position:]
+        self._tried = len(self._text)
+        self.docs.extend(docs)
+        return docs
+
+    def close(self):
+        """
+        Return the whole response (like `json.loads`), once every chunk has
+        been fed to the parser.
+        """
+
+        self._text += self._decode(b"", True)
+        if self._state == "head":
+            # There were no articles to stream.
+            content = json.loads(self._text)
+            self.docs.extend(content.get("response", {}).get("docs", ()))
+            return content
+        if self._state != "tail":
+            raise ValueError("Response ended before the list of articles")
+        content = json.loads(f"{self._head}[]{self._text}")
+        content["response"]["docs"] = self.docs
+        return content
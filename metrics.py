@@ -0,0 +1,400 @@
+"""
+Minimal Prometheus-style metrics (counters, gauges and histograms), rendered
+in the Prometheus text exposition format, and per-search timing spans.
+"""
+
+import contextvars
+import time
+from bisect import bisect_left
+
+# Every metric that has been created, in order, for `render`.
+REGISTRY = []
+
+# The default histogram buckets (in seconds).
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'),
+        )
+        for name, value in labels
+    )
+    return f"{{{pairs}}}"
+
+
+class _Metric:
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = dict()
+        REGISTRY.append(self)
+
+    def labels(self, **labels):
+        """
+        Return the child of this metric with the given label values.
+
+        :param labels:
+            A value for every label name of this metric.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        try:
+            return self._children[key]
+        except KeyError:
+            child = self._children[key] = self._new_child()
+            return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, key, child):
+        labels = tuple(zip(self.labelnames, key))
+        yield (self.name, labels, child.value)
+
+    def render(self):
+        """Return this metric in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for key, child in list(self._children.items()):
+            for name, labels, value in self._samples(key, child):
+                lines.append(
+                    f"{name}{_format_labels(labels)} {_format_value(value)}"
+                )
+        return "\n".join(lines)
+
+
+class _Value:
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    """
+    A counter that only goes up.
+
+    :param name:
+        The name of the metric.
+
+    :param documentation:
+        A description of the metric.
+
+    :param labelnames: [optional]
+        The names of labels that the metric is partitioned by.
+    """
+
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        """Increment the (unlabelled) counter."""
+        self._unlabelled().inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down, or that is read from a function when
+    the metrics are rendered.
+
+    :param name:
+        The name of the metric.
+
+    :param documentation:
+        A description of the metric.
+
+    :param labelnames: [optional]
+        The names of labels that the metric is partitioned by.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        """Increment the (unlabelled) gauge."""
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        """Decrement the (unlabelled) gauge."""
+        self._unlabelled().dec(amount)
+
+    def set(self, value):
+        """Set the (unlabelled) gauge."""
+        self._unlabelled().set(value)
+
+    def set_function(self, function):
+        """
+        Read the (unlabelled) gauge from the given function, whenever the
+        metrics are rendered.
+        """
+        self._unlabelled()
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            self.set(self._function())
+        return super().render()
+
+
+class _Buckets:
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        # The last bound is infinite, so every value lands in a bucket.
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """
+    A histogram of observed values (e.g., durations in seconds).
+
+    :param name:
+        The name of the metric.
+
+    :param documentation:
+        A description of the metric.
+
+    :param labelnames: [optional]
+        The names of labels that the metric is partitioned by.
+
+    :param buckets: [optional]
+        The upper bounds of the histogram buckets. Default is
+        `DEFAULT_BUCKETS`.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        """Observe a value in the (unlabelled) histogram."""
+        self._unlabelled().observe(value)
+
+    def _samples(self, key, child):
+        labels = tuple(zip(self.labelnames, key))
+        cumulative = 0
+        for bound, count in zip(child.bounds, child.counts):
+            cumulative += count
+            yield (
+                f"{self.name}_bucket",
+                labels + (("le", _format_value(bound)),),
+                cumulative,
+            )
+        yield (f"{self.name}_sum", labels, child.sum)
+        yield (f"{self.name}_count", labels, child.count)
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class Spans:
+    """
+    The time spent in each part (span) of a single search, in seconds.
+    Spans are accumulated, so a span can be timed many times per search.
+    """
+
+    __slots__ = ("started", "seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict()
+
+    def add(self, name, seconds):
+        """Add the given number of seconds to a span."""
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+
+    def time(self, name):
+        """Return a context manager that adds the time within it to a span."""
+        return _Timer(self, name)
+
+    def to_json(self):
+        """Return a dictionary of the time in each span, and in total."""
+        return dict(self.seconds, total=time.perf_counter() - self.started)
+
+
+class _Timer:
+
+    __slots__ = ("spans", "name", "t_init")
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.t_init = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.spans.add(self.name, time.perf_counter() - self.t_init)
+
+
+_current_spans = contextvars.ContextVar("spans", default=None)
+
+
+def start_spans():
+    """
+    Start timing spans for the search running in the current context (and
+    any tasks it creates), and return the `Spans`.
+    """
+    spans = Spans()
+    _current_spans.set(spans)
+    return spans
+
+
+def current_spans():
+    """
+    Return the `Spans` of the search running in the current context, or a
+    new (discarded) `Spans` if the search is not being timed.
+    """
+    return _current_spans.get() or Spans()
+
+
+ADS_REQUEST_SECONDS = Histogram(
+    "dropbear_ads_request_seconds",
+    "Latency of requests to NASA/ADS.",
+)
+ADS_RESPONSES = Counter(
+    "dropbear_ads_responses_total",
+    "Responses from NASA/ADS, by status code.",
+    ("status",),
+)
+ADS_PAGES = Counter(
+    "dropbear_ads_pages_total",
+    "Pages of author search results requested from NASA/ADS.",
+)
+ADS_SIMILAR_SEARCHES = Counter(
+    "dropbear_ads_similar_searches_total",
+    "Similarity searches (of one or more bibcodes) requested from NASA/ADS.",
+)
+ADS_RETRIES = Counter(
+    "dropbear_ads_retries_total",
+    "Requests to NASA/ADS that were retried (e.g., after a 429 or 5xx).",
+)
+ADS_HEDGED_REQUESTS = Counter(
+    "dropbear_ads_hedged_requests_total",
+    "Duplicate (hedged) requests sent for slow pages of articles.",
+)
+DUPLICATE_ARTICLES = Counter(
+    "dropbear_duplicate_articles_total",
+    "Articles found more than once in a search, and skipped.",
+)
+CACHE_REQUESTS = Counter(
+    "dropbear_cache_requests_total",
+    "Lookups of the NASA/ADS response cache, by result (hit or miss).",
+    ("result",),
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "dropbear_ads_requests_in_flight",
+    "Requests to NASA/ADS in flight.",
+)
+SEARCHES_IN_FLIGHT = Gauge(
+    "dropbear_searches_in_flight",
+    "Searches in progress.",
+)
+SEARCHES = Counter(
+    "dropbear_searches_total",
+    "Searches completed.",
+)
+DISCONNECTED_SEARCHES = Counter(
+    "dropbear_disconnected_searches_total",
+    "Searches stopped because the client disconnected.",
+)
+FAILED_UPSTREAM_REQUESTS = Counter(
+    "dropbear_failed_upstream_requests_total",
+    "Requests to NASA/ADS that failed after any retries.",
+)
+EXHAUSTED_BUDGETS = Counter(
+    "dropbear_exhausted_budgets_total",
+    "Searches stopped early because their budget was exhausted, by budget.",
+    ("budget",),
+)
+COALESCED_SEARCHES = Counter(
+    "dropbear_coalesced_searches_total",
+    "Searches that shared the suggestions of an identical search already "
+    "in progress.",
+)
+GRAPH_LOOKUPS = Counter(
+    "dropbear_graph_lookups_total",
+    "Searches answered from the co-author graph, by result (hit, stale, "
+    "or miss).",
+    ("result",),
+)
+SEARCH_SPAN_SECONDS = Histogram(
+    "dropbear_search_span_seconds",
+    "Time spent in each part of a search (upstream, collation, "
+    "serialization, write, and total).",
+    ("span",),
+)
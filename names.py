@@ -0,0 +1,112 @@
+from functools import lru_cache
+
+# The number of parsed names to remember. Names repeat thousands of times in
+# a single search, so this should comfortably hold every name in a search.
+NAME_CACHE_SIZE = 2**16
+
+
+def parse_author_name(author_name):
+    """
+    Return a dictionary of parsed attributes of an author's name, regardless
+    of the input format.
+
+    :param author_name:
+        The name as given, which could be a number of different formats.
+    """
+
+    last_name, given_names = _split_author_name(author_name)
+    first_name = given_names.split(" ")[0].replace(".", "")
+    initial_only = len(first_name) <= 1
+
+    return dict(
+        last_name=last_name,
+        given_names=given_names,
+        first_name=None if initial_only else first_name,
+        initial_only=initial_only,
+    )
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def _split_author_name(author_name):
+    number_of_commas = author_name.count(",")
+    if number_of_commas == 0:
+        # "First M. Last", or just "Last".
+        *given_names, last_name = author_name.split(" ")
+        given_names = " ".join(given_names)
+    else:
+        # "Last, First M.", or "Last, First M., Jr." (or worse); anything
+        # after the second comma is a suffix.
+        last_name, given_names, *suffix = author_name.split(",")
+
+    return (last_name.strip(), given_names.strip())
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def unique_name_descriptor(author_name):
+    """
+    Return a pseudo-unique name descriptor for the given author name. In other
+    words, parse the given author name and return it in the form "Lastname,
+    F.".
+
+    :param author_name:
+        The name as given, which could be a number of different formats.
+    """
+
+    last_name, given_names = _split_author_name(author_name)
+    given_initial = given_names[:1]
+    return f"{last_name}, {given_initial}."
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def is_collaboration(author_name):
+    an = author_name.lower().replace(",", "").split()
+    keys = ("collaboration", "team", "survey", "experiment")
+    for key in keys:
+        if key in an:
+            return True
+    return False
+
+
+class AuthorNameMatcher:
+    """
+    Match articles where any of the given author names appear at any of the
+    given author indices. Names are compared by their unique name descriptor
+    (i.e., "Lastname, F." is sufficiently similar).
+
+    Build one matcher per search, so the given names are only parsed once.
+
+    :param author_names:
+        A list-like object containing names to match.
+
+    :param author_indices:
+        A list-like object containing the (zero-indexed) author positions to
+        match. If `None` is given then no articles will match.
+    """
+
+    def __init__(self, author_names, author_indices):
+        self.descriptors = frozenset(map(unique_name_descriptor, author_names))
+        self.author_indices = (
+            None if author_indices is None else tuple(author_indices)
+        )
+
+    def matches(self, article):
+        """
+        Return whether any of the names appear at any of the author indices
+        of the given article.
+
+        :param article:
+            An article from NASA/ADS, with an "author" list.
+        """
+
+        if self.author_indices is None:
+            return False
+
+        authors = article["author"]
+        for index in self.author_indices:
+            try:
+                author = authors[index]
+            except IndexError:
+                continue
+            if unique_name_descriptor(author) in self.descriptors:
+                return True
+        return False
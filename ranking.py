@@ -0,0 +1,190 @@
+import heapq
+
+# How suggestions can be ranked. Every rank only ever grows as a search
+# goes on, which `TopK` relies on.
+RANKINGS = dict(
+    number_of_articles=lambda suggestion: suggestion.number_of_articles,
+    number_of_articles_as_first_author=(
+        lambda suggestion: suggestion.number_of_articles_as_first_author
+    ),
+    most_recent_pubdate=lambda suggestion: suggestion.pubdate_ordinal,
+)
+
+
+class RemovedSuggestion:
+    """
+    A marker that a suggestion was removed (e.g., it fell out of the top
+    suggestions), and should no longer be shown.
+
+    :param unique_name_descriptor:
+        The unique name descriptor of the removed suggestion.
+    """
+
+    __slots__ = ("unique_name_descriptor",)
+
+    removed = True
+
+    def __init__(self, unique_name_descriptor):
+        self.unique_name_descriptor = unique_name_descriptor
+
+    def to_json(self):
+        """Return a JSON-serializable dictionary of the removal."""
+        return dict(
+            unique_name_descriptor=self.unique_name_descriptor, removed=True
+        )
+
+
+class SuggestionFilter:
+    """
+    Decide whether suggestions are worth showing. Suggestions only ever
+    gain articles and affiliations, so once a suggestion matches it always
+    will, and it is not checked again.
+
+    :param min_articles: [optional]
+        The minimum number of articles.
+
+    :param min_first_author_articles: [optional]
+        The minimum number of articles as first author.
+
+    :param affiliation: [optional]
+        A string that must appear in one of the affiliations (ignoring case).
+    """
+
+    def __init__(
+        self,
+        min_articles=None,
+        min_first_author_articles=None,
+        affiliation=None,
+    ):
+        self.min_articles = min_articles
+        self.min_first_author_articles = min_first_author_articles
+        self.affiliation = None if affiliation is None else affiliation.lower()
+        self._matched = set()
+
+    def matches(self, suggestion):
+        """Return whether the given suggestion passes the filter."""
+
+        key = suggestion.unique_name_descriptor
+        if key in self._matched:
+            return True
+        if (
+            self.min_articles is not None
+            and suggestion.number_of_articles < self.min_articles
+        ) or (
+            self.min_first_author_articles is not None
+            and suggestion.number_of_articles_as_first_author
+            < self.min_first_author_articles
+        ):
+            return False
+        if self.affiliation is not None and not any(
+            self.affiliation in affiliation.lower()
+            for affiliation in suggestion.affiliations
+        ):
+            return False
+        self._matched.add(key)
+        return True
+
+
+class TopK:
+    """
+    Keep track of the top `k` suggestions by some rank, as the suggestions
+    change.
+
+    The lowest-ranked suggestion is kept at the top of a heap. Ranks only
+    grow, so rather than re-ordering the heap whenever a suggestion changes,
+    the suggestion is pushed again with its new rank, and outdated entries
+    are skipped when they reach the top.
+
+    :param k:
+        The number of suggestions to keep.
+
+    :param rank_by: [optional]
+        The name of the rank (see `RANKINGS`). Default is
+        "number_of_articles".
+    """
+
+    def __init__(self, k, rank_by="number_of_articles"):
+        if k < 1:
+            raise ValueError("k must be a positive integer")
+        self.k = k
+        self.rank = RANKINGS[rank_by]
+        self.ranks = dict()
+        self._heap = []
+
+    def update(self, suggestion):
+        """
+        Update the top suggestions with a new (or changed) suggestion.
+
+        :returns:
+            A two-length tuple containing a boolean of whether the suggestion
+            is in the top `k`, and the unique name descriptor of a suggestion
+            that it replaced (or `None`).
+        """
+
+        key = suggestion.unique_name_descriptor
+        rank = (self.rank(suggestion), key)
+        if key in self.ranks:
+            if self.ranks[key] != rank:
+                self._push(key, rank)
+            return (True, None)
+
+        if len(self.ranks) < self.k:
+            self._push(key, rank)
+            return (True, None)
+
+        lowest_rank, lowest_key = self._lowest()
+        if rank <= lowest_rank:
+            return (False, None)
+
+        heapq.heappop(self._heap)
+        del self.ranks[lowest_key]
+        self._push(key, rank)
+        return (True, lowest_key)
+
+    def _push(self, key, rank):
+        self.ranks[key] = rank
+        heapq.heappush(self._heap, (rank, key))
+        if len(self._heap) > 4 * self.k:
+            # Too many outdated entries.
+            self._heap = [(r, name) for name, r in self.ranks.items()]
+            heapq.heapify(self._heap)
+
+    def _lowest(self):
+        while True:
+            rank, key = self._heap[0]
+            if self.ranks.get(key) == rank:
+                return (rank, key)
+            heapq.heappop(self._heap)
+
+
+async def rank_suggestions(suggestions, suggestion_filter=None, top_k=None):
+    """
+    Returns a generator that yields the given suggestions that pass the
+    filter and, if `top_k` is given, are among the top suggestions. When a
+    suggestion falls out of the top suggestions, a `RemovedSuggestion` is
+    yielded for it.
+
+    :param suggestions:
+        An asynchronous generator of suggestions.
+
+    :param suggestion_filter: [optional]
+        A `SuggestionFilter`.
+
+    :param top_k: [optional]
+        A `TopK`.
+    """
+
+    async for suggestion in suggestions:
+        if suggestion_filter is not None and not suggestion_filter.matches(
+            suggestion
+        ):
+            continue
+        if top_k is None:
+            yield suggestion
+            continue
+
+        is_top, removed = top_k.update(suggestion)
+        if removed is not None:
+            yield RemovedSuggestion(removed)
+        if is_top:
+            yield suggestion
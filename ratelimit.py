@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# The longest (in seconds) that a request will wait for the rate limit to
+# reset. NASA/ADS rate limits are daily, so it is better to fail than to wait.
+MAX_WAIT = float(os.getenv("DROPBEAR_RATE_LIMIT_MAX_WAIT", 60))
+
+
+class RateLimitExceeded(Exception):
+    """
+    The NASA/ADS rate limit is exhausted, and will not reset soon enough to
+    wait for it.
+
+    :param message:
+        A description of the failure.
+
+    :param retry_after: [optional]
+        The time (in seconds) until the rate limit resets.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    An asynchronous context manager that limits the number of NASA/ADS
+    requests in flight, and pauses requests when the NASA/ADS rate limit is
+    exhausted.
+
+    NASA/ADS reports the state of the rate limit in the `X-RateLimit-Limit`,
+    `X-RateLimit-Remaining` and `X-RateLimit-Reset` response headers. Pass
+    the headers of every response to `update` so the limiter can track them.
+
+    :param max_concurrency: [optional]
+        The maximum number of requests that can be in flight at once, across
+        all searches that share this limiter. Default is 10.
+
+    :param reserve: [optional]
+        The number of requests to keep in reserve. When the remaining number
+        of requests reaches this value, new requests will wait until the rate
+        limit resets. Default is 0.
+
+    :param max_wait: [optional]
+        The longest (in seconds) that a request will wait for the rate limit
+        to reset. If it would have to wait longer, `RateLimitExceeded` is
+        raised instead. Default is 60 (or `DROPBEAR_RATE_LIMIT_MAX_WAIT`).
+    """
+
+    def __init__(self, max_concurrency=10, reserve=0, max_wait=MAX_WAIT):
+        self.max_concurrency = max_concurrency
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        # Wait for the rate limit without holding a slot, so that requests
+        # that do not need to wait (e.g., after the limit resets) are not
+        # held up behind those that do.
+        while True:
+            await self._wait_for_quota()
+            await self._semaphore.acquire()
+            if self.remaining is None or self.remaining > self.reserve:
+                break
+            # The quota ran out while we waited for a slot.
+            self._semaphore.release()
+
+        if self.remaining is not None:
+            # Count this request now, so that concurrent requests do not all
+            # assume the same remaining quota.
+            self.remaining -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def delay(self):
+        """
+        Return the time (in seconds) that a new request would have to wait
+        for the rate limit to reset, or 0 if it would not have to wait.
+        """
+        if self.remaining is None or self.remaining > self.reserve:
+            return 0
+        delay = (self.reset or 0) - time.time()
+        if delay <= 0:
+            # The rate limit has reset, but we won't know the new state until
+            # the next response.
+            self.remaining = None
+            return 0
+        return delay
+
+    def check(self):
+        """
+        Raise `RateLimitExceeded` if a new request would have to wait longer
+        than `max_wait` for the rate limit to reset.
+        """
+        delay = self.delay()
+        if delay > self.max_wait:
+            raise RateLimitExceeded(
+                f"NASA/ADS rate limit reached; it resets in {delay:.0f} "
+                "seconds",
+                delay,
+            )
+
+    async def _wait_for_quota(self):
+        while True:
+            self.check()
+            delay = self.delay()
+            if delay <= 0:
+                return
+            logger.warning(
+                f"NASA/ADS rate limit reached; waiting {delay:.0f} seconds"
+            )
+            await asyncio.sleep(delay)
+
+    def update(self, headers, status=None):
+        """
+        Update the state of the rate limit from NASA/ADS response headers.
+
+        :param headers:
+            The headers of a response from NASA/ADS.
+
+        :param status: [optional]
+            The HTTP status of the response. A 429 (Too Many Requests) status
+            marks the rate limit as exhausted.
+        """
+
+        for attribute, header in (
+            ("limit", "X-RateLimit-Limit"),
+            ("remaining", "X-RateLimit-Remaining"),
+            ("reset", "X-RateLimit-Reset"),
+        ):
+            try:
+                value = int(headers[header])
+            except (KeyError, TypeError, ValueError):
+                continue
+            setattr(self, attribute, value)
+
+        if status == 429:
+            self.remaining = 0
+            if self.reset is None or self.reset < time.time():
+                # Back off for a short while if NASA/ADS didn't say when.
+                self.reset = time.time() + 60
@@ -1,125 +1,635 @@
 import asyncio
 import aiohttp
+import itertools
+import os
+import random
+import sys
+import time
 import warnings
 import logging
 import json
-import time
+from collections import namedtuple
 from aiohttp import web
-from fuzzywuzzy import fuzz
 
-import ads
-import gender_guesser.detector as gender
-
-__gender_detector = gender.Detector()
+import genders
+import metrics
+from affiliations import AffiliationMatcher
+from coalesce import search_key
+from jsonstream import DocsParser
+from ranking import SuggestionFilter, TopK, rank_suggestions
+from ratelimit import RateLimitExceeded
+from snapshots import entry_date
+from suggestions import Suggestion
+from names import (
+    AuthorNameMatcher,
+    is_collaboration,
+    parse_author_name,
+    unique_name_descriptor,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def _search(session, **params):
-    logger.debug(f"Searching {params}")
-    async with session.get(
-        "https://api.adsabs.harvard.edu/v1/search/query", params=params
-    ) as response:
-        try:
-            # TODO: I'm not sure if we should be awaiting here..
-            content = await response.json()
-        except Exception as e:
-            if response.status != 200:
-                # TODO: Error handling!
-                logger.exception(f"Exception occurred: {e}")
-                return None
+ADS_SEARCH_URL = os.getenv(
+    "ADS_SEARCH_URL", "https://api.adsabs.harvard.edu/v1/search/query"
+)
 
-    logger.debug(
-        f"Found {content['response']['numFound']} articles from {params}"
-    )
-    return content
+# Where to look for a NASA/ADS API token, in order (the same places as the
+# `ads` package).
+ADS_TOKEN_ENVIRON_VARS = ("ADS_API_TOKEN", "ADS_DEV_KEY")
+ADS_TOKEN_FILES = ("~/.ads/token", "~/.ads/dev_key")
+
+# The maximum number of rows that NASA/ADS will return in one page.
+ADS_MAX_ROWS = 2000
+
+# Statuses of NASA/ADS responses that are worth retrying, how many times to
+# retry a query, the (exponential) backoff before the first retry, and the
+# longest we are willing to wait before a retry.
+ADS_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+ADS_MAX_RETRIES = int(os.getenv("DROPBEAR_ADS_RETRIES", 3))
+ADS_RETRY_BACKOFF = float(os.getenv("DROPBEAR_ADS_RETRY_BACKOFF", 0.5))
+ADS_MAX_RETRY_DELAY = 60
 
+# Send a duplicate (hedged) request for a later page of articles if it has
+# not started arriving after this many seconds (or `None` to never hedge).
+ADS_HEDGE_AFTER = float(os.getenv("DROPBEAR_HEDGE_AFTER", 0)) or None
 
-def unique_name_descriptor(author_name):
+
+class RetryableError(Exception):
     """
-    Return a pseudo-unique name descriptor for the given author name. In other
-    words, parse the given author name and return it in the form "Lastname,
-    F.".
+    A NASA/ADS query that failed in a way that is worth retrying (e.g., rate
+    limited, a server error, or a dropped connection).
+
+    :param message:
+        A description of the failure.
 
-    :param author_name:
-        The name as given, which could be a number of different formats.
+    :param retry_after: [optional]
+        The time (in seconds) that NASA/ADS asked us to wait before retrying.
     """
 
-    parsed = parse_author_name(author_name)
-    last_name, given_names = (parsed["last_name"], parsed["given_names"])
-    given_initial = given_names[:1]
-    return f"{last_name}, {given_initial}."
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
-def is_collaboration(author_name):
-    an = author_name.lower().replace(",", "").split()
-    keys = ("collaboration", "team", "survey", "experiment")
-    for key in keys:
-        if key in an:
-            return True
-    return False
+def get_ads_token():
+    """
+    Return the NASA/ADS API token from the environment (`ADS_API_TOKEN` or
+    `ADS_DEV_KEY`), or from `~/.ads/token` or `~/.ads/dev_key`, or `None` if
+    no token is found.
+    """
 
+    for name in ADS_TOKEN_ENVIRON_VARS:
+        token = os.getenv(name)
+        if token:
+            return token
+    for path in ADS_TOKEN_FILES:
+        try:
+            with open(os.path.expanduser(path)) as fp:
+                return fp.read().strip()
+        except FileNotFoundError:
+            continue
+    warnings.warn("No NASA/ADS API token found", RuntimeWarning)
+    return None
 
-def parse_author_name(author_name):
+
+def create_session(token=None, limit=100, keepalive_timeout=60):
     """
-    Return a dictionary of parsed attributes of an author's name, regardless
-    of the input format.
+    Create a `aiohttp.ClientSession` that is authenticated to execute queries
+    through the NASA/ADS API. Connections are kept alive between requests, so
+    the session should be shared by as many searches as possible.
+
+    :param token: [optional]
+        The NASA/ADS API token. If `None` is given then the token will be
+        read from the environment, or the `ads` token files (see
+        `get_ads_token`).
 
-    :param author_name:
-        The name as given, which could be a number of different formats.
+    :param limit: [optional]
+        The maximum number of simultaneous connections in the pool. Default
+        is 100.
+
+    :param keepalive_timeout: [optional]
+        The time (in seconds) to keep idle connections open. Default is 60.
     """
 
-    logger.debug(f"Parsing author name '{author_name}'")
+    if token is None:
+        token = get_ads_token()
 
-    number_of_commas = author_name.count(",")
-    suffix = None
-    if number_of_commas == 0:
-        *given_names, last_name = author_name.split(" ")
-        given_names = " ".join(given_names)
-    elif number_of_commas == 1:
-        last_name, given_names = author_name.split(",")
-    else:
-        last_name, given_names, suffix = author_name.split(",")
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+    )
 
-    last_name = last_name.strip()
-    given_names = given_names.strip()
 
-    first_name = given_names.split(" ")[0].replace(".", "")
-    initial_only = len(first_name) == 1
+async def _search(
+    session,
+    cache=None,
+    limiter=None,
+    budget=None,
+    on_docs=None,
+    hedge_after=None,
+    **params,
+):
+    """
+    Return the response to a NASA/ADS query (from the cache, if given), or
+    `None` if the query failed. Queries that fail in a way that is worth
+    retrying are retried, with exponential backoff.
+
+    :param on_docs: [optional]
+        A function to call with each list of articles as they are parsed from
+        the response, before the whole response has arrived. Articles are
+        only passed to this function once, even if the query is retried. It is
+        not called for cached responses.
+
+    :param hedge_after: [optional]
+        Send a duplicate request if the articles have not started arriving
+        after this many seconds, and use whichever response arrives first.
+    """
 
-    return dict(
-        last_name=last_name,
-        given_names=given_names,
-        first_name=None if initial_only else first_name,
-        initial_only=initial_only,
+    if cache is not None:
+        content = cache.get(params)
+        if content is not None:
+            logger.debug(f"Found cached response for {params}")
+            metrics.CACHE_REQUESTS.labels(result="hit").inc()
+            return content
+        metrics.CACHE_REQUESTS.labels(result="miss").inc()
+
+    if budget is not None and not budget.spend_upstream_request():
+        return None
+
+    logger.debug(f"Searching {params}")
+    # Skip articles that were passed on before a retry.
+    delivered = 0
+
+    def deliver():
+        received = 0
+
+        def receive(docs):
+            nonlocal delivered, received
+            new_docs = docs[max(0, delivered - received) :]
+            received += len(docs)
+            if new_docs:
+                delivered += len(new_docs)
+                on_docs(new_docs)
+
+        return receive if on_docs is not None else None
+
+    for attempt in itertools.count():
+        try:
+            content = await _hedged_query(
+                session, params, limiter, budget, deliver, hedge_after
+            )
+            break
+        except RateLimitExceeded as error:
+            # Don't wait (possibly for hours) for the rate limit to reset.
+            logger.warning(f"Giving up on {params}: {error}")
+            if budget is not None:
+                budget.exhaust("rate_limit")
+            return None
+        except RetryableError as error:
+            delay = ADS_RETRY_BACKOFF * 2**attempt * random.uniform(0.5, 1.5)
+            delay = max(delay, error.retry_after or 0)
+            if attempt >= ADS_MAX_RETRIES or delay > ADS_MAX_RETRY_DELAY:
+                logger.warning(f"Giving up on {params}: {error}")
+                if budget is not None:
+                    budget.fail_upstream_request()
+                return None
+            logger.info(f"Retrying in {delay:.1f} seconds: {error}")
+            metrics.ADS_RETRIES.inc()
+            await asyncio.sleep(delay)
+            if budget is not None and not budget.spend_upstream_request():
+                return None
+
+    if content is None:
+        # NASA/ADS refused the query.
+        if budget is not None:
+            budget.fail_upstream_request()
+        return None
+
+    logger.debug(
+        f"Found {content['response']['numFound']} articles from {params}"
+    )
+    if cache is not None:
+        cache.set(params, content)
+    return content
+
+
+async def _hedged_query(session, params, limiter, budget, deliver, hedge):
+    # Query NASA/ADS, and if the articles have not started arriving after
+    # `hedge` seconds, query again and use whichever response arrives first.
+    # The first response to send articles claims the stream, and the other
+    # query is cancelled.
+    if hedge is None:
+        return await _limited_query(session, params, limiter, deliver())
+
+    owner = None
+    tasks = []
+
+    def claim(index, receive):
+        if receive is None:
+            return None
+
+        def claimed(docs):
+            nonlocal owner
+            if owner is None:
+                owner = index
+                for other, task in enumerate(tasks):
+                    if other != index:
+                        task.cancel()
+            if owner == index:
+                receive(docs)
+
+        return claimed
+
+    tasks.append(
+        asyncio.ensure_future(
+            _limited_query(session, params, limiter, claim(0, deliver()))
+        )
     )
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge)
+        if (
+            done
+            or owner is not None
+            or (budget is not None and not budget.spend_upstream_request())
+        ):
+            return await tasks[0]
+
+        logger.info(f"Hedging slow query {params}")
+        metrics.ADS_HEDGED_REQUESTS.inc()
+        tasks.append(
+            asyncio.ensure_future(
+                _limited_query(session, params, limiter, claim(1, deliver()))
+            )
+        )
+        pending, error = (set(tasks), None)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error or RetryableError(f"Hedged queries of {params} failed")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _limited_query(session, params, limiter=None, on_docs=None):
+    if limiter is None:
+        return await _query(session, params, on_docs=on_docs)
+    async with limiter:
+        return await _query(session, params, limiter, on_docs)
+
+
+async def _query(session, params, limiter=None, on_docs=None):
+    t_init = time.perf_counter()
+    status = "error"
+    try:
+        async with session.get(ADS_SEARCH_URL, params=params) as response:
+            status = response.status
+            if limiter is not None:
+                limiter.update(response.headers, response.status)
+                if status == 429:
+                    limiter.check()
+            if status in ADS_RETRY_STATUSES:
+                raise RetryableError(
+                    f"NASA/ADS responded with {status} to {params}",
+                    _retry_after(status, response.headers),
+                )
+            if status != 200:
+                text = await response.text()
+                logger.error(
+                    f"NASA/ADS responded with {status} to {params}: "
+                    f"{text[:500]}"
+                )
+                return None
+            if on_docs is None:
+                return await response.json()
+
+            # Pass on articles as they arrive.
+            parser = DocsParser()
+            async for data in response.content.iter_any():
+                docs = parser.feed(data)
+                if docs:
+                    on_docs(docs)
+            return parser.close()
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        raise RetryableError(f"{type(e).__name__} from NASA/ADS: {e}") from e
+    finally:
+        metrics.ADS_REQUEST_SECONDS.observe(time.perf_counter() - t_init)
+        metrics.ADS_RESPONSES.labels(status=status).inc()
+
+
+def _retry_after(status, headers):
+    # The time (in seconds) that NASA/ADS asked us to wait, if it did.
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        pass
+    # X-RateLimit-Reset is when the daily quota resets, which is sent with
+    # every response, so only wait for it if the quota has run out (and back
+    # off as usual from server errors).
+    try:
+        exhausted = int(headers["X-RateLimit-Remaining"]) <= 0
+    except (KeyError, ValueError):
+        exhausted = False
+    if status != 429 and not exhausted:
+        return None
+    try:
+        return max(0, int(headers["X-RateLimit-Reset"]) - time.time())
+    except (KeyError, ValueError):
+        return None
 
 
 def similar_author_names_on_author_indices(
     article, given_names, author_indices
 ):
-    if author_indices is None:
-        return False
-
     # We must define what constitutes "similar" enough as an author name.
     # Here we will define "Lastname, F." as being sufficient.
-    parsed_given_names = list(map(unique_name_descriptor, given_names))
+    return AuthorNameMatcher(given_names, author_indices).matches(article)
 
-    for index in author_indices:
-        try:
-            author = article["author"][index]
 
-        except IndexError:
-            continue
+def _page_sizes(first_rows, total_rows, growth=2, max_rows=ADS_MAX_ROWS):
+    """
+    Return a list of `(start, rows)` tuples for the pages that follow a first
+    page of `first_rows` rows, with page sizes that grow by the given factor
+    until `total_rows` rows are covered.
+    """
 
-        else:
-            parsed_author = unique_name_descriptor(author)
+    pages = []
+    start, rows = (first_rows, first_rows)
+    while start < total_rows:
+        rows = max(1, min(int(rows * growth), max_rows, total_rows - start))
+        pages.append((start, rows))
+        start += rows
+    return pages
+
+
+class SearchBudget:
+    """
+    Limits on how much a single search can do. A search stops (early) once
+    any of its budget is exhausted.
 
-            if parsed_author in parsed_given_names:
-                return True
+    :param max_seconds: [optional]
+        The maximum wall time (in seconds) of the search.
 
-    return False
+    :param max_upstream_requests: [optional]
+        The maximum number of requests to send to NASA/ADS. Responses served
+        from the cache are free.
+
+    :param max_articles: [optional]
+        The maximum number of articles to collate.
+    """
+
+    def __init__(
+        self, max_seconds=None, max_upstream_requests=None, max_articles=None
+    ):
+        self.max_seconds = max_seconds
+        self.max_upstream_requests = max_upstream_requests
+        self.max_articles = max_articles
+        self.started = time.monotonic()
+        self.upstream_requests = 0
+        self.articles = 0
+        self.exhausted = None
+        self.failed_upstream_requests = 0
+
+    def remaining_seconds(self):
+        """
+        Return the time (in seconds) left in the budget, or `None` if there
+        is no time limit.
+        """
+        if self.max_seconds is None:
+            return None
+        remaining = self.max_seconds - (time.monotonic() - self.started)
+        if remaining <= 0:
+            self.exhaust("max_seconds")
+        return max(remaining, 0)
+
+    def spend_upstream_request(self):
+        """
+        Return whether there is budget left for another NASA/ADS request,
+        and count it if there is.
+        """
+        if self.exhausted is not None or self.remaining_seconds() == 0:
+            return False
+        if (
+            self.max_upstream_requests is not None
+            and self.upstream_requests >= self.max_upstream_requests
+        ):
+            self.exhaust("max_upstream_requests")
+            return False
+        self.upstream_requests += 1
+        return True
+
+    def spend_article(self):
+        """
+        Return whether there is budget left for another article, and count
+        it if there is.
+        """
+        if self.exhausted is not None:
+            return False
+        if (
+            self.max_articles is not None
+            and self.articles >= self.max_articles
+        ):
+            self.exhaust("max_articles")
+            return False
+        self.articles += 1
+        return True
+
+    def fail_upstream_request(self):
+        """
+        Count a NASA/ADS request that failed (after any retries), so that
+        the search is known to have missed what it would have found.
+        """
+        metrics.FAILED_UPSTREAM_REQUESTS.inc()
+        self.failed_upstream_requests += 1
+
+    @property
+    def complete(self):
+        """
+        Whether the search found everything it looked for: its budget was not
+        exhausted, and no NASA/ADS request failed.
+        """
+        return self.exhausted is None and not self.failed_upstream_requests
+
+    def exhaust(self, reason):
+        """Mark the budget as exhausted, for the given reason."""
+        if self.exhausted is None:
+            logger.info(f"Search budget exhausted ({reason})")
+            metrics.EXHAUSTED_BUDGETS.labels(budget=reason).inc()
+            self.exhausted = reason
+
+    def to_json(self):
+        """Return a JSON-serializable summary of the budget spent."""
+        return dict(
+            exhausted=self.exhausted,
+            seconds=time.monotonic() - self.started,
+            upstream_requests=self.upstream_requests,
+            failed_upstream_requests=self.failed_upstream_requests,
+            articles=self.articles,
+        )
+
+
+# A result from `SearchScheduler.next_result`: the priority of the query,
+# articles from it that have not been returned before, and the whole response
+# (or `None` if the query is still running).
+SearchResult = namedtuple("SearchResult", ("priority", "docs", "content"))
+
+
+class SearchScheduler:
+    """
+    Run NASA/ADS queries for a single search on a bounded pool of workers.
+
+    Queries are taken from a priority queue (lowest priority value first, and
+    in order of submission for equal priorities), and identical queries are
+    only run once. Results are made available in the order they arrive.
+
+    :param session:
+        A `aiohttp.ClientSession` to use for the queries.
+
+    :param max_workers: [optional]
+        The maximum number of queries to run concurrently. Default is 5.
+
+    :param stream: [optional]
+        Return articles as they are parsed from each response, before the
+        whole response has arrived. Default is False.
+
+    :param hedge_after: [optional]
+        Hedge queries for later pages (`PAGE`) that have not started to
+        arrive after this many seconds (see `_search`).
+
+    :param search_kwds: [optional]
+        Keyword arguments (e.g., `cache`, `limiter` and `budget`) to pass to
+        every query.
+    """
+
+    FIRST_PAGE, PAGE, SIMILAR = (0, 1, 2)
+
+    def __init__(
+        self,
+        session,
+        max_workers=5,
+        stream=False,
+        hedge_after=None,
+        **search_kwds,
+    ):
+        self.session = session
+        self.max_workers = max_workers
+        self.stream = stream
+        self.hedge_after = hedge_after
+        self.search_kwds = search_kwds
+        self._queue = asyncio.PriorityQueue()
+        self._results = asyncio.Queue()
+        self._submitted = set()
+        self._order = itertools.count()
+        self._workers = []
+        self._pending = 0
+
+    def submit(self, priority, **params):
+        """
+        Queue a NASA/ADS query, unless an identical query has already been
+        submitted.
+
+        :param priority:
+            The priority of this query. Queries with lower values are run
+            first.
+
+        :param params:
+            The query parameters.
+
+        :returns:
+            A boolean indicating whether the query was queued.
+        """
+
+        key = tuple(sorted((k, str(v)) for k, v in params.items()))
+        if key in self._submitted:
+            return False
+
+        self._submitted.add(key)
+        self._queue.put_nowait((priority, next(self._order), params))
+        self._pending += 1
+        if len(self._workers) < self.max_workers:
+            self._workers.append(asyncio.ensure_future(self._work()))
+        return True
+
+    @property
+    def pending(self):
+        """Return the number of queries that have not been returned yet."""
+        return self._pending
+
+    async def next_result(self):
+        """
+        Return the next `SearchResult`: either articles that have arrived
+        from a query that is still running (if streaming), or the rest of the
+        articles and the whole response of a query that has completed.
+        Queries that failed are skipped. Returns `None` once every submitted
+        query has completed.
+        """
+
+        while self._pending:
+            completed, result = await self._results.get()
+            if completed:
+                self._pending -= 1
+                if result.content is None:
+                    continue
+            return result
+        return None
+
+    async def _work(self):
+        while True:
+            priority, _, params = await self._queue.get()
+            streamed = 0
+
+            def on_docs(docs):
+                nonlocal streamed
+                streamed += len(docs)
+                self._results.put_nowait(
+                    (False, SearchResult(priority, docs, None))
+                )
+
+            try:
+                content = await _search(
+                    self.session,
+                    on_docs=on_docs if self.stream else None,
+                    hedge_after=(
+                        self.hedge_after if priority == self.PAGE else None
+                    ),
+                    **self.search_kwds,
+                    **params,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Exception occurred searching {params}")
+                content = None
+            docs = [] if content is None else content["response"]["docs"]
+            self._results.put_nowait(
+                (True, SearchResult(priority, docs[streamed:], content))
+            )
+
+    async def close(self):
+        """Cancel any outstanding queries."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
 
 
 async def network_search(
@@ -127,6 +637,14 @@ async def network_search(
     author_names,
     max_initial_rows=500,
     similarity_search_on_author_indices=None,
+    cache=None,
+    limiter=None,
+    max_workers=5,
+    paging="adaptive",
+    budget=None,
+    year_range=None,
+    entered_since=None,
+    skip_bibcodes=None,
     **kwargs,
 ):
     """
@@ -161,6 +679,64 @@ async def network_search(
 
         Set `similarity_search_on_author_indices = None` to prevent any
         similarity searches.
+
+    :param cache: [optional]
+        A `cache.ResponseCache` object to serve repeated NASA/ADS queries
+        from. If `None` is given then every query will be sent to NASA/ADS.
+
+    :param limiter: [optional]
+        A `ratelimit.RateLimiter` object that limits the number of NASA/ADS
+        requests in flight. If `None` is given then there is no limit.
+
+    :param max_workers: [optional]
+        The maximum number of NASA/ADS queries that this search will run
+        concurrently. Default is 5.
+
+    :param paging: [optional]
+        How to page through the articles found by the initial search. Both
+        modes start with a small page (of `rows` rows) so that the first
+        articles are yielded quickly, and then grow the page size by a factor
+        of `page_growth` (default 2) for each page, up to `ADS_MAX_ROWS`.
+
+        - "adaptive": request all later pages at once, by offset (`start`).
+        - "cursor": request one page after another with NASA/ADS deep paging
+          (`cursorMark`). This is slower to finish, but the results are
+          consistent even if the index is updated during the search.
+
+        The default is "adaptive".
+
+    :param budget: [optional]
+        A `SearchBudget` that limits the time, number of NASA/ADS requests,
+        and number of articles of this search. The search stops once the
+        budget is exhausted (check `budget.exhausted`).
+
+    :param year_range: [optional]
+        A two-length tuple of the first and last years of articles to find
+        (either can be `None`). The range is given to NASA/ADS as a filter
+        query (`fq`), for the initial search and any similarity searches.
+
+    :param entered_since: [optional]
+        Only find articles entered into NASA/ADS on or after this date
+        (as YYYY-MM-DD). Like `year_range`, this is given to NASA/ADS as a
+        filter query.
+
+    :param skip_bibcodes: [optional]
+        A collection of bibcodes of articles that should not be yielded (e.g.,
+        because they were found by an earlier search).
+
+    Similarity searches are batched: bibcodes are collected for up to
+    `similarity_window` seconds (default 0.1), or until there are
+    `similarity_batch_size` of them (default 20), and searched for together
+    with `similarity_rows` rows (default 5) per bibcode. Every article is
+    only yielded once, even if it is found by several queries.
+
+    Articles are yielded as they are parsed from each response, before the
+    whole page has arrived (unless `stream_docs` is False). Queries that
+    fail with a 429 or 5xx status, or a dropped connection, are retried with
+    exponential backoff. If a later page has not started arriving after
+    `hedge_after` seconds (default `ADS_HEDGE_AFTER`, which is off unless
+    `DROPBEAR_HEDGE_AFTER` is set), a duplicate request is sent for it, and
+    whichever responds first is used.
     """
 
     if isinstance(author_names, (str,)):
@@ -180,23 +756,40 @@ async def network_search(
         )
 
     # Some tings.
-    rows = kwargs.pop("rows", 20)  # number of rows to retrieve per page
+    rows = kwargs.pop("rows", 20)  # number of rows on the first page
+    page_growth = kwargs.pop("page_growth", 2)
     similarity_rows = kwargs.pop(
         "similarity_rows", 5
-    )  # number of rows to retrieve per similarity search
+    )  # number of rows to retrieve per bibcode in a similarity search
+    similarity_batch_size = kwargs.pop("similarity_batch_size", 20)
+    similarity_window = kwargs.pop("similarity_window", 0.1)
+    stream_docs = kwargs.pop("stream_docs", True)
+    hedge_after = kwargs.pop("hedge_after", ADS_HEDGE_AFTER)
 
     fields = kwargs.pop(
         "fields",
         ["id", "author", "bibcode", "year", "aff", "orcid", "pubdate"],
     )
-    max_pages = 1 + int(max_initial_rows / rows)
+    if paging not in ("adaptive", "cursor"):
+        raise ValueError("paging must be one of 'adaptive' or 'cursor'")
+
     fl = ",".join(fields)
 
     # For our similarity searches (if we make any.)
-    similarity_args = (author_names, similarity_search_on_author_indices)
-    similarity_search_kwds = dict(
-        fl=fl, start=0, rows=similarity_rows, sort="score desc"
+    similarity_matcher = AuthorNameMatcher(
+        author_names, similarity_search_on_author_indices
     )
+    similarity_search_kwds = dict(fl=fl, start=0, sort="score desc")
+    filters = []
+    if year_range is not None:
+        first_year, last_year = (
+            "*" if year is None else int(year) for year in year_range
+        )
+        filters.append(f"year:[{first_year} TO {last_year}]")
+    if entered_since is not None:
+        filters.append(f"entdate:[{entered_since} TO *]")
+    filter_query = dict(fq=" AND ".join(filters)) if filters else dict()
+    similarity_search_kwds.update(filter_query)
 
     # Let's do an initial search based on the author's name.
     assert '"' not in "".join(
@@ -207,95 +800,180 @@ async def network_search(
             [f'author:"{author_name}"' for author_name in author_names]
         ),
         fl=fl,
-        rows=rows,
-        max_pages=max_pages,
+        **filter_query,
     )
-    # We await here because we really need this content.
-    content = await _search(session, start=0, **params)
-
-    num_found = content["response"]["numFound"]
-
-    # Start asynchronous queries for later pages.
-    awaitables = []
-    bibcodes_searched_for_similarity = set()
-
-    max_rows = min(num_found, max_initial_rows)
-    for start in range(rows, max_rows, rows):
-        awaitables.append(_search(session, start=start, **params))
-
-    # Start streaming back the initial articles.
-    for article in content["response"]["docs"]:
-        # If the article author matches our similarity author indices, add a
-        # coroutine to do a similarity search.
-        if (
-            similar_author_names_on_author_indices(article, *similarity_args)
-            and article["bibcode"] not in bibcodes_searched_for_similarity
-        ):
-            bibcodes_searched_for_similarity.add(article["bibcode"])
-            awaitables.append(
-                _search(
-                    session,
-                    q=f"similar({article['bibcode']})",
+    first_page = dict(rows=min(rows, max_initial_rows, ADS_MAX_ROWS))
+    if paging == "cursor":
+        # Deep paging requires a sort order with a unique tie-breaker.
+        params.update(sort="date desc,id desc")
+        first_page.update(cursorMark="*")
+    else:
+        first_page.update(start=0)
+
+    scheduler = SearchScheduler(
+        session,
+        max_workers=max_workers,
+        stream=stream_docs,
+        hedge_after=hedge_after,
+        cache=cache,
+        limiter=limiter,
+        budget=budget,
+    )
+    # Time spent waiting on NASA/ADS (or the cache), rather than collating.
+    upstream = metrics.current_spans().time("upstream")
+    try:
+        # The later pages are queued once we know how many articles there
+        # are, but articles from the first page are yielded as they arrive.
+        metrics.ADS_PAGES.inc()
+        scheduler.submit(scheduler.FIRST_PAGE, **first_page, **params)
+        max_rows = page_rows = None
+
+        def queue_similarity_searches(bibcodes):
+            for i in range(0, len(bibcodes), similarity_batch_size):
+                batch = bibcodes[i : i + similarity_batch_size]
+                if scheduler.submit(
+                    scheduler.SIMILAR,
+                    q=_similar_query(batch),
+                    rows=min(similarity_rows * len(batch), ADS_MAX_ROWS),
                     **similarity_search_kwds,
+                ):
+                    metrics.ADS_SIMILAR_SEARCHES.inc()
+
+        rows_paged = 0
+        bibcodes_seen = set(skip_bibcodes or ())
+        bibcodes_searched_for_similarity = set()
+        # Bibcodes waiting to be searched for similar articles, and when the
+        # first of them started waiting.
+        similar_bibcodes, similar_since = ([], None)
+        while True:
+            with upstream:
+                result = await _wait_within_budget(
+                    scheduler.next_result(), budget
                 )
-            )
-        yield article
+            if result is None:
+                break
+
+            content = result.content
+            if content is not None and result.priority == scheduler.FIRST_PAGE:
+                num_found = content["response"]["numFound"]
+                max_rows = min(num_found, max_initial_rows)
+                page_rows = first_page["rows"]
+
+                # Queue up the later pages. These take priority over any
+                # similarity searches, which are queued as we find articles
+                # that deserve them.
+                if paging == "adaptive":
+                    for start, page_size in _page_sizes(
+                        page_rows, max_rows, page_growth
+                    ):
+                        if scheduler.submit(
+                            scheduler.PAGE,
+                            start=start,
+                            rows=page_size,
+                            **params,
+                        ):
+                            metrics.ADS_PAGES.inc()
+
+            if content is not None and "nextCursorMark" in content:
+                # Only deep-paged queries have a cursor; queue the next page.
+                rows_paged += len(content["response"]["docs"])
+                if rows_paged < max_rows and content["response"]["docs"]:
+                    page_rows = min(
+                        int(page_rows * page_growth),
+                        max_rows - rows_paged,
+                        ADS_MAX_ROWS,
+                    )
+                    if scheduler.submit(
+                        scheduler.PAGE,
+                        cursorMark=content["nextCursorMark"],
+                        rows=page_rows,
+                        **params,
+                    ):
+                        metrics.ADS_PAGES.inc()
 
-    # We use an outer loop here because we might add coroutines to `awaitables`
-    # while we are awaiting on those coroutines. In practice we are awaiting on
-    # results from future pages from ADS, and we may want to asynchronously do
-    # similarity searches on some of those articles that have been returned.
+            for article in result.docs:
+                # Articles can be found by more than one query.
+                if article["bibcode"] in bibcodes_seen:
+                    metrics.DUPLICATE_ARTICLES.inc()
+                    continue
+                bibcodes_seen.add(article["bibcode"])
+
+                # If the article author matches our similarity author
+                # indices, queue a similarity search.
+                if (
+                    similarity_matcher.matches(article)
+                    and article["bibcode"]
+                    not in bibcodes_searched_for_similarity
+                ):
+                    bibcodes_searched_for_similarity.add(article["bibcode"])
+                    similar_bibcodes.append(article["bibcode"])
+                    if similar_since is None:
+                        similar_since = time.monotonic()
+                if budget is not None and not budget.spend_article():
+                    return
+                yield article
+
+            if budget is not None and budget.exhausted is not None:
+                return
+
+            # Search for full batches of similar articles now, and the rest
+            # once the window has passed (or there is nothing else to wait
+            # for).
+            if similar_bibcodes:
+                if (
+                    not scheduler.pending
+                    or time.monotonic() - similar_since >= similarity_window
+                ):
+                    ready = len(similar_bibcodes)
+                else:
+                    ready = len(similar_bibcodes) - (
+                        len(similar_bibcodes) % similarity_batch_size
+                    )
+                queue_similarity_searches(similar_bibcodes[:ready])
+                similar_bibcodes = similar_bibcodes[ready:]
+                if not similar_bibcodes:
+                    similar_since = None
 
-    # This is probably too hacky; there is probably a better way.
-    while True:
-        done = True
-        for coroutine in asyncio.as_completed(awaitables):
-            try:
-                next_content = await coroutine
+    finally:
+        await scheduler.close()
 
-            except RuntimeError:
-                # Already used this awaited coroutine.
-                continue
 
-            else:
-                if next_content is None:
-                    # TODO: Exception handling.
-                    continue
+def _similar_query(bibcodes):
+    # One query for articles similar to all of the given articles.
+    return "similar(bibcode:({}))".format(
+        " OR ".join(f'"{bibcode}"' for bibcode in bibcodes)
+    )
 
-                done = False
-                for article in next_content["response"]["docs"]:
-                    # If the article author matches our similarity author
-                    # indices, add a coroutine to do a similarity search
-                    if (
-                        similar_author_names_on_author_indices(
-                            article, *similarity_args
-                        )
-                        and article["bibcode"]
-                        not in bibcodes_searched_for_similarity
-                    ):
-                        bibcodes_searched_for_similarity.add(
-                            article["bibcode"]
-                        )
-                        awaitables.insert(
-                            0,
-                            _search(
-                                session,
-                                q=f"similar({article['bibcode']})",
-                                **similarity_search_kwds,
-                            ),
-                        )
-                    yield article
-
-        if done:
-            break
+
+async def _wait_within_budget(coroutine, budget):
+    # Return the result of the coroutine, or `None` if the budget runs out of
+    # time first.
+    if budget is None or budget.max_seconds is None:
+        return await coroutine
+    try:
+        return await asyncio.wait_for(coroutine, budget.remaining_seconds())
+    except asyncio.TimeoutError:
+        budget.exhaust("max_seconds")
+        return None
 
 
 async def suggest_authors(
     author_names,
     max_initial_rows=500,
-    similar_author_names_on_author_indices=None,
+    similarity_search_on_author_indices=None,
     session=None,
     affiliation_uniqueness_ratio=75,
+    cache=None,
+    limiter=None,
+    executor=None,
+    min_articles=None,
+    min_first_author_articles=None,
+    affiliation=None,
+    top_k=None,
+    rank_by="number_of_articles",
+    snapshots=None,
+    refresh=False,
+    graph=None,
     **kwargs,
 ):
     """
@@ -303,10 +981,11 @@ async def suggest_authors(
     a generator that will yield suggestions of alternative author names, and
     associated metrics.
 
-    Each execution of the generator will yield a dictionary containing one
-    author suggestion, with relevant metadata. If an author is found on
-    multiple articles then that author may be suggested multiple times by the
-    generator, but successive dictionaries for that author will contain updated
+    Each execution of the generator will yield a `suggestions.Suggestion`
+    containing one author suggestion, with relevant metadata (use its
+    `to_json` method for a dictionary). If an author is found on multiple
+    articles then that author may be suggested multiple times by the
+    generator, but successive suggestions for that author will contain updated
     information about that author (e.g., matched bibcodes, affiliations, et
     cetera).
 
@@ -338,13 +1017,76 @@ async def suggest_authors(
         A `aiohttp.ClientSession` asynchronous object that is already
         authenticated to execute queries through the NASA/ADS API. If `None` is
         provided then a `aiohttp.ClientSession` will be created for this
-        search.
+        search. Searches should share a session (see `create_session`) where
+        possible, so that connections to NASA/ADS are reused.
 
     :param affiliation_uniqueness_ratio: [optional]
         The ratio (between 0 and 100) of two affiliation strings in order for
         them to be considered as the same affiliation, based on the Levenshtein
         distance between two affiliation strings. Default is 75.
 
+    :param cache: [optional]
+        A `cache.ResponseCache` object to serve repeated NASA/ADS queries
+        from. If `None` is given then every query will be sent to NASA/ADS.
+
+    :param limiter: [optional]
+        A `ratelimit.RateLimiter` object that limits the number of NASA/ADS
+        requests in flight. If `None` is given then there is no limit.
+
+    :param executor: [optional]
+        A `concurrent.futures.Executor` to collate articles in, so that the
+        event loop stays responsive during large searches. See
+        `collate_authors`. If `None` is given then articles are collated on
+        the event loop.
+
+    :param budget: [optional]
+        A `SearchBudget` that limits the time, number of NASA/ADS requests,
+        and number of articles of this search. See `network_search`. Check
+        `budget.complete` once the search finishes to know whether it found
+        everything (i.e., no NASA/ADS request failed).
+
+    :param min_articles: [optional]
+        Only suggest authors with at least this many articles.
+
+    :param min_first_author_articles: [optional]
+        Only suggest authors with at least this many first-author articles.
+
+    :param affiliation: [optional]
+        Only suggest authors with an affiliation that contains this string
+        (ignoring case).
+
+    :param top_k: [optional]
+        Only suggest the top `top_k` authors, ranked by `rank_by`. When an
+        author falls out of the top authors, a `ranking.RemovedSuggestion` is
+        yielded for them.
+
+    :param rank_by: [optional]
+        How to rank authors for `top_k`: one of "number_of_articles"
+        (default), "number_of_articles_as_first_author", or
+        "most_recent_pubdate".
+
+    :param snapshots: [optional]
+        A `snapshots.SnapshotStore` to keep the collated suggestions of this
+        search in, once it finishes (unless its budget ran out, or a query of
+        NASA/ADS failed), if `refresh` is true.
+
+    :param refresh: [optional]
+        Refresh the snapshot of an earlier identical search (with the same
+        author names, and parameters that change what is collated), if there
+        is one in `snapshots`: yield the suggestions from the snapshot, and
+        then only search NASA/ADS for articles entered since the snapshot
+        was taken, merging them in. Default is False.
+
+    :param graph: [optional]
+        A `graph.CoauthorGraph` to add every article found to. Unless
+        similarity searches are asked for, the search is answered from the
+        graph if an earlier search covers it (see `CoauthorGraph.lookup`),
+        and NASA/ADS is only searched for articles entered since that search
+        (if it was more than `graph.max_age` ago).
+
+    To only find articles from some years, give a `year_range` (see
+    `network_search`).
+
     :returns:
         A generator that will yield a suggested author name (and relevant
         metadata), based on the input author names.
@@ -353,34 +1095,194 @@ async def suggest_authors(
     kwds = dict(
         author_names=author_names,
         max_initial_rows=max_initial_rows,
-        similar_author_names_on_author_indices=similar_author_names_on_author_indices,
+        similarity_search_on_author_indices=(
+            similarity_search_on_author_indices
+        ),
+        cache=cache,
+        limiter=limiter,
     )
     kwds.update(kwargs)
+    if kwds.get("budget") is None:
+        # Without limits, but to know whether any NASA/ADS request failed.
+        kwds["budget"] = SearchBudget()
+    collate_kwds = dict(
+        affiliation_uniqueness_ratio=affiliation_uniqueness_ratio,
+        executor=executor,
+        batch_size=kwds.pop("batch_size", 50),
+    )
+    rank_kwds = dict()
+    if (min_articles, min_first_author_articles, affiliation) != (None,) * 3:
+        rank_kwds.update(
+            suggestion_filter=SuggestionFilter(
+                min_articles=min_articles,
+                min_first_author_articles=min_first_author_articles,
+                affiliation=affiliation,
+            )
+        )
+    if top_k is not None:
+        rank_kwds.update(top_k=TopK(top_k, rank_by=rank_by))
+
+    # Articles from similarity searches are not in the neighborhoods of the
+    # author names, so those searches always go to NASA/ADS.
+    use_graph = graph is not None and not similarity_search_on_author_indices
+
+    def suggestions(session):
+        def search(**search_kwds):
+            articles = normalize_articles(
+                network_search(session, **search_kwds)
+            )
+            if graph is not None:
+                articles = _index_articles(
+                    graph,
+                    articles,
+                    _neighborhood(search_kwds) if use_graph else None,
+                )
+            return articles
+
+        if snapshots is not None and refresh:
+            suggestions = _refresh(search, snapshots, kwds, collate_kwds)
+        else:
+            suggestions = collate_authors(
+                (
+                    _graph_articles(graph, search, kwds)
+                    if use_graph
+                    else search(**kwds)
+                ),
+                **collate_kwds,
+            )
+        if rank_kwds:
+            return rank_suggestions(suggestions, **rank_kwds)
+        return suggestions
 
     if session is None:
-        # TODO: Overkill!
-        token = ads.base.BaseQuery().token
-        async with aiohttp.ClientSession(
-            headers={
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json",
-            }
-        ) as session:
-
-            async for suggestion in collate_authors(
-                network_search(session, **kwds),
-                affiliation_uniqueness_ratio=affiliation_uniqueness_ratio,
-            ):
+        async with create_session() as session:
+
+            async for suggestion in suggestions(session):
                 yield suggestion
 
     else:
-        async for suggestion in collate_authors(
-            network_search(session, **kwds),
-            affiliation_uniqueness_ratio=affiliation_uniqueness_ratio,
-        ):
+        async for suggestion in suggestions(session):
             yield suggestion
 
 
+async def _refresh(search, snapshots, kwds, collate_kwds):
+    # Search (and collate) only what is new since the last snapshot of this
+    # search, and then store a new snapshot.
+    key = search_key(
+        kwds["author_names"],
+        affiliation_uniqueness_ratio=(
+            collate_kwds["affiliation_uniqueness_ratio"]
+        ),
+        **{
+            name: value
+            for name, value in kwds.items()
+            if name not in ("author_names", "cache", "limiter", "budget")
+        },
+    )
+    created = time.time()
+    snapshot = snapshots.get(key)
+    suggestions = dict()
+    if snapshot is not None:
+        suggestions.update(snapshot.suggestions)
+        kwds = dict(
+            kwds,
+            entered_since=entry_date(snapshot.created),
+            skip_bibcodes={
+                bibcode
+                for suggestion in suggestions.values()
+                for bibcode in suggestion.bibcodes
+            },
+        )
+        logger.info(
+            f"Refreshing snapshot of {len(suggestions)} suggestions since "
+            f"{kwds['entered_since']}"
+        )
+        for suggestion in list(suggestions.values()):
+            yield suggestion
+
+    async for suggestion in collate_authors(
+        search(**kwds),
+        suggestions=suggestions,
+        **collate_kwds,
+    ):
+        yield suggestion
+
+    # Don't keep a snapshot that is missing articles (e.g., because its budget
+    # ran out, or a query of NASA/ADS failed): refreshing it would never find
+    # them.
+    budget = kwds.get("budget")
+    if budget is None or budget.complete:
+        snapshots.set(key, created, suggestions.values())
+
+
+def _neighborhood(kwds):
+    # The neighborhood in the co-author graph of a search.
+    return (
+        kwds["author_names"],
+        kwds.get("year_range"),
+        kwds["max_initial_rows"],
+    )
+
+
+async def _graph_articles(graph, search, kwds):
+    # Yield articles from the co-author graph, if an earlier search covers
+    # this one, and only search NASA/ADS for articles entered since, if that
+    # was a while ago. Otherwise, search NASA/ADS (which adds the articles
+    # found to the graph).
+    neighborhood = _neighborhood(kwds)
+    budget = kwds.get("budget")
+    started = time.time()
+    lookup = graph.lookup(*neighborhood)
+    complete = True
+    if lookup is not None:
+        for article in lookup.articles:
+            if budget is not None and not budget.spend_article():
+                return
+            yield article
+        if not lookup.stale:
+            metrics.GRAPH_LOOKUPS.labels(result="hit").inc()
+            return
+        metrics.GRAPH_LOOKUPS.labels(result="stale").inc()
+        complete = lookup.complete
+        kwds = dict(
+            kwds,
+            entered_since=entry_date(lookup.refreshed),
+            skip_bibcodes={article.bibcode for article in lookup.articles},
+        )
+    else:
+        metrics.GRAPH_LOOKUPS.labels(result="miss").inc()
+
+    found = 0
+    async for article in search(**kwds):
+        found += 1
+        yield article
+
+    # A search that is missing articles (because its budget ran out, or a
+    # query of NASA/ADS failed) leaves the neighborhood as it was. A search
+    # that finished found every article in its years if it found fewer than
+    # it asked for (and so did the search that it topped up).
+    if budget is None or budget.complete:
+        graph.set_refreshed(
+            neighborhood, started, complete and found < neighborhood[2]
+        )
+
+
+async def _index_articles(graph, articles, neighborhood=None, batch_size=100):
+    # Add the articles to the co-author graph (and to the neighborhood of
+    # the search that found them) as they pass, in batches, so the graph is
+    # not written to for every article.
+    batch = []
+    try:
+        async for article in articles:
+            batch.append(article)
+            if len(batch) >= batch_size:
+                graph.add_articles(batch, neighborhood)
+                batch = []
+            yield article
+    finally:
+        graph.add_articles(batch, neighborhood)
+
+
 def speculate_gender_expression(first_name):
     """
     Speculate on the gender of a person, given their first name.
@@ -394,12 +1296,109 @@ def speculate_gender_expression(first_name):
         andy and unknown is that the former is found to have the same
         probability to be male than to be female, while the later means that
         the name wasn’t found in the training set.
+
+    The dictionary of names is loaded the first time this is called (see
+    `genders.load_genders`).
+    """
+    return genders.get_gender(first_name)
+
+
+# Affiliations that are not worth recording.
+IGNORE_AFFILIATIONS = frozenset({"", "-"})
+
+_affiliation_split_str = " ; "  # because &amp; exists.
+
+# An article from NASA/ADS, parsed once so that collation does not repeat the
+# work for every author. The `keys`, `affiliations` and `orcids` are aligned
+# with `authors`: `keys` are unique name descriptors (or `None` for
+# collaborations), `affiliations` are tuples of affiliation strings, and
+# `orcids` are `None` where unknown.
+Article = namedtuple(
+    "Article",
+    (
+        "bibcode",
+        "year",
+        "pubdate",
+        "pubdate_ordinal",
+        "authors",
+        "keys",
+        "affiliations",
+        "orcids",
+    ),
+)
+
+
+def _fix_pubdate(pubdate):
+    # NASA/ADS uses "00" for unknown days and months.
+    pubdate = f"{pubdate[:-1]}1" if pubdate.endswith("-00") else pubdate
+    return pubdate.replace("-00-", "-01-")
+
+
+def normalize_article(article):
+    """
+    Parse an article from NASA/ADS into a compact `Article` record.
+
+    :param article:
+        A dictionary describing an article, as returned by NASA/ADS.
+    """
+
+    if isinstance(article, Article):
+        return article
+
+    pubdate = _fix_pubdate(article["pubdate"])
+    authors, keys, affiliations, orcids = ([], [], [], [])
+    # ORCID not always returned by NASA/ADS, even if we ask nicely.
+    article_orcids = article.get("orcid", ())
+    for j, (author, aff) in enumerate(zip(article["author"], article["aff"])):
+        key = unique_name_descriptor(author)
+        authors.append(author)
+        keys.append(None if is_collaboration(key) else key)
+        affiliations.append(
+            tuple(map(str.strip, aff.split(_affiliation_split_str)))
+        )
+        try:
+            orcid = article_orcids[j]
+        except IndexError:
+            orcid = None
+        orcids.append(None if orcid in ("-", "", ".") else orcid)
+
+    return Article(
+        bibcode=sys.intern(article["bibcode"]),
+        year=int(article["year"]),
+        pubdate=pubdate,
+        pubdate_ordinal=int(pubdate.replace("-", "")),
+        authors=tuple(authors),
+        keys=tuple(keys),
+        affiliations=tuple(affiliations),
+        orcids=tuple(orcids),
+    )
+
+
+async def normalize_articles(articles):
+    """
+    Returns a generator that yields a compact `Article` record for each of the
+    given articles from NASA/ADS.
+
+    :param articles:
+        An asynchronous generator that yields articles (e.g., from
+        `network_search`).
     """
-    xyz = __gender_detector.get_gender(first_name)
-    return xyz
+
+    spans = metrics.current_spans()
+    async for article in articles:
+        t_init = time.perf_counter()
+        article = normalize_article(article)
+        spans.add("collation", time.perf_counter() - t_init)
+        yield article
 
 
-async def collate_authors(articles, affiliation_uniqueness_ratio):
+async def collate_authors(
+    articles,
+    affiliation_uniqueness_ratio,
+    executor=None,
+    batch_size=50,
+    suggestions=None,
+):
     """
     Returns a generator that constantly yields summary statistics on the given
     articles. This function will take the `articles` generator and provide name
@@ -413,138 +1412,247 @@ async def collate_authors(articles, affiliation_uniqueness_ratio):
         them to be considered as the same affiliation, based on the Levenshtein
         distance between two affiliation strings.
 
+    :param executor: [optional]
+        A `concurrent.futures.Executor` (e.g., a `ProcessPoolExecutor`) to
+        collate articles in, so that the event loop is free to serve other
+        requests. Articles are collated in batches, and the partial
+        suggestions from each batch are merged on the event loop. Each author
+        in a batch is yielded once per batch, rather than once per article.
+        If `None` is given then articles are collated on the event loop.
+
+    :param batch_size: [optional]
+        The maximum number of articles to send to the executor at once.
+        Smaller batches are sent if no more articles are ready. This is
+        ignored if no `executor` is given. Default is 50.
+
+    :param suggestions: [optional]
+        A dictionary of suggestions (keyed by unique name descriptor) that
+        were collated from other articles (e.g., from a snapshot), which will
+        be updated in place with the given articles.
+
     :returns:
-        A generator that will constantly yield name suggestions.
+        A generator that will constantly yield name suggestions (as
+        `suggestions.Suggestion` objects).
+    """
+
+    if suggestions is None:
+        suggestions = dict()
+    affiliation_matcher = AffiliationMatcher.shared(
+        affiliation_uniqueness_ratio
+    )
+    # Only time the work done here, not the time spent waiting for articles
+    # or for the consumer to take each suggestion.
+    spans = metrics.current_spans()
+
+    if executor is None:
+        async for article in articles:
+            t_init = time.perf_counter()
+            for suggestion in _collate_article(
+                suggestions, article, affiliation_matcher
+            ):
+                spans.add("collation", time.perf_counter() - t_init)
+                yield suggestion
+                t_init = time.perf_counter()
+            spans.add("collation", time.perf_counter() - t_init)
+        return
+
+    loop = asyncio.get_running_loop()
+    async for batch in _batches(articles, batch_size):
+        t_init = time.perf_counter()
+        partial_suggestions = await loop.run_in_executor(
+            executor,
+            _collate_batch,
+            list(map(normalize_article, batch)),
+            affiliation_uniqueness_ratio,
+        )
+        for key, partial_suggestion in partial_suggestions.items():
+            if key in suggestions:
+                _merge_suggestion(
+                    suggestions[key], partial_suggestion, affiliation_matcher
+                )
+            else:
+                suggestions[key] = partial_suggestion
+        spans.add("collation", time.perf_counter() - t_init)
+        for key in partial_suggestions:
+            yield suggestions[key]
+
+
+async def _batches(articles, batch_size):
+    """
+    Yield lists of up to `batch_size` articles from the `articles` generator,
+    without waiting for a full batch if no more articles are ready.
+    """
+
+    queue = asyncio.Queue()
+    done = object()
+
+    async def read():
+        try:
+            async for article in articles:
+                await queue.put(article)
+        finally:
+            await queue.put(done)
+
+    reader = asyncio.ensure_future(read())
+    try:
+        finished = False
+        while not finished:
+            batch = []
+            item = await queue.get()
+            while item is not done:
+                batch.append(item)
+                if len(batch) >= batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            else:
+                finished = True
+            if batch:
+                yield batch
+        # Raise any exception from the articles generator.
+        await reader
+    finally:
+        reader.cancel()
+
+
+def _collate_batch(articles, affiliation_uniqueness_ratio):
+    """
+    Collate a batch of articles from scratch, and return a dictionary of
+    suggestions keyed by unique name descriptor. This runs in an executor.
     """
 
     suggestions = dict()
-    ignore_affiliations = set({"", "-"})
+    affiliation_matcher = AffiliationMatcher.shared(
+        affiliation_uniqueness_ratio
+    )
+    for article in articles:
+        for _ in _collate_article(suggestions, article, affiliation_matcher):
+            pass
+    return suggestions
+
+
+def _infer_gender(suggestion):
+    # TODO: Should we run gender detector on all matched names and take the
+    # most common?
+    #       Right now if we searched for
+    #           "Foreman-Mackey, Dan"
+    #       and found a *single* article authored by
+    #           "Foreman-Mackey, Danielle"
+    #       then this would return female because Danielle is longer than
+    #       Dan.
+    if suggestion.inferred_gender == "unknown":
+        parsed_name = parse_author_name(suggestion.full_name)
+        if not parsed_name["initial_only"]:
+            suggestion.inferred_gender = speculate_gender_expression(
+                parsed_name["first_name"]
+            )
+
 
-    pd_format = "%Y-%m-%d"
-    _affiliation_split_str = " ; "  # because &amp; exists.
-    _fix_month = lambda s: s.replace("-00-", "-01-")  # noqa
-    _fix_pubdate = lambda s: _fix_month(  # noqa
-        f"{s[:-1]}1" if s.endswith("-00") else s
+def _merge_suggestion(suggestion, partial_suggestion, affiliation_matcher):
+    """
+    Merge a suggestion that was collated from a batch of articles into the
+    suggestion collated from all previous articles.
+    """
+
+    suggestion.bibcodes.extend(partial_suggestion.bibcodes)
+    suggestion.article_years.extend(partial_suggestion.article_years)
+    suggestion.number_of_articles += partial_suggestion.number_of_articles
+    suggestion.number_of_articles_as_first_author += (
+        partial_suggestion.number_of_articles_as_first_author
     )
 
-    async for article in articles:
-        for j, (author, aff) in enumerate(
-            zip(article["author"], article["aff"])
-        ):
+    if suggestion.add_matched_names(partial_suggestion.matched_names):
+        if suggestion.full_name == partial_suggestion.full_name:
+            if suggestion.inferred_gender == "unknown":
+                suggestion.inferred_gender = partial_suggestion.inferred_gender
+        else:
+            _infer_gender(suggestion)
 
-            key = unique_name_descriptor(author)
-            if is_collaboration(key):
-                continue
-
-            suggestions.setdefault(
-                key,
-                dict(
-                    full_name=None,
-                    unique_name_descriptor=key,
-                    orcid=None,
-                    most_recent_primary_affiliation=None,
-                    most_recent_pubdate=None,
-                    bibcodes=[],
-                    affiliations=set(),
-                    parsed_affiliations=set(),
-                    matched_names=set(),
-                    number_of_articles_as_first_author=0,
-                    number_of_articles=0,
-                    article_years=[],
-                    inferred_gender="unknown",
-                ),
-            )
+    # Affiliations that were unique within the batch are only unique overall
+    # if they are not similar to any affiliation we have already seen.
+    new_affiliations = set(partial_suggestion.affiliations).difference(
+        suggestion.affiliations
+    )
+    suggestion.add_affiliations(
+        new_affiliations,
+        affiliation_matcher.unique(
+            new_affiliations.intersection(
+                partial_suggestion.parsed_affiliations
+            ),
+            suggestion.affiliations,
+        ),
+    )
 
-            # Add bibcode and year.
-            suggestions[key]["bibcodes"].append(article["bibcode"])
-            suggestions[key]["article_years"].append(int(article["year"]))
+    if partial_suggestion.pubdate_ordinal > suggestion.pubdate_ordinal:
+        suggestion.pubdate_ordinal = partial_suggestion.pubdate_ordinal
+        suggestion.most_recent_pubdate = partial_suggestion.most_recent_pubdate
+        suggestion.most_recent_primary_affiliation = (
+            partial_suggestion.most_recent_primary_affiliation
+        )
 
-            # Update names.
-            # TODO: Parse the name instead?
-            suggestions[key]["matched_names"].add(author)
+    if partial_suggestion.orcid is not None:
+        assert (
+            suggestion.orcid is None
+            or suggestion.orcid == partial_suggestion.orcid
+        ), f"{suggestion.full_name} has multiple orcids!"
+        suggestion.orcid = partial_suggestion.orcid
 
-            previous_full_name = suggestions[key]["full_name"]
-            suggestions[key]["full_name"] = max(
-                suggestions[key]["matched_names"], key=len
-            )
 
-            # Infer gender expression.
-            # TODO: Should we run gender detector on all matched names and
-            # take the most common?
-            #       Right now if we searched for
-            #           "Foreman-Mackey, Dan"
-            #       and found a *single* article authored by
-            #           "Foreman-Mackey, Danielle"
-            #       then this would return female because Danielle is longer
-            #       than Dan.
-            if (
-                previous_full_name is None
-                or previous_full_name != suggestions[key]["full_name"]
-            ) and suggestions[key]["inferred_gender"] == "unknown":
-                # Name updated.
-                parsed_name = parse_author_name(suggestions[key]["full_name"])
-                if not parsed_name["initial_only"]:
-                    suggestions[key][
-                        "inferred_gender"
-                    ] = speculate_gender_expression(parsed_name["first_name"])
-
-            # Update affiliations.
-            new_affiliations = set(
-                map(str.strip, aff.split(_affiliation_split_str))
-            )
-            new_affiliations = new_affiliations.difference(
-                ignore_affiliations
-            ).difference(suggestions[key]["affiliations"])
-            for new_affiliation in new_affiliations:
-                for existing_affiliation in suggestions[key]["affiliations"]:
-                    if (
-                        fuzz.partial_ratio(
-                            existing_affiliation, new_affiliation
-                        )
-                        >= affiliation_uniqueness_ratio
-                    ):
-                        break
+def _collate_article(suggestions, article, affiliation_matcher):
+    """
+    Update the suggestions (in place) with the authors of the given article,
+    and yield the updated suggestion for each author.
+    """
 
-                else:
-                    # Add new parsed affiliation
-                    suggestions[key]["parsed_affiliations"].add(
-                        new_affiliation
-                    )
+    article = normalize_article(article)
+    for j, (author, key, affiliations, orcid) in enumerate(
+        zip(
+            article.authors, article.keys, article.affiliations, article.orcids
+        )
+    ):
+        if key is None:
+            # A collaboration.
+            continue
 
-            # Now add those new affiliations to the full list.
-            suggestions[key]["affiliations"] |= new_affiliations
-
-            # Update counts.
-            suggestions[key]["number_of_articles"] += 1
-            if not j:
-                suggestions[key]["number_of_articles_as_first_author"] += 1
-
-            article_pubdate = _fix_pubdate(article["pubdate"])
-            most_recent_pubdate = suggestions[key]["most_recent_pubdate"]
-
-            if most_recent_pubdate is None or time.strptime(
-                article_pubdate, pd_format
-            ) > time.strptime(most_recent_pubdate, pd_format):
-                suggestions[key].update(
-                    most_recent_pubdate=article_pubdate,
-                    most_recent_primary_affiliation=aff.split(
-                        _affiliation_split_str
-                    )[0].strip(),
-                )
+        try:
+            suggestion = suggestions[key]
+        except KeyError:
+            suggestion = suggestions[key] = Suggestion(key)
+
+        # Add bibcode and year.
+        suggestion.add_article(article.bibcode, article.year)
+        if not j:
+            suggestion.number_of_articles_as_first_author += 1
+
+        # Update names, and infer gender expression if the name changed.
+        # TODO: Parse the name instead?
+        if suggestion.add_matched_names((author,)):
+            _infer_gender(suggestion)
+
+        # Update affiliations.
+        new_affiliations = (
+            set(affiliations)
+            .difference(IGNORE_AFFILIATIONS)
+            .difference(suggestion.affiliations)
+        )
+        if new_affiliations:
+            suggestion.add_affiliations(
+                new_affiliations,
+                affiliation_matcher.unique(
+                    new_affiliations, suggestion.affiliations
+                ),
+            )
 
-            # ORCID not always returned by NASA/ADS, even if we ask nicely.
-            try:
-                orcid = article["orcid"][j]
-            except KeyError:
-                None
-            else:
-                if orcid not in ("-", "", "."):
-                    assert (
-                        suggestions[key]["orcid"] is None
-                        or suggestions[key]["orcid"] == orcid
-                    ), f"{author} has multiple orcids!"
-                    suggestions[key]["orcid"] = orcid
+        if article.pubdate_ordinal > suggestion.pubdate_ordinal:
+            suggestion.pubdate_ordinal = article.pubdate_ordinal
+            suggestion.most_recent_pubdate = article.pubdate
+            suggestion.most_recent_primary_affiliation = affiliations[0]
 
-            # TODO: Calculate other metrics for filtering/sorting.
+        if orcid is not None:
+            assert (
+                suggestion.orcid is None or suggestion.orcid == orcid
+            ), f"{author} has multiple orcids!"
+            suggestion.orcid = orcid
 
-            yield suggestions[key]
+        # TODO: Calculate other metrics for filtering/sorting.
+
+        yield suggestion
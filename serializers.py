@@ -0,0 +1,81 @@
+import json
+from array import array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    # Serialize what JSON does not know about (e.g., `Suggestion` objects).
+    if hasattr(obj, "to_json"):
+        return obj.to_json()
+    if isinstance(obj, array):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+class JSONSerializer:
+    """
+    Serialize objects as lines of JSON with the standard library.
+
+    Objects with a `to_json` method (e.g., suggestions) are serialized as
+    the dictionary it returns, and sets as sorted lists.
+    """
+
+    name = "json"
+
+    def dumps(self, obj):
+        """Return the object as a line of JSON, in UTF-8 encoded bytes."""
+        line = json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(",", ":")
+        )
+        return f"{line}\n".encode("utf-8")
+
+
+class ORJSONSerializer(JSONSerializer):
+    """
+    Serialize objects as lines of JSON with `orjson`, which is several times
+    faster than the standard library.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, obj):
+        """Return the object as a line of JSON, in UTF-8 encoded bytes."""
+        return orjson.dumps(
+            obj, default=_default, option=orjson.OPT_APPEND_NEWLINE
+        )
+
+
+SERIALIZERS = {
+    serializer.name: serializer
+    for serializer in (JSONSerializer, ORJSONSerializer)
+}
+
+
+def get_serializer(name=None):
+    """
+    Return a serializer by name ("json" or "orjson").
+
+    :param name: [optional]
+        The name of the serializer. If `None` is given then `orjson` is used
+        if it is installed, and the standard library otherwise.
+    """
+
+    if name is None:
+        name = "json" if orjson is None else "orjson"
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown serializer {name!r}; expected one of "
+            f"{', '.join(SERIALIZERS)}"
+        )
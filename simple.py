@@ -1,41 +1,430 @@
-import json
+import argparse
+import asyncio
+import logging
+import math
+import os
+import sys
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
 
 from aiohttp import web
 import jinja2
 import aiohttp_jinja2
 
+import metrics
 import search_utils
+import workers
+from cache import CACHE_DIRECTORY, ResponseCache
+from coalesce import SearchCoalescer, search_key
+from graph import CoauthorGraph
+from jobs import JobRunner, read_name_groups
+from names import unique_name_descriptor
+from ranking import RANKINGS
+from ratelimit import RateLimiter
+from serializers import get_serializer
+from snapshots import SnapshotStore
+from streaming import LineWriter, PatchStream, negotiate_encoding
 
+# The maximum number of NASA/ADS requests in flight, across all searches.
+MAX_UPSTREAM_CONCURRENCY = int(os.getenv("DROPBEAR_MAX_CONCURRENCY", 10))
 
-class CustomEncoder(json.JSONEncoder):
-    def default(self, obj):
-        try:
-            iterable = iter(obj)
-        except TypeError:
-            pass
-        else:
-            return list(sorted(iterable))
-        return json.JSONEncoder.default(self, obj)
+# The number of processes to collate articles in (zero to collate on the
+# event loop), and the maximum number of articles to send them at once.
+COLLATION_WORKERS = int(os.getenv("DROPBEAR_COLLATION_WORKERS", 0))
+COLLATION_BATCH_SIZE = int(os.getenv("DROPBEAR_COLLATION_BATCH_SIZE", 50))
+
+logger = logging.getLogger(__name__)
+
+# The limits that a search can ask for, and how to parse them.
+BUDGET_LIMITS = dict(
+    max_seconds=float, max_upstream_requests=int, max_articles=int
+)
+
+# The default time (in seconds) between writes of patches to a search that
+# streams them, and the range that a search can ask for.
+FLUSH_INTERVAL = 0.1
+FLUSH_INTERVAL_RANGE = (0.01, 5)
+
+# The filters that a search can ask for, and how to parse them.
+FILTERS = dict(
+    min_articles=int, min_first_author_articles=int, affiliation=str
+)
+
+# How to serialize suggestions ("json" or "orjson"; by default orjson if it
+# is installed), and the level to compress them at for clients that accept
+# gzip or deflate (zero to never compress).
+SERIALIZER = get_serializer(os.getenv("DROPBEAR_SERIALIZER") or None)
+COMPRESSION_LEVEL = int(os.getenv("DROPBEAR_COMPRESSION_LEVEL", 1))
+
+# The number of searches that batch jobs can run at once.
+JOB_CONCURRENCY = int(os.getenv("DROPBEAR_JOB_CONCURRENCY", 4))
+
+# The number of worker processes to serve with (see `workers.py`).
+WORKERS = int(os.getenv("DROPBEAR_WORKERS", 1))
+
+# Whether to keep a co-author graph of the articles that searches find, and
+# answer repeated searches from it (see `graph.py`). Indexing articles slows
+# down searches that are not answered from the graph.
+GRAPH = bool(int(os.getenv("DROPBEAR_GRAPH", 0)))
+
+response_cache = ResponseCache(
+    path=os.path.join(CACHE_DIRECTORY, "cache.sqlite")
+)
+snapshots = SnapshotStore(os.path.join(CACHE_DIRECTORY, "snapshots.sqlite"))
+graph = (
+    CoauthorGraph(os.path.join(CACHE_DIRECTORY, "graph.sqlite"))
+    if GRAPH
+    else None
+)
 
 
 async def search(request):
     data = await request.json()
-
-    response = web.StreamResponse(
-        status=200, reason="OK", headers={"Content-Type": "text/plain"},
+    try:
+        limits = {
+            name: parse(data[name])
+            for name, parse in BUDGET_LIMITS.items()
+            if data.get(name) is not None
+        }
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(
+            reason=f"Expected numbers for {', '.join(BUDGET_LIMITS)}"
+        )
+    ranking = _parse_ranking(data)
+    data = dict(
+        data,
+        flush_interval=_parse_flush_interval(data),
+        similarity_search_on_author_indices=_parse_similarity_indices(data),
     )
+
+    headers = {"Content-Type": "text/plain", "Vary": "Accept-Encoding"}
+    encoding = None
+    if COMPRESSION_LEVEL:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+    response = web.StreamResponse(status=200, reason="OK", headers=headers)
     await response.prepare(request)
+    writer = LineWriter(response, encoding, level=COMPRESSION_LEVEL)
 
-    author_names = data["name"].split(";")
-    async for suggestion in search_utils.suggest_authors(author_names):
-        await response.write(
-            (json.dumps(suggestion, cls=CustomEncoder) + "\n").encode("utf-8")
-        )
+    spans = metrics.start_spans()
+    metrics.SEARCHES_IN_FLIGHT.inc()
+    try:
+        await _search(request, writer, data, limits, ranking, spans)
+        await writer.close()
+    except (ConnectionResetError, asyncio.CancelledError) as exception:
+        # The client went away. Leaving `_search` has cancelled the search
+        # (unless other clients are following it).
+        logger.info("Client disconnected during search")
+        metrics.DISCONNECTED_SEARCHES.inc()
+        if isinstance(exception, asyncio.CancelledError):
+            raise
+        return response
+    finally:
+        metrics.SEARCHES_IN_FLIGHT.dec()
+        for name, seconds in spans.to_json().items():
+            metrics.SEARCH_SPAN_SECONDS.labels(span=name).observe(seconds)
 
     await response.write_eof()
     return response
 
 
+def _parse_ranking(data):
+    # Return the filters and ranking that a search asked for (if any).
+    try:
+        ranking = {
+            name: parse(data[name])
+            for name, parse in FILTERS.items()
+            if data.get(name) is not None
+        }
+        if data.get("year_range") is not None:
+            first_year, last_year = data["year_range"]
+            ranking["year_range"] = [
+                None if year is None else int(year)
+                for year in (first_year, last_year)
+            ]
+        if data.get("top_k") is not None:
+            ranking["top_k"] = int(data["top_k"])
+            if ranking["top_k"] < 1:
+                raise ValueError
+            ranking["rank_by"] = data.get("rank_by") or "number_of_articles"
+            if ranking["rank_by"] not in RANKINGS:
+                raise ValueError
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(
+            reason=(
+                "Expected numbers for min_articles and "
+                "min_first_author_articles, a string for affiliation, "
+                "[first, last] years for year_range, a positive top_k, and "
+                f"rank_by to be one of {', '.join(RANKINGS)}"
+            )
+        )
+    return ranking
+
+
+def _parse_flush_interval(data):
+    # Parse the flush interval before the response starts (so a bad one is
+    # a 400), and keep it in range, so a search cannot flush in a busy loop.
+    if data.get("flush_interval") is None:
+        return FLUSH_INTERVAL
+    try:
+        flush_interval = float(data["flush_interval"])
+        if not math.isfinite(flush_interval):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(
+            reason="Expected a number (of seconds) for flush_interval"
+        )
+    low, high = FLUSH_INTERVAL_RANGE
+    return min(max(flush_interval, low), high)
+
+
+def _parse_similarity_indices(data):
+    # Check the indices of articles to run similarity searches on before the
+    # response starts, so bad ones are a 400 rather than a failed search.
+    indices = data.get("similarity_search_on_author_indices")
+    if indices is None:
+        return None
+    if not isinstance(indices, list) or not all(
+        isinstance(index, int) and not isinstance(index, bool) and index >= 0
+        for index in indices
+    ):
+        raise web.HTTPBadRequest(
+            reason=(
+                "Expected a list of non-negative integers for "
+                "similarity_search_on_author_indices"
+            )
+        )
+    return indices
+
+
+async def _search(request, writer, data, limits, ranking, spans):
+    author_names = data["name"].split(";")
+    search_kwds = dict(
+        similarity_search_on_author_indices=data.get(
+            "similarity_search_on_author_indices"
+        ),
+        refresh=bool(data.get("refresh")),
+        **ranking,
+    )
+    # Every search has a budget (even without limits), so that the client is
+    # told if it ends early (e.g., because the rate limit was reached).
+    budget = search_utils.SearchBudget(**limits)
+    # Identical searches running at the same time share one search of
+    # NASA/ADS.
+    shared = request.app["searches"].join(
+        search_key(author_names, **search_kwds, **limits),
+        lambda: search_utils.suggest_authors(
+            author_names,
+            session=request.app["session"],
+            limiter=request.app["limiter"],
+            cache=response_cache,
+            executor=request.app["executor"],
+            batch_size=COLLATION_BATCH_SIZE,
+            budget=budget,
+            snapshots=snapshots,
+            graph=graph,
+            **search_kwds,
+        ),
+        budget=budget,
+    )
+    async with aclosing(shared.subscribe()) as suggestions:
+        await _write_suggestions(writer, suggestions, data, spans)
+
+    metrics.SEARCHES.inc()
+    if shared.budget is not None and not shared.budget.complete:
+        # Tell the client that the search ended early, or missed articles.
+        await writer.write(
+            SERIALIZER.dumps(dict(summary=shared.budget.to_json()))
+        )
+    if data.get("timings"):
+        # A trailer line, which clients must ask for.
+        await writer.write(SERIALIZER.dumps(dict(timings=spans.to_json())))
+
+
+async def _write_suggestions(writer, suggestions, data, spans):
+    serialization, write = (spans.time("serialization"), spans.time("write"))
+    if data.get("stream") == "patch":
+        await stream_patches(
+            writer,
+            suggestions,
+            data["flush_interval"],
+            spans,
+        )
+    else:
+        async for suggestion in suggestions:
+            with serialization:
+                line = SERIALIZER.dumps(suggestion)
+            with write:
+                await writer.write(line)
+
+
+async def stream_patches(writer, suggestions, flush_interval, spans=None):
+    """
+    Write patches of the given suggestions to the response, instead of whole
+    suggestions, coalescing updates over the flush interval.
+
+    :param writer:
+        A `streaming.LineWriter` for the response.
+
+    :param suggestions:
+        An asynchronous generator of author suggestions.
+
+    :param flush_interval:
+        The time (in seconds) between writes to the response.
+
+    :param spans: [optional]
+        A `metrics.Spans` to record the time spent serializing and writing
+        patches in.
+    """
+
+    spans = spans or metrics.Spans()
+    serialization, write = (spans.time("serialization"), spans.time("write"))
+    patches = PatchStream()
+
+    async def consume():
+        async for suggestion in suggestions:
+            patches.update(suggestion)
+
+    # Collect suggestions in the background, so patches are flushed on time
+    # even when we are waiting on NASA/ADS.
+    task = asyncio.ensure_future(consume())
+    try:
+        while not task.done():
+            await asyncio.wait([task], timeout=flush_interval)
+            with serialization:
+                lines = b"".join(map(SERIALIZER.dumps, patches.flush()))
+            if lines:
+                with write:
+                    await writer.write(lines)
+                    await writer.flush()
+        task.result()
+
+    finally:
+        # Wait for the task to stop, so the suggestions are not closed while
+        # it is still iterating over them (e.g., when the client disconnects).
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def create_job(request):
+    """
+    Start a batch job that searches for each of the given groups of names.
+    The body should be a JSON object with a list of `name_groups`, where each
+    group is a list of names or a string of ";"-separated names.
+    """
+
+    data = await request.json()
+    try:
+        name_groups = [
+            (
+                read_name_groups([group])[0]
+                if isinstance(group, str)
+                else list(map(str, group))
+            )
+            for group in data["name_groups"]
+        ]
+    except (KeyError, IndexError, TypeError):
+        raise web.HTTPBadRequest(
+            reason="Expected a list of name_groups, each with some names"
+        )
+
+    job = request.app["jobs"].submit(name_groups)
+    return web.json_response(job.to_json(), status=202)
+
+
+def get_job(request):
+    # Jobs may have been submitted to another worker, so look them up on
+    # disk rather than in memory.
+    try:
+        return request.app["jobs"].status(request.match_info["id"])
+    except KeyError:
+        raise web.HTTPNotFound(reason="No such job")
+
+
+async def job_status(request):
+    return web.json_response(get_job(request))
+
+
+async def job_results(request):
+    job = get_job(request)
+    return web.FileResponse(
+        request.app["jobs"].results_path(job["id"]),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+
+async def coauthors(request):
+    """
+    Return the co-authors of an author (`name`) from the co-author graph,
+    with the number of articles they share, most shared first. Only the
+    articles that earlier searches found are known, and NASA/ADS is never
+    searched.
+    """
+
+    if graph is None:
+        raise web.HTTPNotFound(reason="The co-author graph is not enabled")
+    name = request.query.get("name")
+    if not name:
+        raise web.HTTPBadRequest(reason="Expected a name")
+    try:
+        limit = int(request.query.get("limit", 100))
+    except ValueError:
+        raise web.HTTPBadRequest(reason="Expected a number for limit")
+    key = unique_name_descriptor(name)
+    return web.json_response(
+        dict(
+            unique_name_descriptor=key,
+            coauthors=graph.neighbors(key, limit=limit),
+        )
+    )
+
+
+async def get_metrics(request):
+    return web.Response(
+        text=metrics.render(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+async def health(request):
+    """
+    Report the health of the worker that answers, and (when serving with
+    several workers) the last report from every worker.
+    """
+
+    status = worker_status(request.app)
+    registry = request.app["registry"]
+    return web.json_response(
+        dict(
+            worker=status,
+            workers=(
+                [dict(status, healthy=True)]
+                if registry is None
+                else registry.workers()
+            ),
+        )
+    )
+
+
+def worker_status(app):
+    # What a worker reports about itself (see `workers.report_health`).
+    return dict(
+        pid=os.getpid(),
+        searches_in_flight=metrics.SEARCHES_IN_FLIGHT.labels().value,
+        searches=metrics.SEARCHES.labels().value,
+        shared_searches=len(app["searches"].searches),
+        upstream_requests_in_flight=app["limiter"].in_flight,
+        upstream_remaining=app["limiter"].remaining,
+        jobs_running=sum(
+            job.status == "running" for job in app["jobs"].jobs.values()
+        ),
+        cache_hit_rate=response_cache.stats["hit_rate"],
+    )
+
+
 @aiohttp_jinja2.template("index.html")
 async def index(request):
     return {}
@@ -46,10 +435,97 @@ app.add_routes(
     [
         web.get("/", index),
         web.post("/search", search),
+        web.post("/jobs", create_job),
+        web.get("/jobs/{id}", job_status),
+        web.get("/jobs/{id}/results", job_results),
+        web.get("/metrics", get_metrics),
+        web.get("/health", health),
+        web.get("/coauthors", coauthors),
         web.static("/static", "./front/static"),
     ]
 )
 
+
+async def open_session(app):
+    app["session"] = search_utils.create_session(
+        limit=MAX_UPSTREAM_CONCURRENCY
+    )
+    app["limiter"] = RateLimiter(max_concurrency=MAX_UPSTREAM_CONCURRENCY)
+    metrics.UPSTREAM_IN_FLIGHT.set_function(lambda: app["limiter"].in_flight)
+    app["executor"] = (
+        ProcessPoolExecutor(COLLATION_WORKERS) if COLLATION_WORKERS else None
+    )
+    app["searches"] = SearchCoalescer()
+    app["jobs"] = JobRunner(
+        os.path.join(CACHE_DIRECTORY, "jobs"),
+        concurrency=JOB_CONCURRENCY,
+        session=app["session"],
+        limiter=app["limiter"],
+        cache=response_cache,
+        executor=app["executor"],
+        batch_size=COLLATION_BATCH_SIZE,
+        graph=graph,
+    )
+    app["registry"] = app["heartbeat"] = None
+    if workers.is_worker():
+        app["registry"] = workers.WorkerRegistry(
+            os.environ[workers.WORKER_REGISTRY]
+        )
+        app["heartbeat"] = asyncio.ensure_future(
+            workers.report_health(app["registry"], lambda: worker_status(app))
+        )
+
+
+async def close_session(app):
+    if app["heartbeat"] is not None:
+        app["heartbeat"].cancel()
+        await asyncio.gather(app["heartbeat"], return_exceptions=True)
+        app["registry"].close()
+    await app["jobs"].close()
+    await app["session"].close()
+    if app["executor"] is not None:
+        app["executor"].shutdown(cancel_futures=True)
+    response_cache.close()
+    snapshots.close()
+    if graph is not None:
+        graph.close()
+
+
+app.on_startup.append(open_session)
+app.on_cleanup.append(close_session)
+
 aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader("./front/templates"))
 
-web.run_app(app)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the search app.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="number of worker processes (default 1; 0 for one per CPU)",
+    )
+    args = parser.parse_args()
+
+    # Cancel searches when their client disconnects.
+    sock = workers.worker_socket()
+    if sock is not None:
+        web.run_app(
+            app,
+            sock=sock,
+            handler_cancellation=True,
+            shutdown_timeout=workers.GRACEFUL_TIMEOUT,
+            print=None,
+        )
+    elif args.workers != 1:
+        workers.Supervisor(
+            [sys.executable, os.path.abspath(__file__)],
+            workers=args.workers,
+            host=args.host,
+            port=args.port,
+        ).run()
+    else:
+        web.run_app(
+            app, host=args.host, port=args.port, handler_cancellation=True
+        )
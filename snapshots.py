@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+
+from suggestions import Suggestion
+
+logger = logging.getLogger(__name__)
+
+# The collated suggestions of a finished search, and when (as a Unix time)
+# the search started.
+Snapshot = namedtuple("Snapshot", ("created", "suggestions"))
+
+
+class SnapshotStore:
+    """
+    An on-disk (SQLite) store of the collated suggestions of finished
+    searches, so that a search can later be refreshed with only the articles
+    entered into NASA/ADS since (see `search_utils.suggest_authors`).
+
+    Snapshots are stored as compressed JSON, keyed by the normalized author
+    names and search parameters (see `coalesce.search_key`).
+
+    :param path:
+        The path of the SQLite database.
+
+    :param max_entries: [optional]
+        The maximum number of snapshots to keep. The oldest snapshots are
+        removed first. Default is 10,000.
+    """
+
+    def __init__(self, path, max_entries=10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Shared by worker processes, like `cache.ResponseCache`.
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS snapshots (
+                key TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                content BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_created
+                ON snapshots (created);
+            """)
+
+    def get(self, key):
+        """
+        Return the `Snapshot` with the given key, or `None` if there is none.
+
+        :param key:
+            The key of the search (see `coalesce.search_key`).
+        """
+
+        row = self._connection.execute(
+            "SELECT created, content FROM snapshots WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        created, content = row
+        try:
+            suggestions = json.loads(zlib.decompress(content))
+        except (zlib.error, ValueError):
+            logger.exception(f"Ignoring unreadable snapshot {key}")
+            return None
+        return Snapshot(
+            created,
+            {
+                suggestion["unique_name_descriptor"]: Suggestion.from_json(
+                    suggestion
+                )
+                for suggestion in suggestions
+            },
+        )
+
+    def set(self, key, created, suggestions):
+        """
+        Store a snapshot of a finished search.
+
+        :param key:
+            The key of the search (see `coalesce.search_key`).
+
+        :param created:
+            The time (as a Unix time) that the search started. A refresh will
+            ask NASA/ADS for articles entered since (the day of) this time.
+
+        :param suggestions:
+            An iterable of `suggestions.Suggestion` objects.
+        """
+
+        content = zlib.compress(
+            json.dumps(
+                [suggestion.to_json() for suggestion in suggestions],
+                separators=(",", ":"),
+            ).encode("utf-8")
+        )
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                (key, created, content),
+            )
+        self._writes += 1
+        # Counting rows is not free, so only check the size every so often.
+        if self._writes % 100 == 1:
+            self._evict()
+
+    def _evict(self):
+        with self._connection:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM snapshots"
+            ).fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                logger.debug(f"Evicting {excess} snapshots")
+                self._connection.execute(
+                    """
+                    DELETE FROM snapshots WHERE key IN (
+                        SELECT key FROM snapshots ORDER BY created LIMIT ?
+                    )
+                    """,
+                    (excess,),
+                )
+
+    def clear(self):
+        """Remove all snapshots."""
+        with self._connection:
+            self._connection.execute("DELETE FROM snapshots")
+
+    def close(self):
+        """Close the store."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def entry_date(created):
+    """
+    Return a NASA/ADS date (YYYY-MM-DD, in UTC) for the day of the given Unix
+    time, to search for articles entered since a snapshot was created.
+    NASA/ADS entry dates only have a precision of days, so a refresh also
+    finds articles entered earlier on the same day (which are skipped).
+
+    :param created:
+        A Unix time.
+    """
+    return time.strftime("%Y-%m-%d", time.gmtime(created))
@@ -0,0 +1,236 @@
+import asyncio
+import time
+import zlib
+
+# Suggestion fields that only ever grow by appending to the end.
+APPENDED_FIELDS = ("bibcodes", "article_years")
+
+# Suggestion fields that are sets, and only ever grow.
+SET_FIELDS = ("affiliations", "parsed_affiliations", "matched_names")
+
+
+class PatchStream:
+    """
+    Coalesce a stream of author suggestions into patches that only contain
+    what changed since the last patch for each author.
+
+    Each patch is a dictionary with the `unique_name_descriptor` of the
+    author, and (where there are changes) the keys:
+
+    - `set`: a dictionary of fields to replace;
+    - `append`: a dictionary of lists to append to existing lists;
+    - `add`: a dictionary of (sorted) items to add to existing sets.
+
+    The first patch for an author contains the whole suggestion, so applying
+    all patches in order to empty suggestions recovers the full suggestions.
+
+    When an author is removed (see `ranking.RemovedSuggestion`), the patch is
+    `{"unique_name_descriptor": ..., "removed": true}`, and the next patch
+    for that author (if any) contains the whole suggestion again.
+    """
+
+    def __init__(self):
+        self._sent = dict()
+        self._dirty = dict()
+
+    def update(self, suggestion):
+        """
+        Record that the given suggestion has changed.
+
+        :param suggestion:
+            A `suggestions.Suggestion`, as yielded by
+            `search_utils.collate_authors`, or a `ranking.RemovedSuggestion`.
+        """
+        self._dirty[suggestion.unique_name_descriptor] = suggestion
+
+    def flush(self):
+        """
+        Return a list of patches for all suggestions that have changed since
+        the last flush.
+        """
+
+        patches = [
+            patch
+            for patch in map(self._patch, self._dirty.values())
+            if patch is not None
+        ]
+        self._dirty.clear()
+        return patches
+
+    def _patch(self, suggestion):
+        if getattr(suggestion, "removed", False):
+            # Only tell the client about authors that it has been sent.
+            key = suggestion.unique_name_descriptor
+            if self._sent.pop(key, None) is None:
+                return None
+            return suggestion.to_json()
+
+        suggestion = suggestion.to_json()
+        key = suggestion["unique_name_descriptor"]
+        sent = self._sent.setdefault(key, dict())
+
+        # The first patch for an author has every field, even empty ones.
+        replaced, appended, added = (dict(), dict(), dict())
+        for field, value in suggestion.items():
+            if field in APPENDED_FIELDS:
+                offset = sent.get(field)
+                if offset is None or len(value) > offset:
+                    appended[field] = value[offset:]
+                    sent[field] = len(value)
+
+            elif field in SET_FIELDS:
+                sent_items = sent.get(field)
+                new_items = set(value).difference(sent_items or ())
+                if sent_items is None or new_items:
+                    added[field] = sorted(new_items)
+                    sent[field] = (sent_items or set()) | new_items
+
+            elif field not in sent or sent[field] != value:
+                replaced[field] = sent[field] = value
+
+        if not (replaced or appended or added):
+            return None
+
+        patch = dict(unique_name_descriptor=key)
+        for name, changes in (
+            ("set", replaced),
+            ("append", appended),
+            ("add", added),
+        ):
+            if changes:
+                patch[name] = changes
+        return patch
+
+
+# The content encodings we can compress responses with, in order of
+# preference, and the `zlib` window bits for each.
+ENCODINGS = dict(gzip=16 + zlib.MAX_WBITS, deflate=zlib.MAX_WBITS)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Return the content encoding to compress a response with, given the
+    `Accept-Encoding` header of the request, or `None` if the client does
+    not accept any that we can use.
+
+    :param accept_encoding:
+        The value of the `Accept-Encoding` header (or `None`).
+    """
+
+    accepted = set()
+    for coding in (accept_encoding or "").lower().split(","):
+        coding, *parameters = coding.split(";")
+        if any(p.replace(" ", "") in ("q=0", "q=0.0") for p in parameters):
+            continue
+        accepted.add(coding.strip())
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+class LineWriter:
+    """
+    Write lines to a streaming response in larger chunks, and optionally
+    compress them.
+
+    The first line is written straight away. After that, lines are buffered
+    until there are `buffer_size` bytes of them, or they have waited for
+    `flush_interval` seconds, whichever comes first. Compressed chunks are
+    flushed (with `Z_SYNC_FLUSH`), so that the client can decode every line
+    as soon as it is written.
+
+    :param response:
+        A prepared `aiohttp.web.StreamResponse`. If an `encoding` is given,
+        the response must have the matching `Content-Encoding` header.
+
+    :param encoding: [optional]
+        The encoding to compress with ("gzip" or "deflate"). If `None` is
+        given then lines are not compressed.
+
+    :param level: [optional]
+        The compression level (1 is fastest, 9 is smallest). Default is 1.
+
+    :param buffer_size: [optional]
+        The number of bytes to buffer before writing. Default is 64 KiB.
+
+    :param flush_interval: [optional]
+        The longest time (in seconds) that a line is buffered before it is
+        written. Default is 0.05.
+    """
+
+    def __init__(
+        self,
+        response,
+        encoding=None,
+        level=1,
+        buffer_size=2**16,
+        flush_interval=0.05,
+    ):
+        self.response = response
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.bytes_written = 0
+        self._compressor = (
+            None
+            if encoding is None
+            else zlib.compressobj(level, zlib.DEFLATED, ENCODINGS[encoding])
+        )
+        self._buffer = []
+        self._size = 0
+        self._flushed = float("-inf")
+        self._flusher = None
+        self._exception = None
+        self._lock = asyncio.Lock()
+
+    async def write(self, line):
+        """
+        Write a line (as bytes, including the newline) to the response.
+        """
+
+        if self._exception is not None:
+            raise self._exception
+        self._buffer.append(line)
+        self._size += len(line)
+        if (
+            self._size >= self.buffer_size
+            or time.monotonic() - self._flushed >= self.flush_interval
+        ):
+            await self.flush()
+        elif self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flusher = None
+        try:
+            await self.flush()
+        except ConnectionResetError as exception:
+            # Raise it from the next write instead.
+            self._exception = exception
+
+    async def flush(self):
+        """Write any buffered lines to the response."""
+        async with self._lock:
+            self._flushed = time.monotonic()
+            if not self._buffer:
+                return
+            data = b"".join(self._buffer)
+            self._buffer.clear()
+            self._size = 0
+            if self._compressor is not None:
+                data = self._compressor.compress(data)
+                data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.bytes_written += len(data)
+            await self.response.write(data)
+
+    async def close(self):
+        """Write any buffered lines, and finish the compressed stream."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        if self._compressor is not None:
+            data = self._compressor.flush()
+            self.bytes_written += len(data)
+            await self.response.write(data)
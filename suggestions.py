@@ -0,0 +1,206 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+
+def _items(value):
+    # Sets of strings are stored as `None` when empty, as the string itself
+    # when there is only one, and only become a (sorted) `list` when there
+    # are more.
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return value
+
+
+def _add(value, items):
+    for item in items:
+        if value is None:
+            value = item
+        elif isinstance(value, str):
+            if item != value:
+                value = sorted((value, item))
+        else:
+            index = bisect_left(value, item)
+            if index == len(value) or value[index] != item:
+                value.insert(index, item)
+    return value
+
+
+class Suggestion:
+    """
+    A compact record of an author suggestion, and the metrics collated for
+    it. Large searches keep tens of thousands of these in memory, so:
+
+    - bibcodes are interned, and shared between all co-authors;
+    - years are kept in an unsigned short `array`;
+    - the sets of affiliations and matched names are only materialized when
+      they hold more than one string, and are then kept as sorted lists, so
+      they never need sorting for `to_json`.
+
+    Use `to_json` for a dictionary of the suggestion in the same form that
+    `collate_authors` has always yielded.
+
+    :param unique_name_descriptor:
+        The pseudo-unique name descriptor of the author (e.g., "Lastname,
+        F.").
+    """
+
+    __slots__ = (
+        "unique_name_descriptor",
+        "full_name",
+        "orcid",
+        "most_recent_primary_affiliation",
+        "most_recent_pubdate",
+        "pubdate_ordinal",
+        "bibcodes",
+        "article_years",
+        "number_of_articles",
+        "number_of_articles_as_first_author",
+        "inferred_gender",
+        "_affiliations",
+        "_parsed_affiliations",
+        "_matched_names",
+    )
+
+    def __init__(self, unique_name_descriptor):
+        self.unique_name_descriptor = unique_name_descriptor
+        self.full_name = None
+        self.orcid = None
+        self.most_recent_primary_affiliation = None
+        self.most_recent_pubdate = None
+        self.pubdate_ordinal = -1
+        self.bibcodes = []
+        self.article_years = array("H")
+        self.number_of_articles = 0
+        self.number_of_articles_as_first_author = 0
+        self.inferred_gender = "unknown"
+        self._affiliations = None
+        self._parsed_affiliations = None
+        self._matched_names = None
+
+    @property
+    def affiliations(self):
+        """Return a sorted sequence of all affiliations of this author."""
+        return _items(self._affiliations)
+
+    @property
+    def parsed_affiliations(self):
+        """Return a sorted sequence of the unique affiliations."""
+        return _items(self._parsed_affiliations)
+
+    @property
+    def matched_names(self):
+        """Return a sorted sequence of the names matched to this author."""
+        return _items(self._matched_names)
+
+    def add_article(self, bibcode, year):
+        """
+        Record an article by this author.
+
+        :param bibcode:
+            The bibcode of the article.
+
+        :param year:
+            The year the article was published.
+        """
+        self.bibcodes.append(sys.intern(bibcode))
+        self.article_years.append(year)
+        self.number_of_articles += 1
+
+    def add_affiliations(self, affiliations, parsed_affiliations):
+        """
+        Record affiliations of this author.
+
+        :param affiliations:
+            An iterable of affiliation strings.
+
+        :param parsed_affiliations:
+            An iterable of the (unique) affiliation strings to also record as
+            parsed affiliations.
+        """
+        self._affiliations = _add(self._affiliations, affiliations)
+        self._parsed_affiliations = _add(
+            self._parsed_affiliations, parsed_affiliations
+        )
+
+    def add_matched_names(self, names):
+        """
+        Record names matched to this author, and update the full name to the
+        longest of them.
+
+        :param names:
+            An iterable of author names.
+
+        :returns:
+            A boolean indicating whether the full name changed.
+        """
+        previous_full_name = self.full_name
+        self._matched_names = _add(self._matched_names, names)
+        self.full_name = max(self.matched_names, key=len)
+        return self.full_name != previous_full_name
+
+    def to_json(self):
+        """
+        Return a JSON-serializable dictionary of this suggestion, with sets
+        as sorted lists.
+        """
+        return dict(
+            full_name=self.full_name,
+            unique_name_descriptor=self.unique_name_descriptor,
+            orcid=self.orcid,
+            most_recent_primary_affiliation=(
+                self.most_recent_primary_affiliation
+            ),
+            most_recent_pubdate=self.most_recent_pubdate,
+            bibcodes=list(self.bibcodes),
+            affiliations=list(self.affiliations),
+            parsed_affiliations=list(self.parsed_affiliations),
+            matched_names=list(self.matched_names),
+            number_of_articles_as_first_author=(
+                self.number_of_articles_as_first_author
+            ),
+            number_of_articles=self.number_of_articles,
+            article_years=self.article_years.tolist(),
+            inferred_gender=self.inferred_gender,
+        )
+
+    @classmethod
+    def from_json(cls, suggestion):
+        """
+        Return a suggestion from the dictionary returned by `to_json`.
+
+        :param suggestion:
+            A dictionary describing a suggestion.
+        """
+        self = cls(suggestion["unique_name_descriptor"])
+        self.full_name = suggestion["full_name"]
+        self.orcid = suggestion["orcid"]
+        self.most_recent_primary_affiliation = suggestion[
+            "most_recent_primary_affiliation"
+        ]
+        self.most_recent_pubdate = suggestion["most_recent_pubdate"]
+        if self.most_recent_pubdate is not None:
+            self.pubdate_ordinal = int(
+                self.most_recent_pubdate.replace("-", "")
+            )
+        self.bibcodes = list(map(sys.intern, suggestion["bibcodes"]))
+        self.article_years = array("H", suggestion["article_years"])
+        self.number_of_articles = suggestion["number_of_articles"]
+        self.number_of_articles_as_first_author = suggestion[
+            "number_of_articles_as_first_author"
+        ]
+        self.inferred_gender = suggestion["inferred_gender"]
+        self._affiliations = _add(None, suggestion["affiliations"])
+        self._parsed_affiliations = _add(
+            None, suggestion["parsed_affiliations"]
+        )
+        self._matched_names = _add(None, suggestion["matched_names"])
+        return self
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} {self.unique_name_descriptor!r}: "
+            f"{self.number_of_articles} articles>"
+        )
@@ -0,0 +1,483 @@
+"""
+Serve the app from several worker processes, so that searches are not all
+limited to one core (and one interpreter lock).
+
+    python simple.py --workers 4 --port 8080
+
+A supervising process binds the listening socket, and runs each worker as a
+fresh Python process that accepts connections on it. A worker that is busy
+(e.g., collating a large search) does not accept new connections until its
+event loop is free, so idle workers take them. Workers keep their caches
+(see `cache.ResponseCache` and `snapshots.SnapshotStore`) in the same SQLite
+databases, so a page of results fetched by one worker is reused by the
+others. Each worker reports its health to a shared `WorkerRegistry`, which
+`GET /health` returns.
+
+The supervisor restarts workers that exit, or that stop reporting (e.g.,
+because their event loop is stuck), and handles these signals:
+
+    SIGHUP           reload: start new workers (running the code on disk),
+                     and once they are serving, stop the old ones gracefully
+    SIGTERM, SIGINT  stop every worker gracefully, and exit
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import time
+
+from cache import CACHE_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) workers report their health, and how long the
+# supervisor waits for a report before restarting a worker.
+HEARTBEAT_INTERVAL = float(os.getenv("DROPBEAR_HEARTBEAT_INTERVAL", 5))
+HEARTBEAT_TIMEOUT = float(os.getenv("DROPBEAR_HEARTBEAT_TIMEOUT", 60))
+
+# How long (in seconds) stopped workers are given to finish their searches,
+# before they are killed.
+GRACEFUL_TIMEOUT = float(os.getenv("DROPBEAR_GRACEFUL_TIMEOUT", 30))
+
+# The environment variables that tell a worker how to serve (see
+# `worker_socket` and `report_health`).
+WORKER_FD = "DROPBEAR_WORKER_FD"
+WORKER_ID = "DROPBEAR_WORKER_ID"
+WORKER_GENERATION = "DROPBEAR_WORKER_GENERATION"
+WORKER_REGISTRY = "DROPBEAR_WORKER_REGISTRY"
+
+# How often (in seconds) the supervisor checks on its workers, and the
+# least time between restarts of a worker that keeps exiting.
+POLL_INTERVAL = 0.5
+RESTART_DELAY = 1
+
+
+class WorkerRegistry:
+    """
+    The health of each worker process, as last reported by the worker, in a
+    SQLite database shared by the supervisor and its workers.
+
+    :param path:
+        The path of the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS workers (
+                pid INTEGER PRIMARY KEY,
+                worker INTEGER NOT NULL,
+                generation INTEGER NOT NULL,
+                started REAL NOT NULL,
+                heartbeat REAL NOT NULL,
+                status TEXT NOT NULL
+            );
+            """)
+
+    def report(self, pid, worker, generation, started, status):
+        """
+        Record the health of a worker.
+
+        :param pid:
+            The process ID of the worker.
+
+        :param worker:
+            The number of the worker (from zero), which is kept when the
+            worker is restarted.
+
+        :param generation:
+            The generation of the worker, which goes up with every reload.
+
+        :param started:
+            The time (as a Unix time) that the worker started.
+
+        :param status:
+            A JSON-serializable dictionary of the worker's health.
+        """
+
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    pid,
+                    worker,
+                    generation,
+                    started,
+                    time.time(),
+                    json.dumps(status),
+                ),
+            )
+
+    def heartbeats(self):
+        """
+        Return a dictionary of the time (as a Unix time) of the last report
+        from each worker, by process ID.
+        """
+        return dict(
+            self._connection.execute("SELECT pid, heartbeat FROM workers")
+        )
+
+    def workers(self):
+        """
+        Return a list of the last report from every worker, with how long
+        ago (in seconds) it was made, and whether the worker is healthy
+        (i.e., it has reported on time).
+        """
+
+        now = time.time()
+        rows = self._connection.execute("""
+            SELECT pid, worker, generation, started, heartbeat, status
+            FROM workers ORDER BY worker, generation
+            """)
+        return [
+            dict(
+                json.loads(status),
+                pid=pid,
+                worker=worker,
+                generation=generation,
+                started=started,
+                seconds_since_heartbeat=now - heartbeat,
+                healthy=now - heartbeat < 2 * HEARTBEAT_INTERVAL,
+            )
+            for pid, worker, generation, started, heartbeat, status in rows
+        ]
+
+    def remove(self, pid):
+        """Forget the worker with the given process ID."""
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM workers WHERE pid = ?", (pid,)
+            )
+
+    def close(self):
+        """Close the registry."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def is_worker():
+    """Return whether this process was started by a `Supervisor`."""
+    return WORKER_FD in os.environ
+
+
+def worker_socket():
+    """
+    Return the listening socket inherited from the supervisor, or `None` if
+    this process is not a worker.
+    """
+    if not is_worker():
+        return None
+    return socket.socket(fileno=int(os.environ[WORKER_FD]))
+
+
+async def report_health(registry, status, interval=HEARTBEAT_INTERVAL):
+    """
+    Report the health of this worker to the registry every so often, until
+    cancelled. If the supervisor has gone away, stop this worker gracefully.
+
+    :param registry:
+        The `WorkerRegistry` of the supervisor.
+
+    :param status:
+        A function that returns a JSON-serializable dictionary of the health
+        of this worker.
+
+    :param interval: [optional]
+        The time (in seconds) between reports.
+    """
+
+    pid, supervisor = (os.getpid(), os.getppid())
+    worker = int(os.environ[WORKER_ID])
+    generation = int(os.environ[WORKER_GENERATION])
+    started = time.time()
+    try:
+        while True:
+            if os.getppid() != supervisor:
+                logger.error("Supervisor went away; stopping worker")
+                os.kill(pid, signal.SIGTERM)
+                return
+            registry.report(pid, worker, generation, started, status())
+            await asyncio.sleep(interval)
+    finally:
+        registry.remove(pid)
+
+
+class _Worker:
+
+    __slots__ = ("process", "worker", "generation", "spawned", "stopped")
+
+    def __init__(self, process, worker, generation):
+        self.process = process
+        self.worker = worker
+        self.generation = generation
+        self.spawned = time.time()
+        # When the worker was asked to stop, if it has been.
+        self.stopped = None
+
+
+class Supervisor:
+    """
+    Run worker processes that serve on one shared listening socket, and keep
+    them running (see the module documentation).
+
+    :param command:
+        The command that runs a worker, as a list of arguments (e.g.,
+        `[sys.executable, "simple.py"]`). Workers find their socket and
+        registry from the environment (see `worker_socket` and
+        `report_health`).
+
+    :param workers: [optional]
+        The number of worker processes. Default is the number of CPUs.
+
+    :param host: [optional]
+        The host to listen on. Default is all interfaces.
+
+    :param port: [optional]
+        The port to listen on. Default is 8080.
+
+    :param graceful_timeout: [optional]
+        The time (in seconds) that stopped workers are given to finish their
+        searches, before they are killed.
+
+    :param heartbeat_timeout: [optional]
+        The time (in seconds) to wait for a worker to report its health
+        before it is restarted.
+    """
+
+    def __init__(
+        self,
+        command,
+        workers=None,
+        host="0.0.0.0",
+        port=8080,
+        graceful_timeout=GRACEFUL_TIMEOUT,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT,
+    ):
+        self.command = list(command)
+        self.number_of_workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.graceful_timeout = graceful_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.registry_path = os.path.join(
+            CACHE_DIRECTORY, f"workers-{os.getpid()}.sqlite"
+        )
+        # The generation of workers serving, and of those being started by
+        # a reload (if one is in progress).
+        self.generation = 0
+        self._reloading = None
+        self._reload_started = None
+        self._workers = dict()
+        self._restarts = dict()
+        self._signals = []
+        self._socket = None
+        self._registry = None
+
+    def run(self):
+        """
+        Bind the socket, start the workers, and supervise them until the
+        supervisor is stopped with SIGTERM or SIGINT.
+        """
+
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        self._socket = socket.create_server((self.host, self.port))
+        self._registry = WorkerRegistry(self.registry_path)
+        handled = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        handlers = {
+            signum: signal.signal(signum, self._on_signal)
+            for signum in handled
+        }
+        logger.info(
+            f"Serving on http://{self.host}:{self.port} with "
+            f"{self.number_of_workers} workers (supervisor {os.getpid()})"
+        )
+        try:
+            for worker in range(self.number_of_workers):
+                self._spawn(worker, self.generation)
+            while self._step():
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self._stop_all()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self._socket.close()
+            self._registry.close()
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.registry_path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _step(self):
+        # Check on the workers once, and return whether to keep going.
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum != signal.SIGHUP:
+                logger.info(f"Stopping ({signal.Signals(signum).name})")
+                return False
+            self._reload()
+
+        self._reap()
+        heartbeats = self._registry.heartbeats()
+        self._check_reload(heartbeats)
+        self._check_heartbeats(heartbeats)
+        self._respawn()
+        self._kill_stragglers()
+        return True
+
+    def _spawn(self, worker, generation):
+        env = dict(
+            os.environ,
+            **{
+                WORKER_FD: str(self._socket.fileno()),
+                WORKER_ID: str(worker),
+                WORKER_GENERATION: str(generation),
+                WORKER_REGISTRY: self.registry_path,
+            },
+        )
+        # Workers get their own session, so that a SIGINT from the terminal
+        # only reaches the supervisor, which then stops them gracefully.
+        process = subprocess.Popen(
+            self.command,
+            env=env,
+            pass_fds=(self._socket.fileno(),),
+            start_new_session=True,
+        )
+        self._workers[process.pid] = _Worker(process, worker, generation)
+        logger.info(
+            f"Started worker {worker} (generation {generation}) as process "
+            f"{process.pid}"
+        )
+
+    def _stop(self, worker):
+        if worker.stopped is None:
+            worker.stopped = time.time()
+            worker.process.send_signal(signal.SIGTERM)
+
+    def _reload(self):
+        if self._reloading is not None:
+            logger.warning("Already reloading; ignoring SIGHUP")
+            return
+        self._reloading = self.generation + 1
+        self._reload_started = time.time()
+        logger.info(f"Reloading (generation {self._reloading})")
+        for worker in range(self.number_of_workers):
+            self._spawn(worker, self._reloading)
+
+    def _abandon_reload(self, reason):
+        logger.error(
+            f"Abandoning reload (generation {self._reloading}): {reason}; "
+            f"generation {self.generation} is still serving"
+        )
+        for worker in self._workers.values():
+            if worker.generation == self._reloading:
+                self._stop(worker)
+        self._reloading = None
+
+    def _check_reload(self, heartbeats):
+        # Once every new worker has reported (and so is serving), stop the
+        # old ones.
+        if self._reloading is None:
+            return
+        new = [
+            pid
+            for pid, worker in self._workers.items()
+            if worker.generation == self._reloading
+        ]
+        if len(new) == self.number_of_workers and all(
+            pid in heartbeats for pid in new
+        ):
+            for worker in self._workers.values():
+                if worker.generation != self._reloading:
+                    self._stop(worker)
+            self.generation, self._reloading = (self._reloading, None)
+            logger.info(f"Reloaded (generation {self.generation})")
+        elif time.time() - self._reload_started > self.heartbeat_timeout:
+            self._abandon_reload("new workers did not report in time")
+
+    def _reap(self):
+        for pid, worker in list(self._workers.items()):
+            code = worker.process.poll()
+            if code is None:
+                continue
+            del self._workers[pid]
+            self._registry.remove(pid)
+            if worker.stopped is not None:
+                logger.info(f"Worker {worker.worker} ({pid}) stopped")
+            elif worker.generation == self._reloading:
+                self._abandon_reload(
+                    f"worker {worker.worker} ({pid}) exited with code {code}"
+                )
+            elif worker.generation == self.generation:
+                # Restart it, but not in a tight loop if it keeps exiting.
+                logger.error(
+                    f"Worker {worker.worker} ({pid}) exited with code {code}"
+                )
+                self._restarts[worker.worker] = worker.spawned + RESTART_DELAY
+
+    def _check_heartbeats(self, heartbeats):
+        # Kill serving workers that have stopped reporting (e.g., because
+        # their event loop is blocked), so that they are restarted.
+        now = time.time()
+        for pid, worker in self._workers.items():
+            if worker.stopped is not None or (
+                worker.generation != self.generation
+            ):
+                continue
+            last = heartbeats.get(pid, worker.spawned)
+            if now - last > self.heartbeat_timeout:
+                logger.error(
+                    f"Worker {worker.worker} ({pid}) has not reported for "
+                    f"{now - last:.0f} seconds; killing it"
+                )
+                worker.stopped = now
+                worker.process.kill()
+                self._restarts[worker.worker] = now
+
+    def _respawn(self):
+        now = time.time()
+        for worker, when in list(self._restarts.items()):
+            if when <= now:
+                del self._restarts[worker]
+                self._spawn(worker, self.generation)
+
+    def _kill_stragglers(self):
+        now = time.time()
+        for pid, worker in self._workers.items():
+            if (
+                worker.stopped is not None
+                and now - worker.stopped > self.graceful_timeout + 5
+            ):
+                logger.warning(
+                    f"Worker {worker.worker} ({pid}) did not stop in time; "
+                    "killing it"
+                )
+                worker.process.kill()
+
+    def _stop_all(self):
+        self._restarts.clear()
+        for worker in self._workers.values():
+            self._stop(worker)
+        deadline = time.time() + self.graceful_timeout + 5
+        for worker in self._workers.values():
+            try:
+                worker.process.wait(timeout=max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                logger.warning(
+                    f"Worker {worker.worker} ({worker.process.pid}) did not "
+                    "stop in time; killing it"
+                )
+                worker.process.kill()
+                worker.process.wait()
+        self._workers.clear()